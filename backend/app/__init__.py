@@ -11,6 +11,8 @@ from .routes.student_data import student_data
 
 def create_app():
     app = Flask(__name__)
+    # Yüklenen kare akışları dahil istek gövdesi üst sınırı
+    app.config['MAX_CONTENT_LENGTH'] = int(float(os.getenv('MAX_UPLOAD_MB', 64)) * 1024 * 1024)
     
     # CORS yapılandırması
     origins = os.getenv('CORS_ALLOW_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',')
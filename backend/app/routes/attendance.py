@@ -1,10 +1,17 @@
-from flask import Blueprint, jsonify
-from datetime import datetime
+from flask import Blueprint, jsonify, request
+from datetime import datetime, timedelta
 from bson import ObjectId
 from ..utils.db import get_db
+from ..utils.user_names import teacher_names, full_name
+from ..utils.attendance_counters import ensure_counter_indexes, mark_present, student_counts
 
 db = get_db()  # Veritabanı bağlantısını almak için
 
+try:
+    ensure_counter_indexes(db)
+except Exception as e:
+    print(f"[UYARI] Yoklama sayacı indeksleri oluşturulamadı: {str(e)}")
+
 attendance_routes = Blueprint('attendance', __name__)
 
 @attendance_routes.route('/active-courses/<ogrno>', methods=['GET'])
@@ -12,23 +19,48 @@ def get_active_courses(ogrno):
     try:
         print(f"[DEBUG] Öğrenci no: {ogrno} için aktif dersler getiriliyor")
         
-        # Aktif dersleri getir
-        active_courses = list(db.attendance.find({
-            "durum": "aktif",
-            "tumOgrenciler": ogrno
-        }))
+        # Aktif dersleri getir; büyük öğrenci dizileri yerine yalnızca bu öğrencinin
+        # katılıp katılmadığı sunucuda hesaplanır. Öğretmen adı önbellekte olmayan
+        # dersler için users aynı sorguda $lookup ile okunur; önbellekteki
+        # öğretmenler için arama yapılmaz
+        bilinen_ogretmenler = teacher_names.known()
+        active_courses = list(db.attendance.aggregate([
+            {"$match": {"durum": "aktif", "tumOgrenciler": ogrno}},
+            {"$project": {
+                "dersKodu": 1,
+                "dersAdi": 1,
+                "ogretmenMail": 1,
+                "tarih": 1,
+                "katilimYapildi": {"$in": [ogrno, {"$ifNull": ["$katilanlar", []]}]},
+                "_arananMail": {"$cond": [
+                    {"$in": ["$ogretmenMail", {"$literal": bilinen_ogretmenler}]}, None, "$ogretmenMail"
+                ]}
+            }},
+            {"$lookup": {"from": "users", "localField": "_arananMail", "foreignField": "mail", "as": "_ogretmen"}},
+            {"$set": {"_ogretmen": {"$map": {"input": "$_ogretmen", "in": {"ad": "$$this.ad", "soyad": "$$this.soyad"}}}}},
+            {"$unset": "_arananMail"}
+        ]))
+
+        ogretmen_mailleri = [course.get('ogretmenMail') for course in active_courses if course.get('ogretmenMail')]
+        ogretmen_adlari, eksikler = teacher_names.cached(ogretmen_mailleri)
+        if eksikler:
+            bilinen_ogretmenler = set(bilinen_ogretmenler)
+            bulunanlar = {mail: None for mail in eksikler if mail not in bilinen_ogretmenler}
+            for course in active_courses:
+                if course.get('ogretmenMail') in bulunanlar and course['_ogretmen']:
+                    bulunanlar[course['ogretmenMail']] = full_name(course['_ogretmen'][0])
+            teacher_names.store(bulunanlar)
+            ogretmen_adlari.update(bulunanlar)
+            # Sorgu sırasında süresi dolan ya da geçersiz kılınan adlar ayrıca okunur
+            kalanlar = [mail for mail in eksikler if mail in bilinen_ogretmenler]
+            if kalanlar:
+                ogretmen_adlari.update(teacher_names.resolve(db, kalanlar))
         
-        # Her ders için katılım durumunu kontrol et
         formatted_courses = []
         for course in active_courses:
             course_id = str(course['_id'])
-            
-            # Öğretmen adını al
-            ogretmen = db.users.find_one({"mail": course.get('ogretmenMail')})
-            ogretmen_adi = f"{ogretmen['ad']} {ogretmen['soyad']}" if ogretmen else course.get('ogretmenMail')
-            
-            # Katılım durumunu katilanlar dizisinden kontrol et
-            katilim_yapildi = ogrno in course.get('katilanlar', [])
+            ogretmen_adi = ogretmen_adlari.get(course.get('ogretmenMail')) or course.get('ogretmenMail')
+            katilim_yapildi = course['katilimYapildi']
             
             formatted_course = {
                 '_id': course_id,
@@ -50,13 +82,8 @@ def get_active_courses(ogrno):
 @attendance_routes.route('/verify-attendance/<ders_id>/<ogrno>', methods=['POST'])
 def verify_attendance(ders_id, ogrno):
     try:
-        # Dersi bul ve öğrenciyi katilanlar listesine ekle
-        result = db.attendance.update_one(
-            {"_id": ObjectId(ders_id)},
-            {"$addToSet": {"katilanlar": ogrno}}
-        )
-        
-        if result.modified_count > 0:
+        # Dersi bul ve öğrenciyi katilanlar listesine ekle (sayaçlar da güncellenir)
+        if mark_present(db, ders_id, [ogrno]):
             print(f"[DEBUG] Öğrenci {ogrno} dersin katılımcılarına eklendi")
             return jsonify({"message": "Yoklama kaydı başarılı"}), 200
         else:
@@ -67,39 +94,44 @@ def verify_attendance(ders_id, ogrno):
         print(f"[HATA] Yoklama kaydı hatası: {str(e)}")
         return jsonify({'error': str(e)}), 500 
 
+def _tarih_filtresi():
+    """?baslangic=YYYY-MM-DD&bitis=YYYY-MM-DD; bitis günü dahildir"""
+    filtre = {}
+    baslangic = request.args.get('baslangic')
+    bitis = request.args.get('bitis')
+    if baslangic:
+        filtre["$gte"] = datetime.fromisoformat(baslangic)
+    if bitis:
+        if len(bitis) == 10:
+            # Yalnızca gün verildiyse o günün tamamı dahil edilir
+            filtre["$lt"] = datetime.fromisoformat(bitis) + timedelta(days=1)
+        else:
+            filtre["$lte"] = datetime.fromisoformat(bitis)
+    return filtre
+
 @attendance_routes.route('/student-tracking/<ogrno>', methods=['GET'])
 def get_student_tracking(ogrno):
     try:
-        # Öğrencinin tüm derslerini bul
-        all_courses = list(db.attendance.find({
-            "tumOgrenciler": ogrno
-        }).distinct("dersKodu"))
+        try:
+            tarih_filtresi = _tarih_filtresi()
+        except ValueError:
+            return jsonify({'error': 'Geçersiz tarih, YYYY-MM-DD biçiminde olmalı'}), 400
         
+        # Ders bazında sayılar tek sorguda: sayaç koleksiyonu ya da $group aggregation
         tracking_data = []
-        
-        for ders_kodu in all_courses:
-            # Her ders için yoklama verilerini topla
-            dersler = list(db.attendance.find({
-                "dersKodu": ders_kodu,
-                "tumOgrenciler": ogrno
-            }))
-            
-            if dersler:
-                toplam_ders = len(dersler)
-                katildigi_ders = sum(1 for ders in dersler if ogrno in ders.get('katilanlar', []))
-                katilmadigi_ders = toplam_ders - katildigi_ders
-                katilim_orani = round((katildigi_ders / toplam_ders) * 100) if toplam_ders > 0 else 0
-                
-                tracking_data.append({
-                    "dersKodu": ders_kodu,
-                    "dersAdi": dersler[0].get('dersAdi', ''),
-                    "toplamDers": toplam_ders,
-                    "katildigiDers": katildigi_ders,
-                    "katilmadigiDers": katilmadigi_ders,
-                    "katilimOrani": katilim_orani
-                })
+        for satir in student_counts(db, ogrno, tarih_filtresi):
+            toplam_ders = satir['toplamDers']
+            katildigi_ders = satir['katildigiDers']
+            tracking_data.append({
+                "dersKodu": satir['dersKodu'],
+                "dersAdi": satir.get('dersAdi', ''),
+                "toplamDers": toplam_ders,
+                "katildigiDers": katildigi_ders,
+                "katilmadigiDers": toplam_ders - katildigi_ders,
+                "katilimOrani": round((katildigi_ders / toplam_ders) * 100) if toplam_ders > 0 else 0
+            })
         
         return jsonify(tracking_data)
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500 
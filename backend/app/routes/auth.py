@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from ..utils.db import get_db
+from ..utils.gallery_version import mark_deleted
+from ..utils.user_names import teacher_names, roster_names
 from ..utils.auth import generate_token, token_required, decode_token, invalidate_refresh_token, ROLE_ADMIN, ROLE_TEACHER, ROLE_STUDENT
 from bson import ObjectId
 
@@ -231,6 +233,10 @@ def add_user():
             
         # Veritabanına ekle
         result = db.users.insert_one(new_user)
+        # Daha önce "bulunamadı" olarak önbelleğe girmiş olabilir
+        teacher_names.invalidate([new_user['mail']])
+        if new_user.get('ogrno'):
+            roster_names.invalidate([new_user['ogrno']])
         
         if result.acknowledged:
             # Şifreyi yanıtta gönderme
@@ -290,6 +296,9 @@ def update_user(user_id):
             {"_id": ObjectId(user_id)},
             {"$set": update_data}
         )
+        teacher_names.invalidate([existing_user.get('mail')])
+        if existing_user.get('ogrno') or update_data.get('ogrno'):
+            roster_names.invalidate([existing_user.get('ogrno'), update_data.get('ogrno')])
         
         if result.modified_count > 0:
             # Güncellenmiş kullanıcıyı getir
@@ -321,19 +330,28 @@ def delete_user(user_id):
             
         # Kullanıcıyı sil
         result = db.users.delete_one({"_id": ObjectId(user_id)})
+        teacher_names.invalidate([existing_user.get('mail')])
+        if existing_user.get('ogrno'):
+            roster_names.invalidate([existing_user['ogrno']])
         
         if result.deleted_count > 0:
             # Öğrenci kullanıcısı ise, yüz verilerini de sil
             if existing_user.get('role') == 'student' and 'ogrno' in existing_user:
                 try:
                     # Öğrencinin yüz verilerini temizle
-                    db.ogrenciler.delete_one({"ogrenci_id": existing_user['ogrno']})
+                    silinen = db.ogrenciler.delete_one({"ogrenci_id": existing_user['ogrno']})
+                    if silinen.deleted_count:
+                        mark_deleted(db, existing_user['ogrno'])
+                        from .face_attendance import sync_student_faces
+                        sync_student_faces()
                     
                     # Yoklama kayıtlarından öğrenciyi çıkar (bu işlem opsiyonel)
                     db.attendance.update_many(
                         {"tumOgrenciler": existing_user['ogrno']},
-                        {"$pull": {"tumOgrenciler": existing_user['ogrno'], "katilanlar": existing_user['ogrno']}}
+                        {"$pull": {"tumOgrenciler": existing_user['ogrno'], "katilanlar": existing_user['ogrno']},
+                         "$inc": {"kadroSurumu": 1}}
                     )
+                    db.yoklama_sayaclari.delete_many({"ogrno": existing_user['ogrno']})
                 except Exception as e:
                     print(f"Öğrenci verileri silinirken hata: {str(e)}")
             
@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request
 from ..utils.db import get_db
+from ..utils.attendance_counters import count_session, mark_present, mark_absent, attendance_changes
+from ..utils.user_names import roster_names
 from datetime import datetime
 from bson import ObjectId
 
@@ -52,6 +54,10 @@ def start_attendance():
         
         result = db.attendance.insert_one(attendance_record)
         if result.acknowledged:
+            count_session(db, data['dersKodu'], course['dersAdi'], course['ogrenciler'])
+            # Yüz tanıma istekleri için dersin alt galerisini şimdiden hazırla
+            from .face_attendance import prewarm_course_gallery
+            prewarm_course_gallery(str(result.inserted_id), course['ogrenciler'])
             return jsonify({'message': 'Yoklama başlatıldı', 'attendanceId': str(result.inserted_id)})
         else:
             return jsonify({'error': 'Yoklama başlatılamadı'}), 500
@@ -62,20 +68,21 @@ def start_attendance():
 @courses.route('/attendance/<attendance_id>/end', methods=['POST'])
 def end_attendance(attendance_id):
     try:
+        from .face_attendance import release_course_gallery
+        release_course_gallery(attendance_id)
+        
+        # Durum ve katılmayanlar sunucuda tek güncellemeyle yazılır; sayaçlar
+        # katılım anında güncellendiğinden burada yeniden sayım gerekmez
         db.attendance.update_one(
             {"_id": ObjectId(attendance_id)},
-            {"$set": {"durum": "tamamlandı"}}
+            [{"$set": {
+                "durum": "tamamlandı",
+                "katilmayanlar": {"$setDifference": [
+                    {"$ifNull": ["$tumOgrenciler", []]}, {"$ifNull": ["$katilanlar", []]}
+                ]}
+            }}]
         )
         
-        attendance = db.attendance.find_one({"_id": ObjectId(attendance_id)})
-        
-        if attendance:
-            katilmayanlar = list(set(attendance['tumOgrenciler']) - set(attendance['katilanlar']))
-            db.attendance.update_one(
-                {"_id": ObjectId(attendance_id)},
-                {"$set": {"katilmayanlar": katilmayanlar}}
-            )
-        
         return jsonify({'message': 'Yoklama tamamlandı'})
         
     except Exception as e:
@@ -84,21 +91,33 @@ def end_attendance(attendance_id):
 @courses.route('/attendance/<attendance_id>', methods=['GET'])
 def get_attendance(attendance_id):
     try:
-        attendance = db.attendance.find_one({"_id": ObjectId(attendance_id)})
+        # İstemci bildiği sürümleri gönderirse (?surum=&kadro=) kadro değişmediği
+        # sürece yalnızca sonraki katılım değişiklikleri döner
+        surum = request.args.get('surum', type=int)
+        kadro = request.args.get('kadro', type=int)
+        if surum is not None and kadro is not None:
+            degisim = attendance_changes(db, attendance_id, surum)
+            if not degisim:
+                return jsonify({'error': 'Yoklama bulunamadı'}), 404
+            # Kırpılmış değişiklik geçmişinden eski sürümü bilen istemci tam yanıtı alır
+            if degisim.pop('eksiksiz') and degisim['kadroSurumu'] == kadro and surum <= degisim['surum']:
+                return jsonify(degisim)
+
+        attendance = db.attendance.find_one(
+            {"_id": ObjectId(attendance_id)},
+            {"tumOgrenciler": 1, "katilanlar": 1, "surum": 1, "kadroSurumu": 1}
+        )
         if not attendance:
             return jsonify({'error': 'Yoklama bulunamadı'}), 404
         
-        ogrenci_detaylari = []
-        for index, ogrenci_no in enumerate(attendance['tumOgrenciler'], 1):
-            ogrenci = db.users.find_one({"ogrno": ogrenci_no})
-            ogrenci_detaylari.append({
-                "ogrenciNo": ogrenci_no,
-                "adSoyad": f"{ogrenci['ad']} {ogrenci['soyad']}" if ogrenci else f"Öğrenci {index}"
-            })
+        kadro_surumu = attendance.get('kadroSurumu', 0)
+        ogrenci_detaylari = roster_names.roster(db, attendance_id, kadro_surumu, attendance['tumOgrenciler'])
         
         return jsonify({
             'tumOgrenciler': ogrenci_detaylari,
-            'katilanlar': attendance['katilanlar']
+            'katilanlar': attendance['katilanlar'],
+            'surum': attendance.get('surum', 0),
+            'kadroSurumu': kadro_surumu
         })
         
     except Exception as e:
@@ -111,16 +130,11 @@ def update_attendance(attendance_id):
         if not data or 'ogrenci' not in data or 'isPresent' not in data:
             return jsonify({'error': 'Eksik bilgi'}), 400
             
+        # Sayaçlar yalnızca katılım gerçekten değiştiyse güncellenir
         if data['isPresent']:
-            db.attendance.update_one(
-                {"_id": ObjectId(attendance_id)},
-                {"$addToSet": {"katilanlar": data['ogrenci']}}
-            )
+            mark_present(db, attendance_id, [data['ogrenci']])
         else:
-            db.attendance.update_one(
-                {"_id": ObjectId(attendance_id)},
-                {"$pull": {"katilanlar": data['ogrenci']}}
-            )
+            mark_absent(db, attendance_id, data['ogrenci'])
             
         return jsonify({'message': 'Yoklama güncellendi'})
         
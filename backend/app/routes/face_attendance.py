@@ -1,55 +1,314 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 import cv2
-import face_recognition
 from bson import ObjectId
 import time
-import numpy as np
 import datetime
+import json
+import os
+import threading
+from itertools import islice
 from ..utils.db import get_db
+from ..utils.face_gallery import FaceGallery, GalleryLoader, CourseGalleryCache
+from ..utils.ann_index import IVFIndex
+from ..utils.int8_index import Int8Index
+from ..utils.gallery_version import current_version, fetch_changes, ensure_indexes
+from ..utils.encoding_codec import unpack_encoding, ModelVersionError
+from ..utils.frame_pipeline import RecognitionPipeline
+from ..utils.face_tracker import FaceTracker
+from ..utils.frame_quality import quality_filtered
+from ..utils.face_ops import (detect_and_encode, decode_frame, match_faces,
+                              detect_faces, encode_faces, detection_scale, active_detector, FACE_MIN_SIZE,
+                              FACE_PROTOTYPES)
+from ..utils.recognition_jobs import (RecognitionJobManager, recognize_frames_job, camera_scan_job,
+                                      duplicate_scan_job)
+from ..utils.auth import token_required, ROLE_ADMIN
+from ..utils.camera_service import get_camera_service, CameraBusyError
+from ..utils.jpeg_stream import iter_jpegs, FrameTooLargeError
+from ..utils.attendance_counters import mark_present
+from ..utils.gallery_snapshot import (open_snapshot, write_snapshot, snapshot_version,
+                                      try_lock_writer, unlock_writer)
 
 face_attendance = Blueprint("face_attendance", __name__)
 db = get_db()
 
 # Cache ayarları
-student_faces_cache = {}
-last_cache_update = 0
 CACHE_EXPIRY = 3600
 FACE_RECOGNITION_TOLERANCE = 0.55
 
-def load_student_faces():
-    global student_faces_cache, last_cache_update
-    try:
-        students = list(db.ogrenciler.find({"encoding": {"$exists": True}}))
-        cache = {}
-        for student in students:
-            student_id = student["ogrenci_id"]
-            encoding = np.array(student["encoding"])
-            name = f"{student.get('ad', '')} {student.get('soyad', '')}".strip()
-            cache[student_id] = {"encoding": encoding, "name": name}
-        student_faces_cache = cache
-        last_cache_update = time.time()
-        print(f"{len(cache)} öğrencinin yüz verisi önbelleğe alındı.")
+# Yaklaşık en yakın komşu (IVF) indeksi ayarları
+FACE_ANN_ENABLED = os.getenv('FACE_ANN_ENABLED', 'False').lower() in ('true', '1', 't')
+FACE_ANN_PROBE = int(os.getenv('FACE_ANN_PROBE', 8))
+FACE_ANN_MIN_SIZE = int(os.getenv('FACE_ANN_MIN_SIZE', 5000))
+
+# int8 kodlu galeri araması: kod uzayında tarama, en iyi adaylarda kesin uzaklık.
+# Float matris disk görüntüsünden eşlenir, RAM'de yalnızca kodlar kalır; hız
+# kaba kuvvetten yüksek değildir. IVF açıksa IVF kullanılır; ikisi de
+# FACE_ANN_MIN_SIZE öğrenciden itibaren devreye girer
+FACE_INT8_ENABLED = os.getenv('FACE_INT8_ENABLED', 'False').lower() in ('true', '1', 't')
+FACE_INT8_RERANK = int(os.getenv('FACE_INT8_RERANK', 8))
+
+# Diğer worker'larda yapılan değişikliklerin en geç bu kadar saniyede fark edilmesi
+FACE_SYNC_INTERVAL = float(os.getenv('FACE_SYNC_INTERVAL', 2))
+
+# Worker'lar arasında paylaşılan disk görüntüsü (np.memmap) ayarları
+FACE_SNAPSHOT_DIR = os.getenv('FACE_SNAPSHOT_DIR', 'gallery_snapshot')
+FACE_SNAPSHOT_INTERVAL = float(os.getenv('FACE_SNAPSHOT_INTERVAL', 30))
+
+# Kare işleyen iş parçacığı sayısı
+FACE_PIPELINE_WORKERS = int(os.getenv('FACE_PIPELINE_WORKERS', 2))
+
+# Tespit-takip ayarları: tam tespit kaç karede bir yapılır, tanınmış yüzler
+# kaç karede bir yeniden doğrulanır
+FACE_TRACK_DETECT_EVERY = int(os.getenv('FACE_TRACK_DETECT_EVERY', 5))
+FACE_TRACK_REVERIFY_EVERY = int(os.getenv('FACE_TRACK_REVERIFY_EVERY', 30))
+
+# Yüz tanıma iş havuzundaki süreç sayısı (boş ya da tanımsızsa çekirdek sayısı)
+FACE_JOB_WORKERS = int(os.getenv('FACE_JOB_WORKERS') or os.cpu_count() or 1)
+
+# Yoklama oturumlarına ait hazır alt galerilerin toplam bellek sınırı
+FACE_COURSE_CACHE_MB = float(os.getenv('FACE_COURSE_CACHE_MB', 64))
+
+GALLERY_PROJECTION = {"_id": 0, "ogrenci_id": 1, "ad": 1, "soyad": 1, "encoding": 1, "surum": 1}
+
+def _index_kind():
+    if FACE_ANN_ENABLED:
+        return IVFIndex.kind
+    if FACE_INT8_ENABLED:
+        return Int8Index.kind
+    return None
+
+def _make_index(kind, gallery):
+    if kind == Int8Index.kind:
+        return Int8Index(rerank=FACE_INT8_RERANK).build(gallery)
+    return IVFIndex(n_probe=FACE_ANN_PROBE).build(gallery)
+
+def _ensure_ann_index(gallery):
+    kind = _index_kind()
+    if kind is None or len(gallery) < FACE_ANN_MIN_SIZE:
+        gallery.ann_index = None
+        return
+    index = gallery.ann_index
+    if index is None or index.kind != kind or index.needs_rebuild():
+        gallery.ann_index = _make_index(kind, gallery)
+
+def _carry_ann_index(old, new):
+    """
+    Aynı sürümdeki yeni galeriye (ör. disk görüntüsü) eski galerinin indeksini
+    taşır; indeks yalnızca needs_rebuild isterse yeniden kurulur
+    """
+    index = old.ann_index
+    if index is not None and new.version == old.version and len(new) == len(old):
+        new.ann_index = index.attach(new)
+    _ensure_ann_index(new)
+
+def _student_name(student):
+    return f"{student.get('ad', '')} {student.get('soyad', '')}".strip()
+
+def _gallery_encoding(student):
+    """Öğrencinin encoding'ini çözer; başka modelle üretilmişse uyarıp None döndürür"""
+    try:
+        return unpack_encoding(student["encoding"])
+    except ModelVersionError as e:
+        print(f"[UYARI] {student.get('ogrenci_id')} galeriye alınmadı, yeniden kayıt gerekli: {e}")
+        return None
+
+def _build_gallery():
+    # Galeri sürümü sayacın değil, okunan belgelerin en büyük sürümüdür: sayacı
+    # artırmış ama belgesini henüz yazmamış bir değişiklik bir sonraki
+    # senkronizasyonda yakalanır
+    version = 0
+    count = db.ogrenciler.count_documents({"encoding": {"$exists": True}})
+    gallery = FaceGallery(capacity=count, prototypes=FACE_PROTOTYPES)
+    cursor = db.ogrenciler.find({"encoding": {"$exists": True}}, GALLERY_PROJECTION, batch_size=5000)
+    for student in cursor:
+        version = max(version, student.get("surum", 0))
+        encoding = _gallery_encoding(student)
+        if encoding is not None:
+            gallery.add(student["ogrenci_id"], encoding, _student_name(student))
+    gallery.version = version
+    _ensure_ann_index(gallery)
+    if isinstance(gallery.ann_index, Int8Index):
+        gallery = _mapped_gallery(gallery)
+    return gallery
+
+def _mapped_gallery(gallery):
+    """
+    Galeriyi disk görüntüsüne yazıp eşlenmiş kopyasını indeksiyle döndürür;
+    böylece float matris süreç belleğinde tutulmaz. Görüntü yazılamazsa
+    galerinin kendisi döner, snapshot yenileyicisi daha sonra geçiş yapar
+    """
+    if not _write_snapshot(gallery) and snapshot_version(FACE_SNAPSHOT_DIR, FACE_PROTOTYPES) != gallery.version:
+        return gallery
+    mapped = _open_snapshot(build_index=False)
+    if mapped is None or mapped.version != gallery.version:
+        return gallery
+    _carry_ann_index(gallery, mapped)
+    return mapped
+
+def _sync_gallery(gallery):
+    if current_version(db) <= gallery.version:
+        return
+    changes = fetch_changes(db, gallery.version, GALLERY_PROJECTION)
+    # Yalnızca gerçekten görülen sürümler işaretlenir; sayacı artırıp henüz
+    # yazılmamış bir değişiklik varsa sonraki senkronizasyon yeniden sorgular
+    version = max([gallery.version] + [surum for surum, _, _ in changes])
+    for _, student_id, student in changes:
+        encoding = None if student is None or "encoding" not in student else _gallery_encoding(student)
+        if encoding is None:
+            gallery.remove(student_id)
+        else:
+            gallery.add(student_id, encoding, _student_name(student))
+    gallery.version = version
+    _ensure_ann_index(gallery)
+    course_galleries.invalidate_students(student_id for _, student_id, _ in changes)
+    print(f"Yüz galerisi {len(changes)} değişiklikle {version} sürümüne güncellendi.")
+
+gallery_loader = GalleryLoader(_build_gallery, CACHE_EXPIRY, _sync_gallery, FACE_SYNC_INTERVAL)
+course_galleries = CourseGalleryCache(int(FACE_COURSE_CACHE_MB * 1024 * 1024))
+
+def _open_snapshot(build_index=True):
+    try:
+        gallery = open_snapshot(FACE_SNAPSHOT_DIR)
+    except Exception as e:
+        print(f"Galeri görüntüsü açılamadı: {e}")
+        return None
+    if gallery is not None and gallery.prototypes != FACE_PROTOTYPES:
+        # Prototip ayarı değişmişse görüntü kullanılmaz, galeri yeniden kurulur
+        print(f"Galeri görüntüsü {gallery.prototypes} prototipli, ayar {FACE_PROTOTYPES}; görüntü atlandı.")
+        return None
+    if gallery is not None and build_index:
+        _ensure_ann_index(gallery)
+    return gallery
+
+def _write_snapshot(gallery):
+    if not try_lock_writer(FACE_SNAPSHOT_DIR):
+        return False
+    try:
+        write_snapshot(gallery, FACE_SNAPSHOT_DIR)
+        return True
+    finally:
+        unlock_writer(FACE_SNAPSHOT_DIR)
+
+def load_student_faces(use_snapshot=False):
+    try:
+        ensure_indexes(db)
+        gallery = _open_snapshot() if use_snapshot else None
+        if gallery is not None:
+            # Görüntüden bu yana olan değişiklikler delta olarak uygulanır
+            gallery_loader.replace(gallery, time.time())
+            gallery_loader.sync(time.time(), force=True)
+            print(f"{len(gallery)} öğrencinin yüz verisi disk görüntüsünden eşlendi.")
+        else:
+            gallery_loader.refresh(time.time())
+            print(f"{len(gallery_loader.gallery)} öğrencinin yüz verisi önbelleğe alındı.")
         return True
     except Exception as e:
         print(f"Yüz verileri yüklenirken hata: {e}")
         return False
 
-def get_cached_faces(course_students=None):
-    global last_cache_update
-    if time.time() - last_cache_update > CACHE_EXPIRY:
-        load_student_faces()
+def _refresh_snapshot():
+    gallery_loader.sync(time.time())
+    gallery = gallery_loader.gallery
+    disk_version = snapshot_version(FACE_SNAPSHOT_DIR, FACE_PROTOTYPES)
+    if gallery.version > disk_version and _write_snapshot(gallery):
+        disk_version = gallery.version
+    # Daha yeni ya da aynı sürümdeki görüntüye geçerek özel kopyayı bırak
+    if disk_version > gallery.version or (disk_version == gallery.version and not gallery.is_mapped):
+        new_gallery = _open_snapshot(build_index=False)
+        if new_gallery is not None and new_gallery.version >= gallery_loader.gallery.version:
+            _carry_ann_index(gallery_loader.gallery, new_gallery)
+            gallery_loader.replace(new_gallery)
+
+# İşler yeni bir görüntü gerektirdiğinde yenileyiciyi aralık dolmadan uyandırır
+_snapshot_istegi = threading.Event()
+
+def _snapshot_refresher():
+    while True:
+        _snapshot_istegi.wait(FACE_SNAPSHOT_INTERVAL)
+        _snapshot_istegi.clear()
+        try:
+            _refresh_snapshot()
+        except Exception as e:
+            print(f"Galeri görüntüsü güncellenirken hata: {e}")
+
+_snapshot_thread = None
+
+def start_snapshot_refresher():
+    """Galeri görüntüsünü arka planda güncel tutan iş parçacığını başlatır"""
+    global _snapshot_thread
+    if _snapshot_thread is None:
+        _snapshot_thread = threading.Thread(target=_snapshot_refresher, name="galeri-goruntusu", daemon=True)
+        _snapshot_thread.start()
+
+def _prepare_job_gallery():
+    """
+    İşin bekleyeceği galeri sürümünü döndürür. Disk görüntüsü daha eskiyse
+    yazma işi arka plandaki yenileyiciye bırakılır; istek beklemez
+    """
+    gallery = get_cached_faces()
+    if snapshot_version(FACE_SNAPSHOT_DIR, FACE_PROTOTYPES) < gallery.version:
+        start_snapshot_refresher()
+        _snapshot_istegi.set()
+    return gallery.version
+
+recognition_jobs = RecognitionJobManager(FACE_JOB_WORKERS, FACE_SNAPSHOT_DIR, _prepare_job_gallery)
+
+def sync_student_faces():
+    """Yalnızca değişen öğrencileri veritabanından çekip galeriye uygular"""
+    try:
+        gallery_loader.sync(time.time(), force=True)
+        return True
+    except Exception as e:
+        print(f"Yüz verileri senkronize edilirken hata: {e}")
+        return False
+
+def get_cached_faces(course_students=None, ders_id=None):
+    """
+    Güncel galeriyi döndürür. course_students verilirse yalnızca o öğrencilerden
+    oluşan alt galeri döner; ders_id ile birlikte verilirse alt galeri oturum
+    boyunca önbellekten kullanılır.
+    """
+    now = time.time()
+    try:
+        if gallery_loader.is_stale(now):
+            # İlk yüklemede bekle, sonrasında eski galeriyle devam et
+            gallery_loader.refresh(now, wait=gallery_loader.last_update == 0)
+        else:
+            gallery_loader.sync(now)
+    except Exception as e:
+        print(f"Yüz verileri yüklenirken hata: {e}")
+    gallery = gallery_loader.gallery
+    if course_students and ders_id:
+        return course_galleries.get(ders_id, course_students, gallery)
     if course_students:
-        return {sid: data for sid, data in student_faces_cache.items() if sid in course_students}
-    return student_faces_cache
+        return gallery.subset(course_students)
+    return gallery
+
+def prewarm_course_gallery(ders_id, course_students):
+    """Yoklama başlarken dersin alt galerisini hazırlar"""
+    try:
+        gallery = get_cached_faces(course_students, ders_id)
+        print(f"{ders_id} yoklaması için {len(gallery)} öğrencilik galeri hazırlandı.")
+        return True
+    except Exception as e:
+        print(f"Ders galerisi hazırlanırken hata: {e}")
+        return False
+
+def release_course_gallery(ders_id):
+    course_galleries.discard(ders_id)
 
-def preprocess_frame(frame, scale=0.25):
-    small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
-    return small_frame[:, :, ::-1]
+def make_face_tracker():
+    return FaceTracker(
+        lambda frame: detect_faces(frame, detection_scale(frame.shape, FACE_MIN_SIZE)),
+        encode_faces,
+        detect_every=FACE_TRACK_DETECT_EVERY,
+        reverify_every=FACE_TRACK_REVERIFY_EVERY
+    )
 
 def release_camera(camera):
+    # Abonelik bırakılır; cihazı kamera servisi boşta kalınca kapatır
     if camera and camera.isOpened():
         camera.release()
-        cv2.destroyAllWindows()
 
 @face_attendance.route('/yoklama-al/<ders_id>', methods=['POST'])
 def yoklama_al(ders_id):
@@ -60,73 +319,494 @@ def yoklama_al(ders_id):
             return jsonify({"error": "Ders bulunamadı"}), 404
 
         course_students = attendance.get("tumOgrenciler", [])
-        student_faces = get_cached_faces(course_students)
+        student_faces = get_cached_faces(course_students, ders_id)
 
-        if not student_faces:
+        if not len(student_faces):
             return jsonify({"error": "Yüz verisi bulunamadı"}), 404
 
-        known_face_encodings = [d["encoding"] for d in student_faces.values()]
-        known_face_ids = list(student_faces.keys())
-
-        camera = cv2.VideoCapture(0, cv2.CAP_DSHOW)  # ÖNEMLİ: Kamera hatası için DSHOW
-        if not camera.isOpened():
-            return jsonify({"error": "Kamera başlatılamadı"}), 400
+        # Tek öğrencilik doğrulamalar kamerayı sırayla kullanır
+        camera = get_camera_service().subscribe(exclusive=True)
 
         baslangic = time.time()
         max_sure = 30
-        while time.time() - baslangic < max_sure:
-            ret, frame = camera.read()
-            if not ret:
-                continue
-
-            rgb_small_frame = preprocess_frame(frame)
-            face_locations = face_recognition.face_locations(rgb_small_frame)
-            if not face_locations:
-                continue
-
-            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-            if not face_encodings:
-                continue
+        eslesme = None
+        # Bulanık, karanlık ya da değişmeyen kareler HOG tespitine girmez
+        process_fn, kalite = quality_filtered(detect_and_encode, skipped_value=[])
+        with RecognitionPipeline(camera, process_fn, FACE_PIPELINE_WORKERS) as pipeline:
+            for result in pipeline.results(deadline=baslangic + max_sure):
+                face_encodings = result.data
+                if not face_encodings:
+                    continue
 
-            for face_encoding in face_encodings:
-                distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                best_idx = np.argmin(distances)
-                match_ratio = 1 - distances[best_idx]
-
-                if match_ratio > FACE_RECOGNITION_TOLERANCE:
-                    student_id = known_face_ids[best_idx]
-                    student_name = student_faces[student_id]["name"]
-                    release_camera(camera)
-                    return jsonify({
-                        "message": "Yüz tanıma başarılı",
-                        "ogrenci_id": student_id,
-                        "ogrenci_adi": student_name,
-                        "match_ratio": f"{match_ratio:.2f}"
-                    }), 200
+                for student_id, distance in match_faces(student_faces, face_encodings):
+                    match_ratio = 1 - distance
+                    if match_ratio > FACE_RECOGNITION_TOLERANCE:
+                        eslesme = (student_id, match_ratio)
+                        break
+                if eslesme:
+                    break
+            kare_istatistikleri = pipeline.stats()
+            if kalite is not None:
+                kare_istatistikleri.update(kalite.stats())
 
         release_camera(camera)
-        return jsonify({"message": "Tanıma başarısız"}), 404
+        print(f"Yoklama kare istatistikleri: {kare_istatistikleri}")
+        if eslesme:
+            student_id, match_ratio = eslesme
+            return jsonify({
+                "message": "Yüz tanıma başarılı",
+                "ogrenci_id": student_id,
+                "ogrenci_adi": student_faces.name_of(student_id),
+                "match_ratio": f"{match_ratio:.2f}",
+                "kare_istatistikleri": kare_istatistikleri
+            }), 200
+
+        return jsonify({"message": "Tanıma başarısız", "kare_istatistikleri": kare_istatistikleri}), 404
 
+    except CameraBusyError as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         print(f"Yüz tanıma hatası: {str(e)}")
         release_camera(camera)
         return jsonify({"error": f"Yüz tanıma hatası: {str(e)}"}), 500
 
+def _sse(olay, veri):
+    return f"event: {olay}\ndata: {json.dumps(veri, ensure_ascii=False)}\n\n"
+
+def _sse_yaniti(govde):
+    return Response(govde, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _sse_hatasi(mesaj, kod):
+    # EventSource 200 dışı yanıtların gövdesini okuyamaz; kurulum hataları da
+    # tek bir hata olayı olarak gönderilip akış kapatılır
+    return _sse_yaniti(_sse("hata", {"error": mesaj, "kod": kod}))
+
+@face_attendance.route('/yoklama-akisi/<ders_id>', methods=['GET'])
+def yoklama_akisi(ders_id):
+    """
+    yoklama-al'ın Server-Sent Events sürümü. Olaylar: kamera (hazır), kare
+    (ilerleme), yuz (görülen yüz sayısı değişti), eslesme (öğrenci ve skoru),
+    bitti, hata. toplu=false iken ilk eşleşmede biter; istemci bağlantıyı
+    kapatırsa tarama hemen durur ve kamera bırakılır. Ders ya da yüz verisi
+    bulunamaması ve meşgul kamera da "hata" olayıyla (kod: 404/409/500) bildirilir.
+    """
+    try:
+        max_sure = min(float(request.args.get('sure', 30)), 120)
+        toplu = request.args.get('toplu', 'false').lower() in ('true', '1', 't')
+
+        attendance = db.attendance.find_one({"_id": ObjectId(ders_id)}, {"tumOgrenciler": 1})
+        if not attendance:
+            return _sse_hatasi("Ders bulunamadı", 404)
+
+        student_faces = get_cached_faces(attendance.get("tumOgrenciler", []), ders_id)
+        if not len(student_faces):
+            return _sse_hatasi("Yüz verisi bulunamadı", 404)
+
+        camera = get_camera_service().subscribe(exclusive=not toplu)
+    except CameraBusyError as e:
+        return _sse_hatasi(str(e), 409)
+    except Exception as e:
+        return _sse_hatasi(f"Yüz tanıma hatası: {str(e)}", 500)
+
+    def olaylar():
+        baslangic = time.time()
+        sebep = "sure"
+        tamamlandi = False
+        en_iyi_skorlar = {}
+        process_fn, kalite = quality_filtered(detect_and_encode, skipped_value=[])
+        pipeline = RecognitionPipeline(camera, process_fn, FACE_PIPELINE_WORKERS)
+        try:
+            pipeline.start()
+            yield _sse("kamera", {"durum": "hazir", "sure": max_sure, "toplu": toplu})
+            son_ilerleme = 0
+            son_yuz_sayisi = None
+            for result in pipeline.results(deadline=baslangic + max_sure):
+                simdi = time.time()
+                face_encodings = result.data or []
+                if len(face_encodings) != son_yuz_sayisi:
+                    son_yuz_sayisi = len(face_encodings)
+                    yield _sse("yuz", {"yuz_sayisi": son_yuz_sayisi})
+                # İlerleme olayları aynı zamanda kopan bağlantının fark edilmesini sağlar
+                if simdi - son_ilerleme >= 0.5:
+                    son_ilerleme = simdi
+                    yield _sse("kare", dict(pipeline.stats(), gecen_sn=round(simdi - baslangic, 1)))
+                if not face_encodings:
+                    continue
+
+                for student_id, distance in match_faces(student_faces, face_encodings):
+                    match_ratio = 1 - distance
+                    if match_ratio <= FACE_RECOGNITION_TOLERANCE or match_ratio <= en_iyi_skorlar.get(student_id, 0):
+                        continue
+                    yeni = student_id not in en_iyi_skorlar
+                    en_iyi_skorlar[student_id] = match_ratio
+                    if yeni:
+                        yield _sse("eslesme", {
+                            "ogrenci_id": student_id,
+                            "ogrenci_adi": student_faces.name_of(student_id),
+                            "match_ratio": f"{match_ratio:.2f}",
+                            "gecen_sn": round(simdi - baslangic, 1)
+                        })
+                if en_iyi_skorlar and not toplu:
+                    sebep = "eslesme"
+                    break
+
+            kare_istatistikleri = pipeline.stats()
+            if kalite is not None:
+                kare_istatistikleri.update(kalite.stats())
+            yield _sse("bitti", {
+                "sebep": sebep,
+                "taninanlar": [{
+                    "ogrenci_id": student_id,
+                    "ogrenci_adi": student_faces.name_of(student_id),
+                    "match_ratio": f"{skor:.2f}"
+                } for student_id, skor in sorted(en_iyi_skorlar.items(), key=lambda x: -x[1])],
+                "kare_istatistikleri": kare_istatistikleri
+            })
+            tamamlandi = True
+        except Exception as e:
+            print(f"Yoklama akışı hatası: {str(e)}")
+            yield _sse("hata", {"error": f"Yüz tanıma hatası: {str(e)}"})
+        finally:
+            pipeline.stop()
+            release_camera(camera)
+            if not tamamlandi:
+                print(f"Yoklama akışı {time.time() - baslangic:.1f} sn sonra kapandı "
+                      f"(istemci ayrıldı ya da hata), {pipeline.processed} kare işlendi")
+
+    yanit = _sse_yaniti(stream_with_context(olaylar()))
+    # Akış hiç başlamadan kapanırsa da abonelik bırakılır
+    yanit.call_on_close(lambda: release_camera(camera))
+    return yanit
+
+def _katilanlari_kaydet(ders_id, ogrenci_idleri):
+    if not ogrenci_idleri:
+        return
+    mark_present(db, ders_id, ogrenci_idleri)
+
+@face_attendance.route('/toplu-yoklama/<ders_id>', methods=['POST'])
+def toplu_yoklama(ders_id):
+    """Sınıftaki tüm yüzleri belirli bir süre boyunca tarar ve tanınanları topluca kaydeder"""
+    camera = None
+    try:
+        data = request.get_json(silent=True) or {}
+        max_sure = float(data.get("sure", 60))
+        kayit_araligi = float(data.get("kayit_araligi", 0))
+        takip = bool(data.get("takip", True))
+
+        attendance = db.attendance.find_one({"_id": ObjectId(ders_id)})
+        if not attendance:
+            return jsonify({"error": "Ders bulunamadı"}), 404
+
+        student_faces = get_cached_faces(attendance.get("tumOgrenciler", []), ders_id)
+        if not len(student_faces):
+            return jsonify({"error": "Yüz verisi bulunamadı"}), 404
+
+        camera = get_camera_service().subscribe()
+
+        if takip:
+            # İzler kare sırasına bağlı olduğundan tek işçi kullanılır
+            tracker = make_face_tracker()
+            process_fn = tracker.process
+            workers = 1
+        else:
+            tracker = None
+            process_fn = lambda frame: [(None, encoding) for encoding in detect_and_encode(frame)]
+            workers = FACE_PIPELINE_WORKERS
+
+        en_iyi_skorlar = {}
+        kaydedilmeyenler = set()
+        baslangic = time.time()
+        son_kayit = baslangic
+        with RecognitionPipeline(camera, process_fn, workers) as pipeline:
+            for result in pipeline.results(deadline=baslangic + max_sure):
+                if result.data:
+                    # F x N uzaklık matrisi tek seferde hesaplanır
+                    track_ids = [track_id for track_id, _ in result.data]
+                    face_encodings = [encoding for _, encoding in result.data]
+                    matches = match_faces(student_faces, face_encodings)
+                    for track_id, (student_id, distance) in zip(track_ids, matches):
+                        match_ratio = 1 - distance
+                        if match_ratio <= FACE_RECOGNITION_TOLERANCE:
+                            continue
+                        if tracker is not None:
+                            tracker.assign(track_id, student_id, distance)
+                        if student_id not in en_iyi_skorlar:
+                            kaydedilmeyenler.add(student_id)
+                        en_iyi_skorlar[student_id] = max(match_ratio, en_iyi_skorlar.get(student_id, 0))
+
+                if kayit_araligi and time.time() - son_kayit >= kayit_araligi:
+                    _katilanlari_kaydet(ders_id, kaydedilmeyenler)
+                    kaydedilmeyenler.clear()
+                    son_kayit = time.time()
+            kare_istatistikleri = pipeline.stats()
+            if tracker is not None:
+                kare_istatistikleri["takip"] = tracker.stats()
+
+        release_camera(camera)
+        _katilanlari_kaydet(ders_id, kaydedilmeyenler)
+
+        taninanlar = [{
+            "ogrenci_id": student_id,
+            "ogrenci_adi": student_faces.name_of(student_id),
+            "match_ratio": f"{skor:.2f}"
+        } for student_id, skor in sorted(en_iyi_skorlar.items(), key=lambda x: -x[1])]
+
+        return jsonify({
+            "message": f"{len(taninanlar)} öğrenci tanındı",
+            "taninanlar": taninanlar,
+            "islenen_kare": kare_istatistikleri["islenen_kare"],
+            "kare_istatistikleri": kare_istatistikleri
+        }), 200
+
+    except Exception as e:
+        print(f"Toplu yoklama hatası: {str(e)}")
+        release_camera(camera)
+        return jsonify({"error": f"Toplu yoklama hatası: {str(e)}"}), 500
+
+MAX_YUKLENEN_KARE = 100
+
+def _yuklenen_kareler():
+    if request.files:
+        for dosya in request.files.getlist('kareler') or list(request.files.values()):
+            yield dosya.read()
+    else:
+        yield from iter_jpegs(request.stream)
+
+@face_attendance.route('/yoklama-kare/<ders_id>', methods=['POST'])
+def yoklama_kare(ders_id):
+    """
+    İstemcinin gönderdiği JPEG kareleri (multipart 'kareler' alanı ya da art arda
+    JPEG akışı) tanır ve her kare için eşleşmeleri döndürür
+    """
+    try:
+        attendance = db.attendance.find_one({"_id": ObjectId(ders_id)})
+        if not attendance:
+            return jsonify({"error": "Ders bulunamadı"}), 404
+
+        student_faces = get_cached_faces(attendance.get("tumOgrenciler", []), ders_id)
+        if not len(student_faces):
+            return jsonify({"error": "Yüz verisi bulunamadı"}), 404
+
+        kaydet = request.args.get('kaydet', 'false').lower() in ('true', '1', 't')
+        sonuclar = []
+        taninanlar = set()
+        for kare_no, veri in enumerate(islice(_yuklenen_kareler(), MAX_YUKLENEN_KARE)):
+            frame = decode_frame(veri)
+            if frame is None:
+                sonuclar.append({"kare": kare_no, "error": "Görüntü çözülemedi"})
+                continue
+
+            face_encodings = detect_and_encode(frame)
+            eslesmeler = []
+            if face_encodings:
+                for student_id, distance in match_faces(student_faces, face_encodings):
+                    match_ratio = 1 - distance
+                    if match_ratio > FACE_RECOGNITION_TOLERANCE:
+                        taninanlar.add(student_id)
+                        eslesmeler.append({
+                            "ogrenci_id": student_id,
+                            "ogrenci_adi": student_faces.name_of(student_id),
+                            "match_ratio": f"{match_ratio:.2f}"
+                        })
+            sonuclar.append({"kare": kare_no, "yuz_sayisi": len(face_encodings), "eslesmeler": eslesmeler})
+
+        if not sonuclar:
+            return jsonify({"error": "Kare gönderilmedi"}), 400
+
+        if kaydet:
+            _katilanlari_kaydet(ders_id, taninanlar)
+
+        return jsonify({
+            "message": f"{len(sonuclar)} kare işlendi",
+            "kareler": sonuclar,
+            "taninanlar": sorted(taninanlar)
+        }), 200
+
+    except FrameTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        print(f"Kare tanıma hatası: {str(e)}")
+        return jsonify({"error": f"Kare tanıma hatası: {str(e)}"}), 500
+
+@face_attendance.route('/is/kare/<ders_id>', methods=['POST'])
+def is_kare(ders_id):
+    """Yüklenen kareleri tanıma işi olarak havuza gönderir"""
+    try:
+        attendance = db.attendance.find_one({"_id": ObjectId(ders_id)}, {"tumOgrenciler": 1})
+        if not attendance:
+            return jsonify({"error": "Ders bulunamadı"}), 404
+
+        kareler = list(islice(_yuklenen_kareler(), MAX_YUKLENEN_KARE))
+        if not kareler:
+            return jsonify({"error": "Kare gönderilmedi"}), 400
+
+        kaydet = request.args.get('kaydet', 'false').lower() in ('true', '1', 't')
+
+        def _kaydet(sonuc):
+            if kaydet:
+                taninanlar = {e["ogrenci_id"] for kare in sonuc["kareler"] for e in kare.get("eslesmeler", [])}
+                _katilanlari_kaydet(ders_id, taninanlar)
+
+        is_id = recognition_jobs.submit(
+            recognize_frames_job, attendance.get("tumOgrenciler", []), FACE_RECOGNITION_TOLERANCE, kareler,
+            on_done=_kaydet, tur="kare"
+        )
+        return jsonify({"message": "İş kuyruğa alındı", "is_id": is_id}), 202
+    except FrameTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        return jsonify({"error": f"İş oluşturulamadı: {str(e)}"}), 500
+
+@face_attendance.route('/is/kamera/<ders_id>', methods=['POST'])
+def is_kamera(ders_id):
+    """Kamera taramasını havuzda çalıştırır; toplu=true ise tüm sınıfı kaydeder"""
+    try:
+        data = request.get_json(silent=True) or {}
+        sure = float(data.get("sure", 30))
+        toplu = bool(data.get("toplu", False))
+
+        attendance = db.attendance.find_one({"_id": ObjectId(ders_id)}, {"tumOgrenciler": 1})
+        if not attendance:
+            return jsonify({"error": "Ders bulunamadı"}), 404
+
+        def _kaydet(sonuc):
+            if toplu:
+                _katilanlari_kaydet(ders_id, [t["ogrenci_id"] for t in sonuc["taninanlar"]])
+
+        # Kamerayı ana süreçteki servis okur; havuz süreci kareleri paylaşılan bellekten alır
+        camera = get_camera_service().subscribe()
+        try:
+            is_id = recognition_jobs.submit(
+                camera_scan_job, attendance.get("tumOgrenciler", []), FACE_RECOGNITION_TOLERANCE, sure, toplu,
+                camera.share(), on_done=_kaydet, on_finish=camera.release, tur="kamera"
+            )
+        except Exception:
+            camera.release()
+            raise
+        return jsonify({"message": "İş kuyruğa alındı", "is_id": is_id}), 202
+    except Exception as e:
+        return jsonify({"error": f"İş oluşturulamadı: {str(e)}"}), 500
+
+@face_attendance.route('/is/<is_id>', methods=['GET'])
+def is_durumu(is_id):
+    durum = recognition_jobs.status(is_id)
+    if durum is None:
+        return jsonify({"error": "İş bulunamadı"}), 404
+    return jsonify(durum), 200
+
+@face_attendance.route('/is/<is_id>/iptal', methods=['POST'])
+def is_iptal(is_id):
+    if not recognition_jobs.cancel(is_id):
+        return jsonify({"error": "İş bulunamadı"}), 404
+    return jsonify({"message": "İş iptal edildi", "is_id": is_id}), 200
+
+@face_attendance.route('/mukerrer-tarama', methods=['POST'])
+@token_required
+def mukerrer_tarama_baslat():
+    """Aynı kişinin farklı ogrenci_id'lerle kaydını bulmak için tüm çiftleri tarar"""
+    try:
+        if not request.user or request.user.get('role') != ROLE_ADMIN:
+            return jsonify({'error': 'Bu işlem için admin yetkisi gereklidir'}), 403
+
+        data = request.get_json(silent=True) or {}
+        esik = float(data.get("esik", 1 - FACE_RECOGNITION_TOLERANCE))
+        max_cift = int(data.get("max_cift", 100000))
+        is_id = recognition_jobs.submit(duplicate_scan_job, esik, max_cift, tur="mukerrer")
+        return jsonify({"message": "Tarama kuyruğa alındı", "is_id": is_id, "tarama_id": is_id}), 202
+    except Exception as e:
+        return jsonify({"error": f"Tarama başlatılamadı: {str(e)}"}), 500
+
+@face_attendance.route('/mukerrer-tarama', methods=['GET'])
+@token_required
+def mukerrer_taramalari():
+    try:
+        if not request.user or request.user.get('role') != ROLE_ADMIN:
+            return jsonify({'error': 'Bu işlem için admin yetkisi gereklidir'}), 403
+
+        taramalar = list(db.mukerrer_taramalari.find().sort("tarih", -1).limit(20))
+        for tarama in taramalar:
+            tarama["tarama_id"] = tarama.pop("_id")
+        return jsonify({"taramalar": taramalar}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@face_attendance.route('/mukerrer-tarama/<tarama_id>', methods=['GET'])
+@token_required
+def mukerrer_ciftleri(tarama_id):
+    """Taramada bulunan çiftleri uzaklığa göre sıralı, sayfa sayfa döndürür"""
+    try:
+        if not request.user or request.user.get('role') != ROLE_ADMIN:
+            return jsonify({'error': 'Bu işlem için admin yetkisi gereklidir'}), 403
+
+        tarama = db.mukerrer_taramalari.find_one({"_id": tarama_id})
+        if not tarama:
+            return jsonify({"error": "Tarama bulunamadı"}), 404
+
+        sayfa = max(1, request.args.get('sayfa', 1, type=int))
+        boyut = min(max(1, request.args.get('boyut', 50, type=int)), 500)
+        ciftler = list(db.mukerrer_ciftler.find({"tarama_id": tarama_id}, {"_id": 0, "tarama_id": 0})
+                       .sort("uzaklik", 1).skip((sayfa - 1) * boyut).limit(boyut))
+        tarama["tarama_id"] = tarama.pop("_id")
+        return jsonify({
+            "tarama": tarama,
+            "sayfa": sayfa,
+            "boyut": boyut,
+            "toplam": tarama.get("cift_sayisi", 0),
+            "ciftler": ciftler
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @face_attendance.route('/cache-refresh', methods=['POST'])
 def refresh_cache():
     success = load_student_faces()
     if success:
-        return jsonify({"message": f"Önbellek güncellendi. {len(student_faces_cache)} yüz yüklendi."}), 200
+        return jsonify({"message": f"Önbellek güncellendi. {len(gallery_loader.gallery)} yüz yüklendi."}), 200
     else:
         return jsonify({"error": "Önbellek güncelleme hatası"}), 500
 
+@face_attendance.route('/ann-recall', methods=['GET'])
+def ann_recall():
+    """
+    ANN (ivf) ya da int8 indeksinin kaba kuvvet aramaya göre isabet oranını
+    raporlar. ?tur=ivf|int8 ile etkin olmayan indeks de ölçülebilir.
+    """
+    try:
+        gallery = get_cached_faces()
+        if not len(gallery):
+            return jsonify({"error": "Yüz verisi bulunamadı"}), 404
+
+        kind = request.args.get('tur') or _index_kind() or IVFIndex.kind
+        if kind not in (IVFIndex.kind, Int8Index.kind):
+            return jsonify({"error": "Geçersiz indeks türü"}), 400
+        index = gallery.ann_index
+        if index is None or index.kind != kind:
+            # Yalnızca ölçüm için geçici bir indeks kur
+            index = _make_index(kind, gallery)
+
+        ayarlar = {
+            "sample": request.args.get('ornek', 200, type=int),
+            "k": request.args.get('k', 1, type=int)
+        }
+        if kind == Int8Index.kind:
+            ayarlar["rerank"] = request.args.get('rerank', None, type=int)
+        else:
+            ayarlar["n_probe"] = request.args.get('probe', None, type=int)
+        rapor = index.recall_report(gallery, **ayarlar)
+        rapor["tur"] = kind
+        rapor["indeks_aktif"] = gallery.ann_index is index
+        return jsonify({"success": True, "rapor": rapor}), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @face_attendance.route('/system-status', methods=['GET'])
 def system_status():
     try:
-        cached_students = len(student_faces_cache)
+        cached_students = len(gallery_loader.gallery)
         total_students = db.ogrenciler.count_documents({})
         face_data_students = db.ogrenciler.count_documents({"encoding": {"$exists": True}})
-        last_update_time = datetime.datetime.fromtimestamp(last_cache_update).strftime('%Y-%m-%d %H:%M:%S')
+        last_update_time = datetime.datetime.fromtimestamp(gallery_loader.last_update).strftime('%Y-%m-%d %H:%M:%S')
 
         return jsonify({
             "success": True,
@@ -135,8 +815,13 @@ def system_status():
                 "total_students": total_students,
                 "face_data_students": face_data_students,
                 "last_cache_update": last_update_time,
+                "gallery_version": gallery_loader.gallery.version,
                 "face_recognition_tolerance": FACE_RECOGNITION_TOLERANCE,
-                "cache_expiry_seconds": CACHE_EXPIRY
+                "cache_expiry_seconds": CACHE_EXPIRY,
+                "recognition_jobs": recognition_jobs.stats(),
+                "course_galleries": course_galleries.stats(),
+                "face_detector": active_detector(),
+                "kamera": get_camera_service().stats()
             }
         }), 200
     except Exception as e:
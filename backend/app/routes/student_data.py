@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from ..utils.db import get_db
+from ..utils.gallery_version import next_version, mark_deleted
 from bson import ObjectId
 import numpy as np
 import os
@@ -160,6 +161,10 @@ def update_student(ogrenci_id):
         if not update_data:
             return jsonify({"success": False, "error": "Güncellenecek alan bulunamadı"}), 400
         
+        # Ad/soyad değişikliği yüz galerisine de yansısın diye sürümü artır
+        if 'ad' in update_data or 'soyad' in update_data:
+            update_data['surum'] = next_version(db)
+
         # Veritabanını güncelle
         result = db.ogrenciler.update_one(
             {"ogrenci_id": ogrenci_id},
@@ -207,13 +212,13 @@ def delete_student_data(ogrenci_id):
         # Öğrencinin encoding verisini veritabanından temizle
         db.ogrenciler.update_one(
             {"ogrenci_id": ogrenci_id},
-            {"$unset": {"encoding": "", "foto_galerisi": ""}}
+            {"$unset": {"encoding": "", "foto_galerisi": ""}, "$set": {"surum": next_version(db)}}
         )
         
-        # Yüz verisi önbelleğini yenile (face_attendance.py'deki fonksiyona ulaşamıyorsak)
+        # Yüz verisi önbelleğini yalnızca bu öğrenci için güncelle
         try:
-            from .face_attendance import load_student_faces
-            load_student_faces()
+            from .face_attendance import sync_student_faces
+            sync_student_faces()
         except ImportError:
             # Yüz verileri önbelleği yenileme API'sini çağır
             pass
@@ -244,10 +249,12 @@ def delete_student(ogrenci_id):
         result = db.ogrenciler.delete_one({"ogrenci_id": ogrenci_id})
         
         if result.deleted_count > 0:
-            # Yüz verisi önbelleğini yenile
+            mark_deleted(db, ogrenci_id)
+
+            # Yüz verisi önbelleğini yalnızca bu öğrenci için güncelle
             try:
-                from .face_attendance import load_student_faces
-                load_student_faces()
+                from .face_attendance import sync_student_faces
+                sync_student_faces()
             except ImportError:
                 # Yüz verileri önbelleği yenileme API'sini çağır
                 pass
@@ -1,20 +1,65 @@
 from flask import Blueprint, request, jsonify
 import cv2
 import os
-import face_recognition
-import numpy as np
+import time
 from ..utils.db import get_db
+from ..utils.gallery_version import next_version, mark_deleted
+from ..utils.encoding_codec import pack_encoding
+from ..utils.frame_pipeline import RecognitionPipeline
+from ..utils.face_ops import detect_and_encode, FACE_ENROLL_MIN_SIZE, FACE_PROTOTYPES, ENROLL_LANDMARK_MODEL
+from ..utils.face_gallery import select_prototypes
+from ..utils.frame_quality import quality_filtered
+from ..utils.enrollment_jobs import EnrollmentJobManager
+from ..utils.camera_service import get_camera_service, CameraBusyError
 
 db = get_db()
 
 veri_topla = Blueprint('veri_topla', __name__)
 
+# Kare işleyen iş parçacığı sayısı ve toplama için üst süre sınırı
+FACE_PIPELINE_WORKERS = int(os.getenv('FACE_PIPELINE_WORKERS', 2))
+VERI_TOPLA_MAX_SURE = 60
+
 def ensure_dir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
         print(f"Dizin oluşturuldu: {directory}")
     return directory
 
+def _kaydi_kaydet(ogrenci_id, ogrenci_ad, ogrenci_soyad, foto_galerisi, yuz_encodings):
+    """Prototip encoding'leri tek yazmayla kaydeder ve galeriyi artımlı günceller"""
+    ogrenci_update = {
+        "ogrenci_id": ogrenci_id,
+        "foto_galerisi": foto_galerisi,
+        "encoding": pack_encoding(select_prototypes(yuz_encodings, FACE_PROTOTYPES)),
+        "surum": next_version(db)
+    }
+
+    if ogrenci_ad:
+        ogrenci_update["ad"] = ogrenci_ad
+    if ogrenci_soyad:
+        ogrenci_update["soyad"] = ogrenci_soyad
+
+    db.ogrenciler.update_one(
+        {"ogrenci_id": ogrenci_id},
+        {"$set": ogrenci_update},
+        upsert=True
+    )
+
+    from .face_attendance import sync_student_faces
+    sync_student_faces()
+
+# Kayıt işlerinde kareleri encode eden süreç sayısı (boş ya da tanımsızsa çekirdek sayısı)
+FACE_ENROLL_WORKERS = int(os.getenv('FACE_ENROLL_WORKERS') or os.cpu_count() or 1)
+
+kayit_isleri = EnrollmentJobManager(_kaydi_kaydet, FACE_ENROLL_WORKERS,
+                                    min_face_px=FACE_ENROLL_MIN_SIZE, max_duration=VERI_TOPLA_MAX_SURE)
+
+def _kareyi_isle(kare):
+    # Kayıtta yüz kameraya yakın olduğundan tespit küçük karede yapılır
+    current_encodings = detect_and_encode(kare, min_face_px=FACE_ENROLL_MIN_SIZE, landmarks=ENROLL_LANDMARK_MODEL)
+    return current_encodings[0] if current_encodings else None
+
 @veri_topla.route('/ogrenci/veri-topla', methods=['POST'])
 def veri_topla_route():
     kamera = None
@@ -34,9 +79,8 @@ def veri_topla_route():
         klasor_yolu = os.path.join(ensure_dir(base_dir), ogrenci_id)
         ensure_dir(klasor_yolu)
 
-        kamera = cv2.VideoCapture(0)
-        if not kamera.isOpened():
-            return jsonify({"error": "Kamera açılırken hata oluştu"}), 400
+        # Kayıt sırasında kamerayı başka bir tek kişilik işlem kullanamaz
+        kamera = get_camera_service().subscribe(exclusive=True)
 
         sayac = 0
         max_goruntu = 10
@@ -45,71 +89,57 @@ def veri_topla_route():
 
         print(f"'{ogrenci_ad} {ogrenci_soyad}' için veri toplama başlatıldı...")
 
-        while sayac < max_goruntu:
-            ret, kare = kamera.read()
-            if not ret:
-                return jsonify({"error": "Kamera verisi okunamadı"}), 400
-
-            rgb_kare = cv2.cvtColor(kare, cv2.COLOR_BGR2RGB)
-            yuzu_tespit_et = face_recognition.face_locations(rgb_kare)
-
-            cv2.putText(kare, f"Foto: {sayac+1}/{max_goruntu}",
-                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-
-            if yuzu_tespit_et:
-                try:
-                    current_encodings = face_recognition.face_encodings(rgb_kare, yuzu_tespit_et)
-                    if current_encodings:
-                        dosya_adi = os.path.join(klasor_yolu, f"{sayac+1}.jpg")
-                        cv2.imwrite(dosya_adi, kare)
-
-                        foto_galerisi.append(dosya_adi)
-                        yuz_encodings.append(current_encodings[0])
-                        sayac += 1
-                        print(f"Fotoğraf {sayac}/{max_goruntu} kaydedildi.")
-                except Exception as encode_error:
-                    print(f"[UYARI] Yüz encoding alınırken hata: {encode_error}")
-
-            cv2.imshow("Yüzünüzü kameraya gösterin", kare)
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                print("İşlem kullanıcı tarafından sonlandırıldı.")
-                break
-
-            cv2.waitKey(200)
+        # Kareler arka planda yakalanıp işlenir, burada yalnızca sonuçlar toplanır
+        # Kayda uygun olmayan ve bir öncekinin tekrarı olan kareler encode edilmez
+        process_fn, kalite = quality_filtered(_kareyi_isle)
+        with RecognitionPipeline(kamera, process_fn, FACE_PIPELINE_WORKERS) as pipeline:
+            for sonuc in pipeline.results(deadline=time.time() + VERI_TOPLA_MAX_SURE):
+                kare = sonuc.frame
+                if sonuc.data is not None:
+                    dosya_adi = os.path.join(klasor_yolu, f"{sayac+1}.jpg")
+                    cv2.imwrite(dosya_adi, kare)
+
+                    foto_galerisi.append(dosya_adi)
+                    yuz_encodings.append(sonuc.data)
+                    sayac += 1
+                    print(f"Fotoğraf {sayac}/{max_goruntu} kaydedildi.")
+
+                cv2.putText(kare, f"Foto: {sayac}/{max_goruntu}",
+                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+                cv2.imshow("Yüzünüzü kameraya gösterin", kare)
+
+                if sayac >= max_goruntu:
+                    break
+
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    print("İşlem kullanıcı tarafından sonlandırıldı.")
+                    break
+            kare_istatistikleri = pipeline.stats()
+            if kalite is not None:
+                kare_istatistikleri.update(kalite.stats())
 
         if kamera:
             kamera.release()
         cv2.destroyAllWindows()
+        print(f"Veri toplama kare istatistikleri: {kare_istatistikleri}")
+
+        if not pipeline.captured:
+            return jsonify({"error": "Kamera verisi okunamadı"}), 400
 
         if not yuz_encodings:
             return jsonify({"error": "Yüz verileri alınamadı"}), 400
 
-        ortalama_encoding = np.mean(yuz_encodings, axis=0)
-
-        ogrenci_update = {
-            "ogrenci_id": ogrenci_id,
-            "foto_galerisi": foto_galerisi,
-            "encoding": ortalama_encoding.tolist()
-        }
-
-        if ogrenci_ad:
-            ogrenci_update["ad"] = ogrenci_ad
-        if ogrenci_soyad:
-            ogrenci_update["soyad"] = ogrenci_soyad
-
-        result = db.ogrenciler.update_one(
-            {"ogrenci_id": ogrenci_id},
-            {"$set": ogrenci_update},
-            upsert=True
-        )
+        _kaydi_kaydet(ogrenci_id, ogrenci_ad, ogrenci_soyad, foto_galerisi, yuz_encodings)
 
         return jsonify({
             "message": "Yüz verileri başarıyla toplandı",
             "ogrenci_id": ogrenci_id,
-            "fotograf_sayisi": len(foto_galerisi)
+            "fotograf_sayisi": len(foto_galerisi),
+            "kare_istatistikleri": kare_istatistikleri
         }), 200
 
+    except CameraBusyError as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         if kamera:
             kamera.release()
@@ -118,6 +148,39 @@ def veri_topla_route():
         return jsonify({"error": f"Veri toplama sırasında bir hata oluştu: {str(e)}"}), 500
 
 
+@veri_topla.route('/ogrenci/veri-topla-is', methods=['POST'])
+def veri_topla_is():
+    """Yüz kaydını arka plan işi olarak başlatır; ilerleme is_id ile sorgulanır"""
+    try:
+        data = request.get_json(silent=True) or {}
+        ogrenci_id = data.get("ogrenci_id")
+        if not ogrenci_id:
+            return jsonify({"error": "Öğrenci ID'si sağlanmalı"}), 400
+
+        klasor_yolu = ensure_dir(os.path.join(ensure_dir("dataset"), ogrenci_id))
+        hedef = int(data.get("foto_sayisi", 10))
+        is_id = kayit_isleri.submit(ogrenci_id, klasor_yolu, hedef, data.get("ad", ""), data.get("soyad", ""))
+        return jsonify({"message": "Kayıt işi başlatıldı", "is_id": is_id}), 202
+    except Exception as e:
+        print(f"Kayıt işi oluşturma hatası: {str(e)}")
+        return jsonify({"error": f"Kayıt işi oluşturulamadı: {str(e)}"}), 500
+
+
+@veri_topla.route('/ogrenci/veri-topla-is/<is_id>', methods=['GET'])
+def veri_topla_is_durumu(is_id):
+    durum = kayit_isleri.status(is_id)
+    if durum is None:
+        return jsonify({"error": "İş bulunamadı"}), 404
+    return jsonify(durum), 200
+
+
+@veri_topla.route('/ogrenci/veri-topla-is/<is_id>/iptal', methods=['POST'])
+def veri_topla_is_iptal(is_id):
+    if not kayit_isleri.cancel(is_id):
+        return jsonify({"error": "İş bulunamadı"}), 404
+    return jsonify({"message": "İş iptal edildi", "is_id": is_id}), 200
+
+
 @veri_topla.route('/ogrenci/veri-sil/<ogrenci_id>', methods=['DELETE'])
 def veri_sil_route(ogrenci_id):
     try:
@@ -125,6 +188,10 @@ def veri_sil_route(ogrenci_id):
             return jsonify({"error": "Öğrenci ID'si sağlanmalı"}), 400
 
         result = db.ogrenciler.delete_one({"ogrenci_id": ogrenci_id})
+        if result.deleted_count:
+            mark_deleted(db, ogrenci_id)
+            from .face_attendance import sync_student_faces
+            sync_student_faces()
 
         klasor_yolu = f"dataset/{ogrenci_id}"
         if os.path.exists(klasor_yolu):
@@ -0,0 +1,239 @@
+import threading
+import time
+import numpy as np
+
+
+def _sq_distances(queries, vectors, vector_sq_norms):
+    d2 = queries @ vectors.T
+    d2 *= -2.0
+    d2 += vector_sq_norms
+    d2 += np.einsum("ij,ij->i", queries, queries)[:, None]
+    np.maximum(d2, 0.0, out=d2)
+    return d2
+
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Basit Lloyd k-means; merkezleri float32 olarak döndürür"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        centroid_sq = np.einsum("ij,ij->i", centroids, centroids)
+        assign = np.argmin(_sq_distances(vectors, centroids, centroid_sq), axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=n_clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Boş kalan kümeleri merkezden en uzak noktalarla yeniden başlat
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            residual = ((vectors - centroids[assign]) ** 2).sum(axis=1)
+            far = np.argsort(residual)[-len(empty):]
+            centroids[empty] = vectors[far]
+    return centroids
+
+
+class _InvertedList:
+    def __init__(self, dim):
+        self.vectors = np.zeros((8, dim), dtype=np.float32)
+        self.sq_norms = np.zeros(8, dtype=np.float32)
+        self.ids = []
+
+    def append(self, key, vector):
+        n = len(self.ids)
+        if n == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.sq_norms = np.concatenate([self.sq_norms, np.zeros_like(self.sq_norms)])
+        self.vectors[n] = vector
+        self.sq_norms[n] = np.dot(vector, vector)
+        self.ids.append(key)
+        return n
+
+    def remove_at(self, pos):
+        last = len(self.ids) - 1
+        moved = None
+        if pos != last:
+            self.vectors[pos] = self.vectors[last]
+            self.sq_norms[pos] = self.sq_norms[last]
+            self.ids[pos] = self.ids[last]
+            moved = self.ids[pos]
+        self.ids.pop()
+        return moved
+
+
+class IVFIndex:
+    """
+    K-means bölümlemeli (IVF) yaklaşık en yakın komşu indeksi.
+    Sorgu en yakın n_probe kümedeki adaylarla sınırlanır, adaylar kesin
+    uzaklıkla yeniden sıralanır. Bir öğrencinin birden çok prototipi
+    (öğrenci_id, j) anahtarlarıyla ayrı kümelere düşebilir; sonuçlar
+    öğrenci başına en yakın prototiple döndürülür.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, n_lists=None, n_probe=8, iterations=10, seed=0, train_sample=50000):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+        self.train_sample = train_sample
+        self.centroids = None
+        self._centroid_sq = None
+        self._lists = []
+        self._where = {}
+        self._counts = {}
+        self._built_size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._where)
+
+    def build(self, gallery):
+        """Galerideki tüm prototip encoding'lerinden indeksi sıfırdan kurar"""
+        vectors = np.ascontiguousarray(gallery.matrix, dtype=np.float32)
+        k = gallery.prototypes
+        keys = [(sid, j) for sid in gallery.ids for j in range(k)]
+        n = len(keys)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = max(1, min(n_lists, n))
+        with self._lock:
+            self._lists = [_InvertedList(gallery.dim) for _ in range(n_lists)]
+            self._where = {}
+            self._counts = {sid: k for sid in gallery.ids}
+            if not n:
+                self.centroids = None
+                self._built_size = 0
+                return self
+            train = vectors
+            if n > self.train_sample:
+                rng = np.random.default_rng(self.seed)
+                train = vectors[rng.choice(n, self.train_sample, replace=False)]
+            self.centroids = kmeans(train, n_lists, self.iterations, self.seed)
+            self._centroid_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+            assign = self._assign(vectors)
+            for key, vector, list_no in zip(keys, vectors, assign):
+                pos = self._lists[list_no].append(key, vector)
+                self._where[key] = (list_no, pos)
+            self._built_size = n
+        return self
+
+    def attach(self, gallery):
+        """Aynı içerikteki başka bir galeriyle kullanılır; IVF vektörlerini kendisi tuttuğundan değişiklik gerekmez"""
+        return self
+
+    def _assign(self, vectors):
+        return np.argmin(_sq_distances(vectors, self.centroids, self._centroid_sq), axis=1)
+
+    def needs_rebuild(self):
+        """Kurulumdan bu yana boyut iki katına çıktıysa ya da yarıya indiyse kümeler yeniden eğitilmeli"""
+        n = len(self._where)
+        return self.centroids is None or n > 2 * self._built_size or n < self._built_size // 2
+
+    def add(self, student_id, encoding):
+        """Öğrencinin prototiplerini en yakın kümelere ekler, varsa önce eski kayıtlarını siler"""
+        vectors = np.asarray(encoding, dtype=np.float32)
+        vectors = vectors.reshape(-1, vectors.shape[-1])
+        with self._lock:
+            self.remove(student_id)
+            if self.centroids is None:
+                return False
+            for j, (vector, list_no) in enumerate(zip(vectors, self._assign(vectors))):
+                pos = self._lists[list_no].append((student_id, j), vector)
+                self._where[(student_id, j)] = (list_no, pos)
+            self._counts[student_id] = len(vectors)
+            return True
+
+    def remove(self, student_id):
+        with self._lock:
+            count = self._counts.pop(student_id, None)
+            if count is None:
+                return False
+            for j in range(count):
+                location = self._where.pop((student_id, j), None)
+                if location is None:
+                    continue
+                list_no, pos = location
+                moved = self._lists[list_no].remove_at(pos)
+                if moved is not None:
+                    self._where[moved] = (list_no, pos)
+            return True
+
+    def search(self, encodings, k=1, n_probe=None):
+        """
+        Her sorgu için en yakın k öğrenciyi (id, uzaklık) listesi olarak döndürür.
+        Ayrıca taranan toplam aday sayısını verir.
+        """
+        queries = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1)
+        n_probe = n_probe or self.n_probe
+        results = []
+        scanned = 0
+        with self._lock:
+            if self.centroids is None:
+                return [[] for _ in queries], 0
+            n_probe = min(n_probe, len(self._lists))
+            probe = np.argsort(_sq_distances(queries, self.centroids, self._centroid_sq), axis=1)[:, :n_probe]
+            for query, lists in zip(queries, probe):
+                candidates = [self._lists[i] for i in lists if self._lists[i].ids]
+                if not candidates:
+                    results.append([])
+                    continue
+                q = query[None, :]
+                d = np.concatenate([
+                    _sq_distances(q, c.vectors[:len(c.ids)], c.sq_norms[:len(c.ids)])[0]
+                    for c in candidates
+                ])
+                np.sqrt(d, out=d)
+                keys = [key for c in candidates for key in c.ids]
+                scanned += len(keys)
+                # Aynı öğrencinin diğer prototipleri atlanarak en yakın k öğrenci seçilir
+                found = []
+                seen = set()
+                for i in np.argsort(d):
+                    student_id = keys[i][0]
+                    if student_id in seen:
+                        continue
+                    seen.add(student_id)
+                    found.append((student_id, float(d[i])))
+                    if len(found) == k:
+                        break
+                results.append(found)
+        return results, scanned
+
+    def recall_report(self, gallery, sample=200, noise=0.02, k=1, n_probe=None, seed=0):
+        """
+        Galeriden örneklenen gürültülü sorgularla indeksin kaba kuvvet aramaya
+        göre top-k isabet oranını ve sürelerini ölçer
+        """
+        n = len(gallery)
+        if not n:
+            return {"recall": None, "sorgu_sayisi": 0}
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(n, min(sample, n), replace=False)
+        queries = gallery.matrix[rows * gallery.prototypes] + \
+            rng.normal(0, noise, (len(rows), gallery.dim)).astype(np.float32)
+
+        t0 = time.perf_counter()
+        exact = gallery.distances(queries)
+        top = min(k, n)
+        exact_top = np.argpartition(exact, top - 1, axis=1)[:, :top]
+        brute_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        approx, scanned = self.search(queries, k=k, n_probe=n_probe)
+        ann_time = time.perf_counter() - t0
+
+        hits = 0
+        for exact_rows, found in zip(exact_top, approx):
+            expected = {gallery.ids[r] for r in exact_rows}
+            hits += len(expected & {sid for sid, _ in found})
+        return {
+            "recall": hits / (len(rows) * top),
+            "sorgu_sayisi": len(rows),
+            "k": k,
+            "n_probe": min(n_probe or self.n_probe, len(self._lists)),
+            "kume_sayisi": len(self._lists),
+            "ortalama_aday": scanned / len(rows),
+            "kaba_kuvvet_ms": brute_time * 1000,
+            "ann_ms": ann_time * 1000
+        }
@@ -0,0 +1,213 @@
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+
+# Öğrenci-ders başına yoklama sayaçları: {ogrno, dersKodu, dersAdi, toplamDers, katildigiDers}.
+# Yoklama başlatılırken toplamDers, öğrenci katılanlara gerçekten eklendiğinde ya
+# da çıkarıldığında katildigiDers değişir. Tüm geçmiş rebuild_counters ile bir kez
+# hesaplanana kadar takip sorguları doğrudan attendance üzerinden yapılır.
+HAZIR_ID = "yoklama_sayaclari_hazir"
+
+# Her katılım güncellemesi oturumun "surum" alanını bir artırır ve değişen her
+# öğrenci için "degisiklikler" dizisine {surum, ogrenci, katildi} ekler; istemci
+# yalnızca bildiği sürümden sonrakileri isteyebilir. tumOgrenciler değişirse "kadroSurumu" artar.
+# Dizide yalnızca son DEGISIKLIK_SINIRI kayıt tutulur; daha eski bir sürümü bilen
+# istemci tam yanıtı alır.
+DEGISIKLIK_SINIRI = 500
+
+
+def _append_changes(yeni):
+    """degisiklikler dizisine yeni kayıtları ekleyip son DEGISIKLIK_SINIRI kaydı bırakan ifade"""
+    return {"$slice": [
+        {"$concatArrays": [{"$ifNull": ["$degisiklikler", []]}, yeni]},
+        -DEGISIKLIK_SINIRI
+    ]}
+
+
+def _change_pipeline(katilanlar, ogrno, katildi):
+    return [
+        {"$set": {"surum": {"$add": [{"$ifNull": ["$surum", 0]}, 1]}}},
+        {"$set": {
+            "katilanlar": katilanlar,
+            "degisiklikler": _append_changes(
+                [{"surum": "$surum", "ogrenci": {"$literal": ogrno}, "katildi": katildi}])
+        }}
+    ]
+
+
+def ensure_counter_indexes(db):
+    db.yoklama_sayaclari.create_index([("ogrno", 1), ("dersKodu", 1)], unique=True)
+    db.attendance.create_index([("tumOgrenciler", 1), ("tarih", 1)])
+
+
+def counters_ready(db):
+    return db.sayaclar.find_one({"_id": HAZIR_ID}) is not None
+
+
+def count_session(db, ders_kodu, ders_adi, ogrenciler):
+    """Yeni yoklama oturumunu dersin tüm öğrencilerinin toplamına ekler"""
+    if not ogrenciler:
+        return
+    db.yoklama_sayaclari.bulk_write([
+        UpdateOne(
+            {"ogrno": ogrno, "dersKodu": ders_kodu},
+            {"$inc": {"toplamDers": 1, "katildigiDers": 0}, "$set": {"dersAdi": ders_adi}},
+            upsert=True
+        ) for ogrno in set(ogrenciler)
+    ], ordered=False)
+
+
+def _adjust_present(db, ders_kodu, ogrenciler, delta):
+    if not ogrenciler or not ders_kodu:
+        return
+    db.yoklama_sayaclari.bulk_write([
+        UpdateOne({"ogrno": ogrno, "dersKodu": ders_kodu}, {"$inc": {"katildigiDers": delta}})
+        for ogrno in ogrenciler
+    ], ordered=False)
+
+
+def mark_present(db, attendance_id, ogrenciler):
+    """
+    Öğrencileri tek bir koşullu güncellemeyle oturumun katılanlarına ekler.
+    Eklenecekler sunucuda gönderilen sırayla süzülüp listenin sonuna eklenir,
+    mevcut katılanların sırası korunur; hepsi zaten katıldıysa
+    yazma yapılmaz. Gerçekten eklenenler güncelleme öncesi belgeden çıkarılır,
+    böylece eşzamanlı iki kayıt aynı öğrenciyi iki kez saymaz ve sayaçlar tek
+    toplu yazmayla artırılır. Eklenen öğrencileri döndürür.
+    """
+    ogrenciler = list(dict.fromkeys(ogrenciler))
+    if not ogrenciler:
+        return []
+    katilanlar = {"$ifNull": ["$katilanlar", []]}
+    onceki = db.attendance.find_one_and_update(
+        {"_id": ObjectId(attendance_id), "katilanlar": {"$not": {"$all": ogrenciler}}},
+        [
+            {"$set": {"_yeni": {"$filter": {
+                "input": {"$literal": ogrenciler},
+                "cond": {"$not": [{"$in": ["$$this", katilanlar]}]}
+            }}}},
+            {"$set": {
+                "katilanlar": {"$concatArrays": [katilanlar, "$_yeni"]},
+                "surum": {"$add": [{"$ifNull": ["$surum", 0]}, 1]}
+            }},
+            {"$set": {"degisiklikler": _append_changes(
+                {"$map": {"input": "$_yeni", "in": {"surum": "$surum", "ogrenci": "$$this", "katildi": True}}}
+            )}},
+            {"$unset": "_yeni"}
+        ],
+        projection={"dersKodu": 1, "katilanlar": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if onceki is None:
+        return []
+
+    mevcut = set(onceki.get("katilanlar") or [])
+    eklenenler = [ogrno for ogrno in ogrenciler if ogrno not in mevcut]
+    _adjust_present(db, onceki.get("dersKodu"), eklenenler, 1)
+    return eklenenler
+
+
+def mark_absent(db, attendance_id, ogrno):
+    """Öğrenciyi katılanlardan çıkarır; gerçekten çıkarıldıysa sayacını azaltır"""
+    oturum = db.attendance.find_one_and_update(
+        {"_id": ObjectId(attendance_id), "katilanlar": ogrno},
+        _change_pipeline({"$filter": {"input": "$katilanlar", "cond": {"$ne": ["$$this", {"$literal": ogrno}]}}},
+                         ogrno, False),
+        projection={"dersKodu": 1}
+    )
+    if oturum is None:
+        return False
+    _adjust_present(db, oturum.get("dersKodu"), [ogrno], -1)
+    return True
+
+
+def attendance_changes(db, attendance_id, since):
+    """
+    Oturumun sürümlerini ve since'ten sonraki katılım değişikliklerini büyük
+    dizileri okumadan döndürür; oturum yoksa None. Dizi sınıra ulaşıp
+    kırpıldıysa ve since en eski tutulan sürümden eskiyse değişiklikler eksik
+    olabilir; bu durumda "eksiksiz" False olur.
+    """
+    degisiklikler = {"$ifNull": ["$degisiklikler", []]}
+    return next(db.attendance.aggregate([
+        {"$match": {"_id": ObjectId(attendance_id)}},
+        {"$project": {
+            "_id": 0,
+            "surum": {"$ifNull": ["$surum", 0]},
+            "kadroSurumu": {"$ifNull": ["$kadroSurumu", 0]},
+            "degisiklikler": {"$filter": {
+                "input": degisiklikler,
+                "cond": {"$gt": ["$$this.surum", since]}
+            }},
+            # Sınırın altındaki dizi hiç kırpılmamıştır. Kırpma bir sürümün
+            # kayıtlarını bölebildiği için en eski sürüm de bilinmiş olmalı
+            "eksiksiz": {"$or": [
+                {"$lt": [{"$size": degisiklikler}, DEGISIKLIK_SINIRI]},
+                {"$gte": [since, {"$arrayElemAt": [{"$ifNull": ["$degisiklikler.surum", []]}, 0]}]}
+            ]}
+        }}
+    ]), None)
+
+
+def tracking_pipeline(ogrno, tarih_filtresi=None):
+    """Öğrencinin ders bazında toplam ve katıldığı oturum sayıları için tek $group"""
+    match = {"tumOgrenciler": ogrno}
+    if tarih_filtresi:
+        match["tarih"] = tarih_filtresi
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$dersKodu",
+            "dersAdi": {"$first": "$dersAdi"},
+            "toplamDers": {"$sum": 1},
+            "katildigiDers": {"$sum": {"$cond": [{"$in": [ogrno, {"$ifNull": ["$katilanlar", []]}]}, 1, 0]}}
+        }},
+        {"$project": {"_id": 0, "dersKodu": "$_id", "dersAdi": 1, "toplamDers": 1, "katildigiDers": 1}},
+        {"$sort": {"dersKodu": 1}}
+    ]
+
+
+def student_counts(db, ogrno, tarih_filtresi=None):
+    """
+    Tarih filtresi yoksa ve sayaçlar hazırsa tek indeksli okuma; aksi halde
+    attendance üzerinde tek aggregation
+    """
+    if not tarih_filtresi and counters_ready(db):
+        return list(db.yoklama_sayaclari.find(
+            {"ogrno": ogrno, "toplamDers": {"$gt": 0}},
+            {"_id": 0, "dersKodu": 1, "dersAdi": 1, "toplamDers": 1, "katildigiDers": 1}
+        ).sort("dersKodu", 1))
+    return list(db.attendance.aggregate(tracking_pipeline(ogrno, tarih_filtresi)))
+
+
+def rebuild_counters(db, batch_size=1000):
+    """
+    Sayaçları attendance koleksiyonundan baştan hesaplar ve hazır işaretini
+    koyar. Tekrar çalıştırılması güvenlidir; çalışırken açılan oturumlar bir
+    sonraki çalıştırmada düzelir.
+    """
+    islemler, yazilan = [], 0
+    for satir in db.attendance.aggregate([
+        {"$project": {"dersKodu": 1, "dersAdi": 1, "tumOgrenciler": 1, "katilanlar": {"$ifNull": ["$katilanlar", []]}}},
+        {"$unwind": "$tumOgrenciler"},
+        {"$group": {
+            "_id": {"ogrno": "$tumOgrenciler", "dersKodu": "$dersKodu"},
+            "dersAdi": {"$first": "$dersAdi"},
+            "toplamDers": {"$sum": 1},
+            "katildigiDers": {"$sum": {"$cond": [{"$in": ["$tumOgrenciler", "$katilanlar"]}, 1, 0]}}
+        }}
+    ], allowDiskUse=True):
+        islemler.append(UpdateOne(
+            {"ogrno": satir["_id"]["ogrno"], "dersKodu": satir["_id"]["dersKodu"]},
+            {"$set": {"dersAdi": satir["dersAdi"], "toplamDers": satir["toplamDers"],
+                      "katildigiDers": satir["katildigiDers"]}},
+            upsert=True
+        ))
+        if len(islemler) >= batch_size:
+            db.yoklama_sayaclari.bulk_write(islemler, ordered=False)
+            yazilan += len(islemler)
+            islemler = []
+    if islemler:
+        db.yoklama_sayaclari.bulk_write(islemler, ordered=False)
+        yazilan += len(islemler)
+    db.sayaclar.update_one({"_id": HAZIR_ID}, {"$set": {"hazir": True}}, upsert=True)
+    return yazilan
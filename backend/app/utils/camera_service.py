@@ -0,0 +1,346 @@
+import os
+import platform
+import threading
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+# Kamera kaynağı: cihaz numarası ("0") ya da kamera yerine kullanılacak video dosyası
+CAMERA_SOURCE = os.getenv('CAMERA_SOURCE', '0')
+# auto: Windows'ta DSHOW, Linux'ta V4L2, macOS'ta AVFoundation; dosyalarda FFMPEG
+CAMERA_BACKEND = os.getenv('CAMERA_BACKEND', 'auto').lower()
+# Abonesi kalmayan cihaz bu kadar saniye sonra bırakılır
+CAMERA_IDLE_TIMEOUT = float(os.getenv('CAMERA_IDLE_TIMEOUT', 30))
+# Cihaz açıldıktan sonra otomatik pozlama otursun diye atılan kare sayısı
+CAMERA_WARMUP_FRAMES = int(os.getenv('CAMERA_WARMUP_FRAMES', 5))
+# Özel kullanım (tek kişilik doğrulama, kayıt) için sırada en fazla bekleme süresi
+CAMERA_EXCLUSIVE_WAIT = float(os.getenv('CAMERA_EXCLUSIVE_WAIT', 10))
+
+_BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "v4l2": cv2.CAP_V4L2,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+    "ffmpeg": cv2.CAP_FFMPEG
+}
+
+
+class CameraBusyError(RuntimeError):
+    pass
+
+
+def parse_source(spec):
+    spec = str(spec).strip()
+    return int(spec) if spec.isdigit() else spec
+
+
+def api_preferences(source, backend=CAMERA_BACKEND):
+    """Kaynağı açarken denenecek OpenCV arka uçları, öncelik sırasıyla"""
+    if backend != "auto":
+        return [_BACKENDS[backend], cv2.CAP_ANY]
+    if isinstance(source, str):
+        return [cv2.CAP_FFMPEG, cv2.CAP_ANY]
+    system = platform.system()
+    if system == "Windows":
+        return [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY]
+    if system == "Linux":
+        return [cv2.CAP_V4L2, cv2.CAP_ANY]
+    if system == "Darwin":
+        return [cv2.CAP_AVFOUNDATION, cv2.CAP_ANY]
+    return [cv2.CAP_ANY]
+
+
+class SharedFrame:
+    """
+    En son kareyi süreçler arasında paylaşılan bellekte tutar. Başlıktaki sıra
+    numarası yazma sırasında tektir (seqlock); okuyucu yazmanın ortasına denk
+    gelirse yeniden dener. Havuz süreçleri kamerayı açmadan kareleri buradan okur.
+    """
+
+    HEADER = 8
+
+    def __init__(self, shape, name=None):
+        self.shape = tuple(shape)
+        size = self.HEADER + int(np.prod(self.shape))
+        self._owner = name is None
+        # Okuyucular kamera servisinin havuz süreçleridir ve üst sürecin kaynak
+        # izleyicisini paylaşır; blok yalnızca sahibi kapatırken silinir
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size if self._owner else 0)
+        self._seq = np.ndarray((1,), dtype=np.int64, buffer=self._shm.buf[:self.HEADER])
+        self._frame = np.ndarray(self.shape, dtype=np.uint8, buffer=self._shm.buf[self.HEADER:size])
+        if self._owner:
+            self._seq[0] = 0
+
+    @property
+    def descriptor(self):
+        return {"ad": self._shm.name, "boyut": list(self.shape)}
+
+    @classmethod
+    def attach(cls, descriptor):
+        return cls(descriptor["boyut"], name=descriptor["ad"])
+
+    def write(self, frame):
+        self._seq[0] += 1
+        self._frame[...] = frame
+        self._seq[0] += 1
+
+    def read(self, after_seq=0, timeout=2.0, poll=0.005):
+        """after_seq'ten yeni ve tutarlı bir kare gelene kadar bekler; gelmezse (after_seq, None)"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            seq = int(self._seq[0])
+            if seq % 2 == 0 and seq > after_seq:
+                frame = self._frame.copy()
+                if int(self._seq[0]) == seq:
+                    return seq, frame
+            time.sleep(poll)
+        return after_seq, None
+
+    def close(self):
+        self._seq = self._frame = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class CameraSubscription:
+    """
+    VideoCapture gibi davranır: read() her çağrıda abone olunan kaynaktaki bir
+    sonraki yeni kareyi döndürür. Kareler abonelere kopya olarak verilir, biri
+    üzerine çizim yapsa diğerleri etkilenmez.
+    """
+
+    def __init__(self, source, exclusive, read_timeout=2.0):
+        self.source = source
+        self.exclusive = exclusive
+        self.read_timeout = read_timeout
+        self._seq = 0
+        self._released = False
+
+    def isOpened(self):
+        return not self._released
+
+    def read(self):
+        if self._released:
+            return False, None
+        seq, frame = self.source.latest(self._seq, self.read_timeout)
+        if frame is None:
+            return False, None
+        self._seq = seq
+        return True, frame.copy()
+
+    def share(self):
+        """Havuz süreçlerinin SharedFrame.attach ile açacağı paylaşılan kare tanımı"""
+        return self.source.share()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.source.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class CameraSource:
+    """
+    Tek bir cihazı ya da video dosyasını açık tutar. Bir yakalama iş parçacığı
+    kareleri sürekli okur ve en sonuncusunu abonelere yayınlar. Abonesi kalmayan
+    kaynak idle_timeout sonra bırakılır. Özel aboneliklerden aynı anda yalnızca
+    biri olabilir; ortak aboneler bu sırada da kareleri almaya devam eder.
+    """
+
+    def __init__(self, spec, backend=CAMERA_BACKEND, idle_timeout=CAMERA_IDLE_TIMEOUT,
+                 warmup_frames=CAMERA_WARMUP_FRAMES):
+        self.spec = str(spec)
+        self.source = parse_source(spec)
+        self.backend = backend
+        self.idle_timeout = idle_timeout
+        self.warmup_frames = warmup_frames
+        self.is_file = isinstance(self.source, str)
+        self._cond = threading.Condition()
+        self._exclusive = threading.Lock()
+        self._capture = None
+        self._thread = None
+        self._frame = None
+        self._seq = 0
+        self._subscribers = 0
+        self._idle_since = time.time()
+        self._shared = None
+        self.backend_name = None
+        self.opens = 0
+        self.captured = 0
+        self.read_failures = 0
+
+    def _open(self):
+        for api in api_preferences(self.source, self.backend):
+            capture = cv2.VideoCapture(self.source, api)
+            if capture.isOpened():
+                break
+            capture.release()
+        else:
+            raise RuntimeError("Kamera başlatılamadı")
+        if not self.is_file:
+            for _ in range(self.warmup_frames):
+                capture.read()
+        self.backend_name = capture.getBackendName() if hasattr(capture, "getBackendName") else str(api)
+        self.opens += 1
+        print(f"Kamera açıldı: {self.spec} ({self.backend_name})")
+        return capture
+
+    def _ensure_running(self):
+        # _cond tutulurken çağrılır
+        if self._thread is not None:
+            return
+        self._capture = self._open()
+        self._frame = None
+        self._thread = threading.Thread(target=self._capture_loop, args=(self._capture,),
+                                        name=f"kamera-{self.spec}", daemon=True)
+        self._thread.start()
+
+    def _capture_loop(self, capture):
+        # Video dosyası gerçek zamanlı hızda oynatılır ve sonunda başa sarılır
+        fps = capture.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        interval = 1.0 / fps if fps and fps > 0 else (1.0 / 25 if self.is_file else 0)
+        failures = 0
+        try:
+            while True:
+                with self._cond:
+                    if not self._subscribers and time.time() - self._idle_since >= self.idle_timeout:
+                        self._stop_locked()
+                        return
+                started = time.time()
+                ret, frame = capture.read()
+                if not ret:
+                    if self.is_file:
+                        capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    self.read_failures += 1
+                    failures += 1
+                    if failures >= 100:
+                        print(f"[UYARI] Kamera {self.spec} kare vermiyor, kapatılıyor")
+                        with self._cond:
+                            self._stop_locked()
+                        return
+                    time.sleep(0.01)
+                    continue
+                failures = 0
+                self.captured += 1
+                with self._cond:
+                    self._seq += 1
+                    self._frame = frame
+                    shared = self._shared
+                    self._cond.notify_all()
+                if shared is not None:
+                    if frame.shape == shared.shape:
+                        shared.write(frame)
+                if interval:
+                    time.sleep(max(0.0, interval - (time.time() - started)))
+        except Exception as e:
+            print(f"Kamera yakalama hatası ({self.spec}): {e}")
+            with self._cond:
+                self._stop_locked()
+
+    def _stop_locked(self):
+        if self._capture is not None:
+            self._capture.release()
+            print(f"Kamera bırakıldı: {self.spec}")
+        if self._shared is not None:
+            self._shared.close()
+        self._capture = None
+        self._thread = None
+        self._shared = None
+        self._frame = None
+        self._cond.notify_all()
+
+    def subscribe(self, exclusive=False, timeout=CAMERA_EXCLUSIVE_WAIT):
+        if exclusive and not self._exclusive.acquire(timeout=-1 if timeout is None else timeout):
+            raise CameraBusyError("Kamera başka bir işlem tarafından kullanılıyor")
+        try:
+            with self._cond:
+                self._ensure_running()
+                self._subscribers += 1
+        except Exception:
+            if exclusive:
+                self._exclusive.release()
+            raise
+        return CameraSubscription(self, exclusive)
+
+    def unsubscribe(self, subscription):
+        with self._cond:
+            self._subscribers -= 1
+            if not self._subscribers:
+                self._idle_since = time.time()
+        if subscription.exclusive:
+            self._exclusive.release()
+
+    def latest(self, after_seq, timeout):
+        """after_seq'ten yeni bir kare gelene kadar bekler; (seq, kare) ya da (after_seq, None)"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq and self._frame is not None
+                                       or self._thread is None, timeout):
+                return after_seq, None
+            if self._frame is None:
+                return after_seq, None
+            return self._seq, self._frame
+
+    def share(self, timeout=5.0):
+        with self._cond:
+            if self._shared is None:
+                if not self._cond.wait_for(lambda: self._frame is not None or self._thread is None, timeout) \
+                        or self._frame is None:
+                    raise RuntimeError("Kamera verisi okunamadı")
+                self._shared = SharedFrame(self._frame.shape)
+            return self._shared.descriptor
+
+    def stats(self):
+        with self._cond:
+            return {
+                "kaynak": self.spec,
+                "acik": self._thread is not None,
+                "arka_uc": self.backend_name,
+                "abone": self._subscribers,
+                "ozel_kullanimda": self._exclusive.locked(),
+                "acilma_sayisi": self.opens,
+                "yakalanan_kare": self.captured,
+                "okuma_hatasi": self.read_failures
+            }
+
+
+class CameraService:
+    """Süreç genelinde kaynak başına tek CameraSource tutar"""
+
+    def __init__(self, default_source=CAMERA_SOURCE):
+        self.default_source = str(default_source)
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def source(self, spec=None):
+        spec = self.default_source if spec is None else str(spec)
+        with self._lock:
+            if spec not in self._sources:
+                self._sources[spec] = CameraSource(spec)
+            return self._sources[spec]
+
+    def subscribe(self, spec=None, exclusive=False, timeout=CAMERA_EXCLUSIVE_WAIT):
+        return self.source(spec).subscribe(exclusive=exclusive, timeout=timeout)
+
+    def stats(self):
+        return [source.stats() for source in list(self._sources.values())]
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_camera_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CameraService()
+        return _service
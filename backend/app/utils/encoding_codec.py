@@ -0,0 +1,68 @@
+import os
+import struct
+import numpy as np
+from bson.binary import Binary
+
+# Encoding'ler float32 olarak paketlenmiş Binary alan şeklinde saklanır.
+# Başlık: sihirli bayt dizisi, başlık sürümü, dtype kodu, model sürümü,
+# satır ve sütun sayısı. Ardından satır düzeninde float32 veriler gelir.
+MAGIC = b"YENC"
+HEADER_VERSION = 1
+DTYPE_FLOAT32 = 1
+# Model sürümü ağı (dlib_face_recognition_resnet_model_v1) ve encoding öncesi
+# hizalamada kullanılan landmark modelini birlikte belirtir; farklı hizalamayla
+# üretilmiş encoding'ler arasındaki uzaklıklar karşılaştırılamaz
+LANDMARK_MODEL_VERSIONS = {"small": 1, "large": 2}
+FACE_LANDMARK_MODEL = os.getenv('FACE_LANDMARK_MODEL', 'small')
+if FACE_LANDMARK_MODEL not in LANDMARK_MODEL_VERSIONS:
+    raise ValueError(f"Bilinmeyen landmark modeli: {FACE_LANDMARK_MODEL}")
+MODEL_VERSION = LANDMARK_MODEL_VERSIONS[FACE_LANDMARK_MODEL]
+# Başlıksız eski liste biçimi face_recognition'ın varsayılanı olan 5 noktalı modelle üretildi
+LEGACY_MODEL_VERSION = LANDMARK_MODEL_VERSIONS["small"]
+_HEADER = struct.Struct("<4sBBHII")
+HEADER_SIZE = _HEADER.size
+
+
+class ModelVersionError(ValueError):
+    """Encoding başka bir tanıma modeliyle üretilmiş; uzaklıklar karşılaştırılamaz"""
+
+
+def pack_encoding(encoding, model_version=MODEL_VERSION):
+    """Bir (D,) ya da (K, D) encoding dizisini başlıklı float32 Binary'ye çevirir"""
+    array = np.ascontiguousarray(encoding, dtype="<f4")
+    rows, cols = (1, array.shape[0]) if array.ndim == 1 else array.shape
+    header = _HEADER.pack(MAGIC, HEADER_VERSION, DTYPE_FLOAT32, model_version, rows, cols)
+    return Binary(header + array.tobytes())
+
+
+def read_header(data):
+    magic, header_version, dtype, model_version, rows, cols = _HEADER.unpack_from(data)
+    if magic != MAGIC or header_version != HEADER_VERSION or dtype != DTYPE_FLOAT32:
+        raise ValueError("Tanınmayan encoding biçimi")
+    return {"model_version": model_version, "rows": rows, "cols": cols}
+
+
+def unpack_encoding(value, model_version=MODEL_VERSION):
+    """
+    Saklanan encoding'i float32 numpy dizisine çevirir. Binary biçim kopyasız
+    np.frombuffer ile okunur; eski liste biçimi de kabul edilir. Başlıktaki
+    (liste biçiminde LEGACY_MODEL_VERSION) model sürümü beklenenden farklıysa
+    ModelVersionError fırlatır.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        header = read_header(value)
+        if header["model_version"] != model_version:
+            raise ModelVersionError(
+                f"Encoding model sürümü {header['model_version']}, beklenen {model_version}")
+        array = np.frombuffer(value, dtype="<f4", count=header["rows"] * header["cols"], offset=HEADER_SIZE)
+        if header["rows"] == 1:
+            return array
+        return array.reshape(header["rows"], header["cols"])
+    if model_version != LEGACY_MODEL_VERSION:
+        raise ModelVersionError(
+            f"Eski liste biçimindeki encoding model sürümü {LEGACY_MODEL_VERSION}, beklenen {model_version}")
+    return np.asarray(value, dtype=np.float32)
+
+
+def is_packed(value):
+    return isinstance(value, (bytes, bytearray, memoryview))
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import cv2
+from .face_ops import detect_and_encode, refresh_detector_choice, ENROLL_LANDMARK_MODEL
+from .frame_quality import FrameQualityGate
+from .camera_service import get_camera_service
+from .recognition_jobs import DURUM_BEKLIYOR, DURUM_CALISIYOR, DURUM_TAMAMLANDI, DURUM_IPTAL, DURUM_HATA
+
+# Kayıt aşamaları
+ASAMA_YAKALAMA = "yakalama"
+ASAMA_ENCODING = "encoding"
+ASAMA_KAYIT = "kayit"
+
+
+def _encode_enrollment_frame(frame, min_face_px):
+    """Havuz sürecinde çalışır: karedeki ilk yüzün encoding'ini ya da None döndürür"""
+    refresh_detector_choice()
+    encodings = detect_and_encode(frame, min_face_px=min_face_px, landmarks=ENROLL_LANDMARK_MODEL)
+    return encodings[0] if encodings else None
+
+
+class EnrollmentJob:
+    def __init__(self, job_id, ogrenci_id, hedef):
+        self.id = job_id
+        self.ogrenci_id = ogrenci_id
+        self.hedef = hedef
+        self.durum = DURUM_BEKLIYOR
+        self.asama = None
+        self.yakalanan = 0
+        self.encode_edilen = 0
+        self.yuz_bulunan = 0
+        self.kaydedilen = 0
+        self.sonuc = None
+        self.hata = None
+        self.iptal = False
+        self.olusturma = time.time()
+        self.bitis = None
+
+    def to_dict(self):
+        durum = {
+            "is_id": self.id,
+            "tur": "kayit",
+            "ogrenci_id": self.ogrenci_id,
+            "durum": self.durum,
+            "asama": self.asama,
+            "ilerleme": {
+                "hedef": self.hedef,
+                "yakalanan": self.yakalanan,
+                "encode_edilen": self.encode_edilen,
+                "yuz_bulunan": self.yuz_bulunan,
+                "kaydedilen": self.kaydedilen
+            },
+            "olusturma": self.olusturma
+        }
+        if self.sonuc is not None:
+            durum["sonuc"] = self.sonuc
+        if self.hata:
+            durum["hata"] = self.hata
+        return durum
+
+
+class EnrollmentJobManager:
+    """
+    Yüz kaydını arka planda yürütür. Kamera kaliteyi geçen kareleri beklemeden
+    toplar, kareler süreç havuzunda topluca encode edilir, fotoğraflar ayrı bir
+    iş parçacığında diske yazılır. Sonuç save_fn ile tek seferde kaydedilir.
+    Kayıt kameraya özel abone olur; diğer kayıtlar ve tek kişilik doğrulamalar
+    sırada bekler.
+    """
+
+    def __init__(self, save_fn, max_workers=None, camera_source=None, min_face_px=160,
+                 max_duration=60, job_ttl=600):
+        self.save_fn = save_fn
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.camera_source = camera_source
+        self.min_face_px = min_face_px
+        self.max_duration = max_duration
+        self.job_ttl = job_ttl
+        self._encoder = None
+        self._writer = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _ensure_pools(self):
+        if self._encoder is None:
+            self._encoder = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="foto-yazici")
+
+    def submit(self, ogrenci_id, klasor_yolu, hedef=10, ad="", soyad=""):
+        job = EnrollmentJob(uuid.uuid4().hex, ogrenci_id, hedef)
+        with self._lock:
+            self._prune()
+            self._ensure_pools()
+            self._jobs[job.id] = job
+        thread = threading.Thread(target=self._run, args=(job, klasor_yolu, ad, soyad),
+                                  name=f"kayit-{ogrenci_id}", daemon=True)
+        thread.start()
+        return job.id
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.iptal = True
+            return True
+
+    def _run(self, job, klasor_yolu, ad, soyad):
+        try:
+            with get_camera_service().subscribe(self.camera_source, exclusive=True, timeout=None) as kamera:
+                job.durum = DURUM_CALISIYOR
+                encodings, yazmalar = self._collect(job, kamera, klasor_yolu)
+            if job.iptal:
+                job.durum = DURUM_IPTAL
+                return
+
+            # Fotoğrafların diske yazılması kayıttan önce tamamlanmalı
+            foto_galerisi = [yazma.result() for yazma in yazmalar]
+            if not encodings:
+                raise RuntimeError("Yüz verileri alınamadı")
+
+            job.asama = ASAMA_KAYIT
+            self.save_fn(job.ogrenci_id, ad, soyad, foto_galerisi, encodings)
+            job.sonuc = {
+                "message": "Yüz verileri başarıyla toplandı",
+                "ogrenci_id": job.ogrenci_id,
+                "fotograf_sayisi": len(foto_galerisi)
+            }
+            job.durum = DURUM_TAMAMLANDI
+        except Exception as e:
+            print(f"Kayıt işi hatası ({job.ogrenci_id}): {e}")
+            job.hata = str(e)
+            job.durum = DURUM_HATA
+        finally:
+            job.bitis = time.time()
+
+    def _collect(self, job, kamera, klasor_yolu):
+        """Hedefe ulaşılana kadar kaliteli kareleri toplu halde yakalar ve encode eder"""
+        gate = FrameQualityGate()
+        encodings, yazmalar = [], []
+        deadline = time.time() + self.max_duration
+        while len(encodings) < job.hedef and time.time() < deadline and not job.iptal:
+            # Yüzsüz çıkabilecek kareler için eksik sayının biraz fazlası yakalanır
+            eksik = job.hedef - len(encodings)
+            job.asama = ASAMA_YAKALAMA
+            kareler = []
+            while len(kareler) < eksik + max(2, eksik // 2) and time.time() < deadline and not job.iptal:
+                ret, kare = kamera.read()
+                if not ret:
+                    time.sleep(0.01)
+                    continue
+                if gate.check(kare) is None:
+                    kareler.append(kare)
+                    job.yakalanan += 1
+            if not kareler:
+                break
+
+            job.asama = ASAMA_ENCODING
+            sonuclar = self._encoder.map(_encode_enrollment_frame, kareler,
+                                         [self.min_face_px] * len(kareler))
+            for kare, encoding in zip(kareler, sonuclar):
+                job.encode_edilen += 1
+                if encoding is None or len(encodings) >= job.hedef:
+                    continue
+                job.yuz_bulunan += 1
+                encodings.append(encoding)
+                dosya_adi = os.path.join(klasor_yolu, f"{len(encodings)}.jpg")
+                yazmalar.append(self._writer.submit(self._write_image, job, dosya_adi, kare))
+        return encodings, yazmalar
+
+    def _write_image(self, job, dosya_adi, kare):
+        if not cv2.imwrite(dosya_adi, kare):
+            raise RuntimeError(f"Fotoğraf yazılamadı: {dosya_adi}")
+        job.kaydedilen += 1
+        return dosya_adi
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [j for j, job in self._jobs.items() if job.bitis and now - job.bitis > self.job_ttl]:
+            self._jobs.pop(job_id, None)
+
+    def stats(self):
+        durumlar = {}
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            durumlar[job.durum] = durumlar.get(job.durum, 0) + 1
+        return {"havuz_boyutu": self.max_workers, "isler": durumlar}
@@ -0,0 +1,369 @@
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+ENCODING_DIM = 128
+
+
+def select_prototypes(encodings, k):
+    """
+    Bir öğrencinin kayıt encoding'lerinden en fazla k prototip seçer. Kareler
+    k-medoids (PAM) ile kümelenir, her prototip kendi kümesinin ortalamasıdır;
+    k=1 için sonuç tüm encoding'lerin ortalamasıdır.
+    """
+    vectors = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+    n = len(vectors)
+    if n <= k:
+        return vectors.copy()
+    sq = np.einsum("ij,ij->i", vectors, vectors)
+    d = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2.0 * (vectors @ vectors.T), 0.0))
+
+    # BUILD: toplam uzaklığı en çok azaltan noktaları sırayla medoid yap
+    medoids = [int(np.argmin(d.sum(axis=1)))]
+    nearest = d[medoids[0]].copy()
+    while len(medoids) < k:
+        gain = np.maximum(nearest[None, :] - d, 0.0).sum(axis=1)
+        gain[medoids] = -1.0
+        medoids.append(int(np.argmax(gain)))
+        nearest = np.minimum(nearest, d[medoids[-1]])
+
+    # SWAP: maliyeti düşüren medoid/aday değişimlerini dene
+    cost = d[medoids].min(axis=0).sum()
+    for _ in range(10):
+        improved = False
+        for i in range(k):
+            for candidate in range(n):
+                if candidate in medoids:
+                    continue
+                trial = medoids[:i] + [candidate] + medoids[i + 1:]
+                trial_cost = d[trial].min(axis=0).sum()
+                if trial_cost < cost - 1e-9:
+                    medoids, cost, improved = trial, trial_cost, True
+        if not improved:
+            break
+
+    assign = np.argmin(d[medoids], axis=0)
+    return np.stack([vectors[assign == i].mean(axis=0) for i in range(k)]).astype(np.float32)
+
+
+class FaceGallery:
+    """
+    Öğrenci yüz encoding'lerini tek bir bitişik float32 matriste tutar. Her
+    öğrencinin art arda prototypes adet satırı (prototip encoding'i) vardır;
+    daha az prototipi olan öğrencinin satırları tekrarlanarak doldurulur.
+    Öğrenci id/isimleri satır bloklarıyla paralel listelerde saklanır.
+    """
+
+    def __init__(self, capacity=1024, dim=ENCODING_DIM, prototypes=1):
+        self.dim = dim
+        self.prototypes = max(1, prototypes)
+        self._matrix = np.zeros((max(capacity, 1) * self.prototypes, dim), dtype=np.float32)
+        self._sq_norms = np.zeros(max(capacity, 1) * self.prototypes, dtype=np.float32)
+        self.ids = []
+        self.names = []
+        self._index = {}
+        self._lock = threading.RLock()
+        # İsteğe bağlı yaklaşık en yakın komşu indeksi (ann_index.IVFIndex)
+        self.ann_index = None
+        # Galerinin yansıttığı ogrenciler sürümü (gallery_version)
+        self.version = 0
+
+    @classmethod
+    def from_arrays(cls, matrix, ids, names, sq_norms=None, version=0, prototypes=1):
+        """
+        Hazır bir (N * prototypes) x D matristen (ör. np.memmap) kopyalamadan
+        galeri oluşturur. Salt okunur matris ilk değişiklikte belleğe kopyalanır.
+        """
+        gallery = cls(capacity=1, dim=matrix.shape[1], prototypes=prototypes)
+        gallery._matrix = matrix
+        if sq_norms is None:
+            sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        gallery._sq_norms = np.array(sq_norms, dtype=np.float32)
+        gallery.ids = list(ids)
+        gallery.names = list(names)
+        gallery._index = {sid: i for i, sid in enumerate(gallery.ids)}
+        gallery.version = version
+        return gallery
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, student_id):
+        return student_id in self._index
+
+    @property
+    def is_mapped(self):
+        """Matris hâlâ paylaşılan disk görüntüsünden mi okunuyor"""
+        return isinstance(self._matrix, np.memmap)
+
+    @property
+    def matrix(self):
+        """Tüm prototip satırları; öğrenci i'nin satırları i * prototypes'tan başlar"""
+        return self._matrix[:len(self.ids) * self.prototypes]
+
+    @property
+    def sq_norms(self):
+        return self._sq_norms[:len(self.ids) * self.prototypes]
+
+    def _rows(self, row):
+        return slice(row * self.prototypes, (row + 1) * self.prototypes)
+
+    def _ensure_writable(self):
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix, dtype=np.float32)
+
+    def _ensure_capacity(self, size):
+        capacity = self._matrix.shape[0] // self.prototypes
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        matrix = np.zeros((capacity * self.prototypes, self.dim), dtype=np.float32)
+        sq_norms = np.zeros(capacity * self.prototypes, dtype=np.float32)
+        n = len(self.ids) * self.prototypes
+        matrix[:n] = self._matrix[:n]
+        sq_norms[:n] = self._sq_norms[:n]
+        self._matrix = matrix
+        self._sq_norms = sq_norms
+
+    def _fit_prototypes(self, encoding):
+        """(D,) ya da (k, D) encoding'i tam olarak prototypes satıra getirir"""
+        vectors = np.asarray(encoding, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) > self.prototypes:
+            vectors = select_prototypes(vectors, self.prototypes)
+        if len(vectors) < self.prototypes:
+            vectors = vectors[np.arange(self.prototypes) % len(vectors)]
+        return vectors
+
+    def add(self, student_id, encoding, name=""):
+        """Öğrenciyi ekler, zaten varsa satırlarını yerinde günceller"""
+        vectors = self._fit_prototypes(encoding)
+        with self._lock:
+            row = self._index.get(student_id)
+            if row is None:
+                row = len(self.ids)
+                self._ensure_capacity(row + 1)
+                self.ids.append(student_id)
+                self.names.append(name)
+                self._index[student_id] = row
+            else:
+                self.names[row] = name
+            self._ensure_writable()
+            rows = self._rows(row)
+            self._matrix[rows] = vectors
+            self._sq_norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+            if self.ann_index is not None:
+                self.ann_index.add(student_id, vectors)
+
+    def remove(self, student_id):
+        """Öğrencinin satırlarını son öğrencinin satırlarıyla yer değiştirerek siler"""
+        with self._lock:
+            row = self._index.pop(student_id, None)
+            if row is None:
+                return False
+            if self.ann_index is not None:
+                self.ann_index.remove(student_id)
+            self._ensure_writable()
+            last = len(self.ids) - 1
+            if row != last:
+                self._matrix[self._rows(row)] = self._matrix[self._rows(last)]
+                self._sq_norms[self._rows(row)] = self._sq_norms[self._rows(last)]
+                self.ids[row] = self.ids[last]
+                self.names[row] = self.names[last]
+                self._index[self.ids[row]] = row
+            self.ids.pop()
+            self.names.pop()
+            return True
+
+    def name_of(self, student_id):
+        row = self._index.get(student_id)
+        return self.names[row] if row is not None else ""
+
+    def encodings_of(self, student_id):
+        """Öğrencinin prototypes x D prototip satırlarını döndürür"""
+        row = self._index.get(student_id)
+        return None if row is None else np.array(self._matrix[self._rows(row)])
+
+    def subset(self, student_ids):
+        """Verilen öğrencilerden oluşan yeni bir galeri döndürür"""
+        with self._lock:
+            rows = [self._index[sid] for sid in dict.fromkeys(student_ids) if sid in self._index]
+            sub = FaceGallery(capacity=len(rows), dim=self.dim, prototypes=self.prototypes)
+            if rows:
+                rows = np.asarray(rows)
+                proto_rows = (rows[:, None] * self.prototypes + np.arange(self.prototypes)).reshape(-1)
+                sub._matrix[:len(proto_rows)] = self._matrix[proto_rows]
+                sub._sq_norms[:len(proto_rows)] = self._sq_norms[proto_rows]
+                sub.ids = [self.ids[r] for r in rows]
+                sub.names = [self.names[r] for r in rows]
+                sub._index = {sid: i for i, sid in enumerate(sub.ids)}
+            return sub
+
+    def distances(self, encodings):
+        """
+        F x D sorgu encoding'leri ile galerideki N öğrenci arasındaki öklid
+        uzaklıklarını F x N olarak hesaplar. Tüm prototiplere olan uzaklıklar
+        tek matris çarpımıyla bulunur, ardından öğrenci bloklarında en küçüğü alınır.
+        """
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            n = len(self.ids)
+            matrix = self._matrix[:n * self.prototypes]
+            sq_norms = self._sq_norms[:n * self.prototypes]
+            d2 = queries @ matrix.T
+            d2 *= -2.0
+            d2 += sq_norms
+            d2 += np.einsum("ij,ij->i", queries, queries)[:, None]
+        if self.prototypes > 1:
+            # Bloklar eşit uzunlukta olduğundan parçalı minimum bir yeniden şekillendirmedir
+            d2 = d2.reshape(len(queries), n, self.prototypes).min(axis=2)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2, out=d2)
+
+    def best_matches(self, encodings):
+        """Her sorgu için en yakın öğrencinin satırını ve uzaklığını döndürür"""
+        if not len(self.ids):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        distances = self.distances(encodings)
+        best = np.argmin(distances, axis=1)
+        return best, distances[np.arange(len(best)), best]
+
+
+class GalleryLoader:
+    """
+    Galeriyi süresi dolduğunda yeniden yükler. Aynı anda gelen isteklerden
+    yalnızca biri yüklemeyi yapar, diğerleri mevcut galeriyi kullanmaya devam eder.
+    Arada sync_fn ile yalnızca değişen öğrenciler galeriye uygulanır.
+    """
+
+    def __init__(self, load_fn, expiry, sync_fn=None, sync_interval=2):
+        self._load_fn = load_fn
+        self._sync_fn = sync_fn
+        self.expiry = expiry
+        self.sync_interval = sync_interval
+        self.gallery = FaceGallery()
+        self.last_update = 0
+        self.last_sync = 0
+        self._refresh_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def is_stale(self, now):
+        return now - self.last_update > self.expiry
+
+    def refresh(self, now, wait=True):
+        """Galeriyi yeniler; wait=False ise başka bir yükleme sürüyorsa beklemeden döner"""
+        if not self._refresh_lock.acquire(blocking=wait):
+            return False
+        try:
+            if not wait and not self.is_stale(now):
+                return True
+            self.gallery = self._load_fn()
+            self.last_update = now
+            self.last_sync = now
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def replace(self, gallery, now=None):
+        """Dışarıda hazırlanmış bir galeriyi (ör. disk görüntüsü) etkin galeri yapar"""
+        with self._refresh_lock:
+            self.gallery = gallery
+            if now is not None:
+                self.last_update = now
+
+    def sync(self, now, force=False):
+        """
+        Son senkronizasyondan bu yana sync_interval geçtiyse değişiklikleri
+        galeriye uygular; force=True ise süreyi beklemeden uygular
+        """
+        if self._sync_fn is None:
+            return False
+        if not force and now - self.last_sync < self.sync_interval:
+            return False
+        if not self._sync_lock.acquire(blocking=force):
+            return False
+        try:
+            self.last_sync = now
+            self._sync_fn(self.gallery)
+            return True
+        finally:
+            self._sync_lock.release()
+
+
+class CourseGalleryCache:
+    """
+    Yoklama oturumu başına hazırlanmış alt galerileri bellek sınırlı LRU
+    olarak tutar. Kayıt, oluşturulduğu ana galeri değiştirildiğinde, ders
+    listesi farklı geldiğinde ya da üyelerinden birinin encoding'i
+    değiştiğinde geçersiz olur.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(gallery):
+        return gallery.matrix.nbytes + gallery.sq_norms.nbytes
+
+    def get(self, key, roster, gallery):
+        """key için alt galeriyi döndürür, yoksa ya da geçersizse yeniden kurar"""
+        roster = tuple(roster)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["source"]() is gallery and entry["roster"] == roster:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["gallery"]
+            self.misses += 1
+        return self.put(key, roster, gallery)
+
+    def put(self, key, roster, gallery):
+        roster = tuple(roster)
+        sub = gallery.subset(roster)
+        # Yüz verisi henüz olmayan öğrenciler de üye sayılır; kayıt olduklarında
+        # alt galeri yeniden kurulmalı
+        # Ana galeriye zayıf referans: yenilenen eski galeri bellekte tutulmaz
+        entry = {"source": weakref.ref(gallery), "roster": roster, "members": set(roster),
+                 "gallery": sub, "bytes": self._size(sub)}
+        with self._lock:
+            self._pop(key)
+            if entry["bytes"] <= self.max_bytes:
+                self._entries[key] = entry
+                self.bytes += entry["bytes"]
+                while self.bytes > self.max_bytes:
+                    self._pop(next(iter(self._entries)))
+        return sub
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry["bytes"]
+
+    def discard(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def invalidate_students(self, student_ids):
+        """Encoding'i değişen öğrencileri içeren kayıtları siler"""
+        changed = set(student_ids)
+        if not changed:
+            return
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if not entry["members"].isdisjoint(changed)]:
+                self._pop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "oturum": len(self._entries),
+                "bellek_mb": self.bytes / 1e6,
+                "sinir_mb": self.max_bytes / 1e6,
+                "isabet": self.hits,
+                "iskalama": self.misses
+            }
@@ -0,0 +1,393 @@
+import json
+import os
+import platform
+import threading
+import time
+import cv2
+import face_recognition
+import numpy as np
+from .encoding_codec import FACE_LANDMARK_MODEL, LANDMARK_MODEL_VERSIONS
+
+# Yüz bulma, encoding ve eşleştirme adımları. Hem istek iş parçacıkları hem de
+# iş havuzundaki süreçler (recognition_jobs) aynı fonksiyonları kullanır.
+
+# Tam çözünürlükte beklenen en küçük yüz genişliği (piksel); yoklama ve kayıt için
+FACE_MIN_SIZE = int(os.getenv('FACE_MIN_SIZE', 100))
+FACE_ENROLL_MIN_SIZE = int(os.getenv('FACE_ENROLL_MIN_SIZE', 160))
+
+# Öğrenci başına saklanan ve eşleştirilen en fazla prototip encoding sayısı
+FACE_PROTOTYPES = int(os.getenv('FACE_PROTOTYPES', 3))
+
+# Yüz dedektörü: DETECTORS içindeki bir ad ya da "auto". auto'da bu makinede
+# ölçülüp FACE_DETECTOR_FILE'a yazılan seçim kullanılır; seçim yokken ve ölçüm
+# sürerken hog1 çalışır (bkz. start_detector_choice)
+FACE_DETECTOR = os.getenv('FACE_DETECTOR', 'auto')
+FACE_DETECTOR_FILE = os.getenv('FACE_DETECTOR_FILE', 'detector_secimi.json')
+FACE_DETECTOR_MIN_RECALL = float(os.getenv('FACE_DETECTOR_MIN_RECALL', 0.95))
+
+# Kayıt ve eşleştirme encoding'leri aynı landmark modeliyle hizalanmalıdır.
+# Model FACE_LANDMARK_MODEL ile seçilir ve encoding'in model sürümüne yazılır;
+# değiştirilirse tüm öğrencilerin yeniden kaydı gerekir (bkz. KURULUM.md)
+ENROLL_LANDMARK_MODEL = FACE_LANDMARK_MODEL
+
+
+class HogDetector:
+    """
+    dlib HOG dedektörü. Büyütmesiz yaklaşık 80 piksellik yüzleri yakalar; her
+    büyütme bu sınırı yarıya indirir
+    """
+
+    def __init__(self, upsample=1):
+        self.upsample = upsample
+        self.name = f"hog{upsample}"
+        self.min_face_px = 80 // (2 ** upsample)
+
+    def locate(self, rgb):
+        return face_recognition.face_locations(rgb, number_of_times_to_upsample=self.upsample, model="hog")
+
+
+class HaarDetector:
+    """
+    OpenCV ile gelen Haar kaskadı. HOG'dan çok daha hızlıdır ama yanlış aday
+    üretir. verify_upsample verilirse ön dedektör olarak çalışır: yalnızca aday
+    bölgelerin çevresinde HOG çalıştırılır, bulunan kutular onunkilerdir
+    """
+
+    def __init__(self, verify_upsample=None, min_face_px=40):
+        self.verify_upsample = verify_upsample
+        self.name = "haar" if verify_upsample is None else f"haar+hog{verify_upsample}"
+        self.min_face_px = min_face_px
+        self._cascade = None
+
+    def _classifier(self):
+        if self._cascade is None:
+            self._cascade = cv2.CascadeClassifier(
+                os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+        return self._cascade
+
+    def locate(self, rgb):
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        candidates = self._classifier().detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=4, minSize=(self.min_face_px, self.min_face_px))
+        if self.verify_upsample is None:
+            return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in candidates]
+
+        height, width = gray.shape
+        boxes = []
+        for x, y, w, h in candidates:
+            pad = w // 2
+            y0, x0 = max(0, y - pad), max(0, x - pad)
+            y1, x1 = min(height, y + h + pad), min(width, x + w + pad)
+            crop = np.ascontiguousarray(rgb[y0:y1, x0:x1])
+            for top, right, bottom, left in face_recognition.face_locations(
+                    crop, number_of_times_to_upsample=self.verify_upsample, model="hog"):
+                box = (int(top + y0), int(right + x0), int(bottom + y0), int(left + x0))
+                # Örtüşen aday bölgeler aynı yüzü iki kez bulabilir
+                if all(box_iou(box, other) < 0.5 for other in boxes):
+                    boxes.append(box)
+        return boxes
+
+
+DETECTORS = {d.name: d for d in (HogDetector(0), HogDetector(1), HogDetector(2),
+                                 HaarDetector(), HaarDetector(verify_upsample=1))}
+LANDMARK_MODELS = tuple(LANDMARK_MODEL_VERSIONS)
+
+_active = {"detector": DETECTORS["hog1"], "landmarks": FACE_LANDMARK_MODEL}
+
+
+def box_iou(a, b):
+    """(top, right, bottom, left) kutuları için kesişim / birleşim"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def set_detector(name):
+    if name not in DETECTORS:
+        raise ValueError(f"Bilinmeyen yüz dedektörü: {name}")
+    _active["detector"] = DETECTORS[name]
+
+
+def active_detector():
+    return {"dedektor": _active["detector"].name, "landmark": _active["landmarks"]}
+
+
+def detection_scale(frame_shape, min_face_px, max_width=1280, detector=None):
+    """
+    Beklenen en küçük yüz genişliğine (tam çözünürlükte piksel) göre tespit
+    ölçeğini seçer: yüz dedektörün alt sınırına inecek kadar küçültülür,
+    kare max_width'ten geniş tutulmaz
+    """
+    detector = detector or _active["detector"]
+    scale = min(1.0, detector.min_face_px / float(max(min_face_px, 1)))
+    width = frame_shape[1]
+    if width * scale > max_width:
+        scale = max_width / float(width)
+    return scale
+
+
+def downscale_rgb(frame, scale):
+    """Kareyi tespit ölçeğine küçültür ve RGB'ye çevirir"""
+    if scale < 1.0:
+        frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def locate_faces(rgb_small_frame, scale, frame_shape, detector=None):
+    """Küçük karede yüz bulur, kutuları tam çözünürlüklü kareye geri ölçekler"""
+    detector = detector or _active["detector"]
+    height, width = frame_shape[:2]
+    boxes = []
+    for top, right, bottom, left in detector.locate(rgb_small_frame):
+        boxes.append((
+            max(0, int(top / scale)), min(width, int(right / scale)),
+            min(height, int(bottom / scale)), max(0, int(left / scale))
+        ))
+    return boxes
+
+
+def detect_faces(frame, scale, detector=None):
+    """Küçültülmüş karede yüz bulur, kutuları tam çözünürlüklü kareye geri ölçekler"""
+    return locate_faces(downscale_rgb(frame, scale), scale, frame.shape, detector)
+
+
+def encode_faces(frame, boxes, pad=0.25, landmarks=None):
+    """
+    Her yüz için encoding'i tam çözünürlüklü karenin kenar boşluklu kırpıntısından
+    hesaplar; tüm karenin RGB'ye çevrilmesine gerek kalmaz. Kutu başına bir
+    sonuç döner, encoding çıkarılamayan kutular için None
+    """
+    landmarks = landmarks or _active["landmarks"]
+    height, width = frame.shape[:2]
+    encodings = []
+    for top, right, bottom, left in boxes:
+        pad_y, pad_x = int((bottom - top) * pad), int((right - left) * pad)
+        y0, y1 = max(0, top - pad_y), min(height, bottom + pad_y)
+        x0, x1 = max(0, left - pad_x), min(width, right + pad_x)
+        crop = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2RGB)
+        local_box = (top - y0, right - x0, bottom - y0, left - x0)
+        found = face_recognition.face_encodings(crop, [local_box], model=landmarks)
+        encodings.append(found[0] if found else None)
+    return encodings
+
+
+def detect_and_encode(frame, min_face_px=None, landmarks=None):
+    """İki aşamalı tanıma: düşük çözünürlükte tespit, tam çözünürlükte encoding"""
+    boxes = detect_faces(frame, detection_scale(frame.shape, min_face_px or FACE_MIN_SIZE))
+    if not boxes:
+        return []
+    return [encoding for encoding in encode_faces(frame, boxes, landmarks=landmarks) if encoding is not None]
+
+
+def decode_frame(veri):
+    return cv2.imdecode(np.frombuffer(veri, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def match_faces(gallery, face_encodings):
+    """
+    Her yüz için en yakın öğrenciyi (ogrenci_id, uzaklık) olarak döndürür.
+    Galeride ANN indeksi varsa aday kümelerle sınırlı arama yapılır.
+    """
+    if gallery.ann_index is not None:
+        results, _ = gallery.ann_index.search(face_encodings, k=1)
+        return [found[0] if found else (None, float("inf")) for found in results]
+    best_rows, best_distances = gallery.best_matches(face_encodings)
+    return [(gallery.ids[row], float(distance)) for row, distance in zip(best_rows, best_distances)]
+
+
+def recognized_students(gallery, face_encodings, tolerance):
+    """Eşleşme oranı toleransı geçen yüzleri (ogrenci_id, match_ratio) olarak döndürür"""
+    matches = []
+    for student_id, distance in match_faces(gallery, face_encodings):
+        match_ratio = 1 - distance
+        if match_ratio > tolerance:
+            matches.append((student_id, match_ratio))
+    return matches
+
+
+# --- Dedektör ölçümü ve seçimi ---
+
+def sample_frames(dataset_dir, limit=30):
+    """dataset/<ogrenci>/*.jpg altından öğrenciler arasında sırayla en fazla limit kare okur"""
+    folders = [sorted(os.path.join(d, f) for f in os.listdir(d) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+               for d in (os.path.join(dataset_dir, n) for n in sorted(os.listdir(dataset_dir)))
+               if os.path.isdir(d)] if os.path.isdir(dataset_dir) else []
+    frames = []
+    for i in range(max(map(len, folders), default=0)):
+        for files in folders:
+            if i < len(files) and len(frames) < limit:
+                frame = cv2.imread(files[i])
+                if frame is not None:
+                    frames.append(frame)
+    return frames
+
+
+def benchmark_detectors(frames, min_face_px=None, tolerance=0.55, names=None,
+                        landmark_models=(FACE_LANDMARK_MODEL,)):
+    """
+    Her dedektör/landmark birleşimini örnek karelerde çalıştırıp kare başına
+    süreyi ve referansa göre recall'u ölçer. Referans, tam çözünürlükte hog1 ve
+    galerinin landmark modelidir. Bir referans yüz, kutusu örtüşen (IoU >= 0.5)
+    ve encoding'i referansınkine eşleşme toleransı içinde olan bir yüz
+    bulunduysa yakalanmış sayılır. Galeri tek bir modelle kaydedildiği için
+    varsayılan olarak yalnızca o model ölçülür; diğer modelin sonuçları
+    yalnızca karşılaştırma içindir.
+    """
+    min_face_px = min_face_px or FACE_MIN_SIZE
+    max_distance = 1 - tolerance
+    reference = DETECTORS["hog1"]
+    truth = []
+    for frame in frames:
+        scale = min(1.0, 1280 / float(frame.shape[1]))
+        boxes = detect_faces(frame, scale, reference)
+        truth.append((boxes, encode_faces(frame, boxes, landmarks=FACE_LANDMARK_MODEL) if boxes else []))
+    total = sum(sum(e is not None for e in encodings) for _, encodings in truth)
+
+    results = []
+    for name in names or DETECTORS:
+        detector = DETECTORS[name]
+        detect_time, found = 0.0, []
+        for frame in frames:
+            t0 = time.perf_counter()
+            found.append(detect_faces(frame, detection_scale(frame.shape, min_face_px, detector=detector), detector))
+            detect_time += time.perf_counter() - t0
+        for landmarks in landmark_models:
+            encode_time, hits = 0.0, 0
+            for frame, boxes, (truth_boxes, truth_encodings) in zip(frames, found, truth):
+                t0 = time.perf_counter()
+                encodings = encode_faces(frame, boxes, landmarks=landmarks) if boxes else []
+                encode_time += time.perf_counter() - t0
+                for truth_box, truth_encoding in zip(truth_boxes, truth_encodings):
+                    if truth_encoding is None:
+                        continue
+                    hits += any(encoding is not None and box_iou(box, truth_box) >= 0.5 and
+                                np.linalg.norm(encoding - truth_encoding) <= max_distance
+                                for box, encoding in zip(boxes, encodings))
+            results.append({
+                "dedektor": name,
+                "landmark": landmarks,
+                "recall": hits / total if total else None,
+                "kare_ms": (detect_time + encode_time) * 1000 / max(len(frames), 1),
+                "tespit_ms": detect_time * 1000 / max(len(frames), 1)
+            })
+    return results, total
+
+
+def choose_detector(results, min_recall=FACE_DETECTOR_MIN_RECALL):
+    """
+    Galerinin landmark modelini kullanan birleşimlerden recall tabanını geçen
+    en hızlısını; hiçbiri geçemezse en yüksek recall'u seçer
+    """
+    measured = [r for r in results if r["recall"] is not None and r["landmark"] == FACE_LANDMARK_MODEL]
+    if not measured:
+        return None
+    passing = [r for r in measured if r["recall"] >= min_recall]
+    if passing:
+        return min(passing, key=lambda r: r["kare_ms"])
+    return max(measured, key=lambda r: (r["recall"], -r["kare_ms"]))
+
+
+def _host():
+    return {"makine": platform.node(), "islemci": platform.processor(), "cekirdek": os.cpu_count()}
+
+
+def save_detector_choice(choice, results, path=FACE_DETECTOR_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"dedektor": choice["dedektor"], "landmark": choice["landmark"], "ortam": _host(),
+                   "zaman": time.strftime("%Y-%m-%d %H:%M:%S"), "sonuclar": results},
+                  f, ensure_ascii=False, indent=2)
+
+
+def load_detector_choice(path=FACE_DETECTOR_FILE):
+    """
+    Bu makinede yapılmış bir seçim varsa etkinleştirir; başka makinenin ya da
+    başka landmark modelinin ölçümü yok sayılır
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            choice = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if choice.get("ortam", {}).get("makine") != platform.node() or choice.get("dedektor") not in DETECTORS:
+        return False
+    if choice.get("landmark") != FACE_LANDMARK_MODEL:
+        return False
+    set_detector(choice["dedektor"])
+    return True
+
+
+_choice_mtime = {"value": None}
+
+
+def refresh_detector_choice(path=FACE_DETECTOR_FILE):
+    """
+    FACE_DETECTOR=auto iken seçim dosyası değiştiyse yeniden yükler. Havuz
+    süreçleri her işte çağırır; ölçüm onlar başladıktan sonra biterse de
+    seçimi alırlar
+    """
+    if FACE_DETECTOR != "auto":
+        return False
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return False
+    if mtime == _choice_mtime["value"]:
+        return False
+    _choice_mtime["value"] = mtime
+    return load_detector_choice(path)
+
+
+def ensure_detector_choice(dataset_dir="dataset", sample=30):
+    """
+    FACE_DETECTOR=auto iken kayıtlı seçim yoksa dataset/ karelerinde ölçüm
+    yapıp sonucu kaydeder. Ölçüm uzun sürebilir; sunucu açılışında
+    start_detector_choice ile arka planda çalıştırılır.
+    """
+    if FACE_DETECTOR != "auto" or load_detector_choice():
+        return active_detector()
+    frames = sample_frames(dataset_dir, sample)
+    if not frames:
+        print(f"[UYARI] Dedektör ölçümü için {dataset_dir} altında kare yok, {active_detector()} kullanılıyor")
+        return active_detector()
+    results, total = benchmark_detectors(frames)
+    choice = choose_detector(results)
+    if choice is None:
+        print("[UYARI] Örnek karelerde yüz bulunamadı, dedektör seçilemedi")
+        return active_detector()
+    set_detector(choice["dedektor"])
+    save_detector_choice(choice, results)
+    print(f"Yüz dedektörü seçildi: {choice['dedektor']}/{choice['landmark']} "
+          f"(recall {choice['recall']:.2f}, {choice['kare_ms']:.1f} ms/kare, {total} yüz)")
+    return active_detector()
+
+
+def _detector_choice_worker(dataset_dir, sample):
+    try:
+        ensure_detector_choice(dataset_dir, sample)
+    except Exception as e:
+        print(f"[UYARI] Dedektör ölçümü başarısız, {active_detector()} kullanılıyor: {e}")
+
+
+_choice_thread = None
+
+
+def start_detector_choice(dataset_dir="dataset", sample=30):
+    """
+    FACE_DETECTOR=auto iken kayıtlı seçim yoksa ölçümü arka plan iş
+    parçacığında başlatır; açılış beklemez, ölçüm bitene kadar hog1 kullanılır
+    """
+    global _choice_thread
+    if FACE_DETECTOR != "auto" or _choice_thread is not None or load_detector_choice():
+        return
+    print("Yüz dedektörü arka planda ölçülüyor, bu sırada hog1 kullanılıyor")
+    _choice_thread = threading.Thread(target=_detector_choice_worker, args=(dataset_dir, sample),
+                                      name="dedektor-secimi", daemon=True)
+    _choice_thread.start()
+
+
+if FACE_DETECTOR == "auto":
+    refresh_detector_choice()
+else:
+    set_detector(FACE_DETECTOR)
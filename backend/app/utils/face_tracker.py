@@ -0,0 +1,168 @@
+import itertools
+import threading
+import cv2
+import numpy as np
+
+
+def iou(a, b):
+    """(top, right, bottom, left) biçimindeki iki kutunun kesişim/birleşim oranı"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    if bottom <= top or right <= left:
+        return 0.0
+    inter = (bottom - top) * (right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+def _tracker_factory():
+    """Kurulu OpenCV sürümündeki en hafif tek nesne izleyicisini seçer"""
+    legacy = getattr(cv2, "legacy", None)
+    for owner, name in ((legacy, "TrackerMOSSE_create"), (legacy, "TrackerKCF_create"),
+                        (cv2, "TrackerKCF_create")):
+        factory = getattr(owner, name, None) if owner is not None else None
+        if factory is not None:
+            return factory
+    return None
+
+
+class Track:
+    def __init__(self, track_id, box, frame_no):
+        self.id = track_id
+        self.box = box
+        self.student_id = None
+        self.distance = None
+        self.last_seen = frame_no
+        self.last_verified = None
+        self.cv_tracker = None
+
+
+class FaceTracker:
+    """
+    Tam yüz tespitini yalnızca detect_every karede bir çalıştırır, aradaki
+    karelerde yüzleri OpenCV izleyicisiyle (yoksa son konumlarıyla) takip eder.
+    Tespit karelerinde kutular IoU ile mevcut izlere bağlanır; yalnızca yeni,
+    henüz tanınmamış ya da yeniden doğrulama zamanı gelmiş izler encode edilir.
+    """
+
+    def __init__(self, detect_fn, encode_fn, detect_every=5, reverify_every=30,
+                 iou_threshold=0.3, max_missed=15, use_cv_tracker=True):
+        self.detect_fn = detect_fn
+        self.encode_fn = encode_fn
+        self.detect_every = max(1, detect_every)
+        self.reverify_every = reverify_every
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self._tracker_factory = _tracker_factory() if use_cv_tracker else None
+        self._tracks = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.frame_no = 0
+        self.detections = 0
+        self.encodings = 0
+
+    def process(self, frame):
+        """
+        BGR kareyi işler ve encode edilen izler için (iz_id, encoding) listesi
+        döndürür. encode_fn kutu başına bir sonuç (başarısızsa None) vermelidir
+        """
+        # OpenCV izleyicileri bitişik bellek ister
+        frame = np.ascontiguousarray(frame)
+        with self._lock:
+            self.frame_no += 1
+            # Bir iz kaybedildiyse sıradaki tespit beklenmeden yeniden tespit yapılır
+            if self._tracks and (self.frame_no - 1) % self.detect_every and self._follow(frame):
+                return []
+
+            self.detections += 1
+            boxes = self.detect_fn(frame)
+            to_encode = self._associate(boxes, frame)
+            if not to_encode:
+                return []
+            encodings = self.encode_fn(frame, [track.box for track in to_encode])
+            sonuc = []
+            for track, encoding in zip(to_encode, encodings):
+                if encoding is None:
+                    continue
+                track.last_verified = self.frame_no
+                sonuc.append((track.id, encoding))
+            self.encodings += len(sonuc)
+            return sonuc
+
+    def assign(self, track_id, student_id, distance):
+        """Eşleştirme sonucunu ize kaydeder; tanınan izler bir süre yeniden encode edilmez"""
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is not None:
+                track.student_id = student_id
+                track.distance = distance
+
+    def _follow(self, frame):
+        """İzleri günceller; izleyicisi hedefi kaybeden iz varsa False döndürür"""
+        all_ok = True
+        for track in self._tracks.values():
+            if track.cv_tracker is None:
+                continue
+            ok, (x, y, w, h) = track.cv_tracker.update(frame)
+            if ok:
+                track.box = (int(y), int(x + w), int(y + h), int(x))
+            else:
+                # Kaybedilen iz tespitte bir kutuyla eşleşene kadar izlenmez
+                track.cv_tracker = None
+                all_ok = False
+        return all_ok
+
+    def _associate(self, boxes, frame):
+        unmatched = set(self._tracks)
+        pairs = sorted(
+            ((iou(track.box, box), track_id, i)
+             for track_id, track in self._tracks.items()
+             for i, box in enumerate(boxes)),
+            reverse=True
+        )
+        used_boxes = set()
+        for score, track_id, i in pairs:
+            if score < self.iou_threshold:
+                break
+            if track_id not in unmatched or i in used_boxes:
+                continue
+            track = self._tracks[track_id]
+            track.box = boxes[i]
+            track.last_seen = self.frame_no
+            self._init_cv_tracker(track, frame)
+            unmatched.discard(track_id)
+            used_boxes.add(i)
+
+        for track_id in unmatched:
+            if self.frame_no - self._tracks[track_id].last_seen > self.max_missed:
+                del self._tracks[track_id]
+
+        for i, box in enumerate(boxes):
+            if i not in used_boxes:
+                track = Track(next(self._ids), box, self.frame_no)
+                self._init_cv_tracker(track, frame)
+                self._tracks[track.id] = track
+
+        return [
+            track for track in self._tracks.values()
+            if track.last_seen == self.frame_no and (
+                track.student_id is None or track.last_verified is None or
+                (self.reverify_every and self.frame_no - track.last_verified >= self.reverify_every)
+            )
+        ]
+
+    def _init_cv_tracker(self, track, frame):
+        if self._tracker_factory is None:
+            return
+        top, right, bottom, left = track.box
+        track.cv_tracker = self._tracker_factory()
+        track.cv_tracker.init(frame, (left, top, right - left, bottom - top))
+
+    def stats(self):
+        return {
+            "kare": self.frame_no,
+            "tespit": self.detections,
+            "encoding": self.encodings,
+            "aktif_iz": len(self._tracks)
+        }
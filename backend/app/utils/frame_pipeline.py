@@ -0,0 +1,151 @@
+import queue
+import threading
+import time
+
+
+class LatestFrameSlot:
+    """
+    Yalnızca en son kareyi tutan tek elemanlı yuva. Yeni kare eskisinin
+    üzerine yazılır, böylece tüketiciler hiçbir zaman bayat kare işlemez.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._taken_seq = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._seq += 1
+            self._cond.notify()
+
+    def take(self, timeout=None):
+        """En taze kareyi alır ve yuvayı boşaltır; kare yoksa timeout kadar bekler"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame is not None or self.closed, timeout):
+                return None, None
+            frame, self._frame = self._frame, None
+            return self._seq, frame
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class PipelineResult:
+    def __init__(self, seq, captured_at, frame, data):
+        self.seq = seq
+        self.captured_at = captured_at
+        self.frame = frame
+        self.data = data
+
+
+class RecognitionPipeline:
+    """
+    Kamera okuma, yüz bulma/encoding ve eşleştirmeyi ayrı aşamalara böler:
+    bir yakalama iş parçacığı kareleri LatestFrameSlot'a yazar, workers adet
+    işçi en taze kareyi alıp process_fn ile işler ve sonucu sınırlı bir
+    kuyruğa koyar. Kuyruk doluysa işçiler bekler, yakalama ise eski kareleri
+    atarak devam eder.
+    """
+
+    def __init__(self, camera, process_fn, workers=2, max_results=4):
+        self.camera = camera
+        self.process_fn = process_fn
+        self.workers = max(1, workers)
+        self._slot = LatestFrameSlot()
+        self._results = queue.Queue(maxsize=max_results)
+        self._stop = threading.Event()
+        self._threads = []
+        self.captured = 0
+        self.processed = 0
+        self.read_failures = 0
+        self.errors = 0
+
+    @property
+    def dropped(self):
+        return self._slot.dropped
+
+    def start(self):
+        self._threads.append(threading.Thread(target=self._capture_loop, name="kare-yakalama", daemon=True))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker_loop, name=f"yuz-isci-{i}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._slot.close()
+        # İşçilerin kuyruğa yazarken takılı kalmaması için kuyruğu boşalt
+        while True:
+            try:
+                self._results.get_nowait()
+            except queue.Empty:
+                break
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            ret, frame = self.camera.read()
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            self.captured += 1
+            self._slot.put((time.time(), frame))
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            seq, item = self._slot.take(timeout=0.1)
+            if item is None:
+                continue
+            captured_at, frame = item
+            try:
+                data = self.process_fn(frame)
+            except Exception as e:
+                self.errors += 1
+                print(f"[UYARI] Kare işlenirken hata: {e}")
+                continue
+            self.processed += 1
+            result = PipelineResult(seq, captured_at, frame, data)
+            while not self._stop.is_set():
+                try:
+                    self._results.put(result, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def results(self, deadline=None):
+        """İşlenen kareleri deadline (time.time() cinsinden) dolana kadar üretir"""
+        while not self._stop.is_set():
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return
+            try:
+                yield self._results.get(timeout=min(remaining, 0.1) if remaining is not None else 0.1)
+            except queue.Empty:
+                continue
+
+    def stats(self):
+        return {
+            "yakalanan_kare": self.captured,
+            "islenen_kare": self.processed,
+            "atlanan_kare": self.dropped,
+            "okuma_hatasi": self.read_failures
+        }
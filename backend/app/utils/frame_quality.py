@@ -0,0 +1,108 @@
+import os
+import threading
+import cv2
+
+# Kalite ölçümleri bu genişliğe küçültülmüş gri karede yapılır
+FACE_QUALITY_PROBE_WIDTH = int(os.getenv('FACE_QUALITY_PROBE_WIDTH', 160))
+FACE_QUALITY_ENABLED = os.getenv('FACE_QUALITY_ENABLED', 'True').lower() in ('true', '1', 't')
+# Laplace varyansı (netlik), ortalama parlaklık (0-255) ve önceki kareye göre
+# ortalama mutlak fark eşikleri
+FACE_QUALITY_MIN_SHARPNESS = float(os.getenv('FACE_QUALITY_MIN_SHARPNESS', 40))
+FACE_QUALITY_MIN_BRIGHTNESS = float(os.getenv('FACE_QUALITY_MIN_BRIGHTNESS', 40))
+FACE_QUALITY_MAX_BRIGHTNESS = float(os.getenv('FACE_QUALITY_MAX_BRIGHTNESS', 220))
+FACE_QUALITY_MIN_DIFF = float(os.getenv('FACE_QUALITY_MIN_DIFF', 2.0))
+
+# Atlanma nedenleri
+NEDEN_BULANIK = "bulanik"
+NEDEN_KARANLIK = "karanlik"
+NEDEN_PARLAK = "parlak"
+NEDEN_TEKRAR = "tekrar"
+
+
+def frame_metrics(frame, probe_width=FACE_QUALITY_PROBE_WIDTH):
+    """Kareyi küçültüp (gri kare, netlik, parlaklık) döndürür"""
+    height, width = frame.shape[:2]
+    if width > probe_width:
+        frame = cv2.resize(frame, (probe_width, max(1, int(height * probe_width / width))),
+                           interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    brightness = float(gray.mean())
+    return gray, sharpness, brightness
+
+
+class FrameQualityGate:
+    """
+    HOG tespitinden önce çalışan ucuz kalite süzgeci. Bulanık, çok karanlık,
+    çok parlak ya da son işlenen kareyle neredeyse aynı olan kareleri eler.
+    Sahne uzun süre değişmese bile max_repeat_skips karede bir kare işlenir.
+    """
+
+    def __init__(self, min_sharpness=FACE_QUALITY_MIN_SHARPNESS, min_brightness=FACE_QUALITY_MIN_BRIGHTNESS,
+                 max_brightness=FACE_QUALITY_MAX_BRIGHTNESS, min_difference=FACE_QUALITY_MIN_DIFF,
+                 max_repeat_skips=15, probe_width=FACE_QUALITY_PROBE_WIDTH):
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_difference = min_difference
+        self.max_repeat_skips = max_repeat_skips
+        self.probe_width = probe_width
+        self._lock = threading.Lock()
+        self._last_gray = None
+        self._repeat_skips = 0
+        self.processed = 0
+        self.skipped = {NEDEN_BULANIK: 0, NEDEN_KARANLIK: 0, NEDEN_PARLAK: 0, NEDEN_TEKRAR: 0}
+
+    def check(self, frame):
+        """Kare işlenmeye değerse None, değilse atlanma nedenini döndürür"""
+        gray, sharpness, brightness = frame_metrics(frame, self.probe_width)
+        reason = None
+        if brightness < self.min_brightness:
+            reason = NEDEN_KARANLIK
+        elif brightness > self.max_brightness:
+            reason = NEDEN_PARLAK
+        elif sharpness < self.min_sharpness:
+            reason = NEDEN_BULANIK
+
+        with self._lock:
+            if reason is None and self.min_difference > 0 and self._last_gray is not None \
+                    and self._last_gray.shape == gray.shape \
+                    and self._repeat_skips < self.max_repeat_skips \
+                    and cv2.absdiff(gray, self._last_gray).mean() < self.min_difference:
+                reason = NEDEN_TEKRAR
+                self._repeat_skips += 1
+
+            if reason is None:
+                self._last_gray = gray
+                self._repeat_skips = 0
+                self.processed += 1
+            else:
+                self.skipped[reason] += 1
+        return reason
+
+    def wrap(self, process_fn, skipped_value=None):
+        """process_fn'i yalnızca kaliteyi geçen karelerde çağıran fonksiyon döndürür"""
+        def _process(frame):
+            if self.check(frame) is not None:
+                return skipped_value
+            return process_fn(frame)
+        return _process
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kalite_gecen": self.processed,
+                "kalite_atlanan": sum(self.skipped.values()),
+                "atlanma_nedenleri": dict(self.skipped)
+            }
+
+
+def quality_filtered(process_fn, skipped_value=None, **kwargs):
+    """
+    FACE_QUALITY_ENABLED açıksa process_fn'i kalite süzgecinden geçirir.
+    (işlev, süzgeç) döndürür; süzgeç kapalıysa süzgeç None olur.
+    """
+    if not FACE_QUALITY_ENABLED:
+        return process_fn, None
+    gate = FrameQualityGate(**kwargs)
+    return gate.wrap(process_fn, skipped_value), gate
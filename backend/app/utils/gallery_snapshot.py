@@ -0,0 +1,129 @@
+import glob
+import json
+import os
+import time
+import numpy as np
+from .face_gallery import FaceGallery
+from .encoding_codec import MODEL_VERSION, LEGACY_MODEL_VERSION
+
+# Galeri diskte sürüm damgalı bir .npy matris ve bir kimlik indeksi olarak
+# saklanır. "current.json" hangi dosyaların geçerli olduğunu gösterir ve
+# os.replace ile atomik olarak değiştirilir.
+POINTER_FILE = "current.json"
+LOCK_FILE = "yazici.lock"
+KEEP_SNAPSHOTS = 2
+
+
+def _atomic_write(path, write_fn):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write_fn(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_pointer(directory):
+    try:
+        with open(os.path.join(directory, POINTER_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _current_model(pointer):
+    # Sürüm alanı olmayan görüntüler 5 noktalı modelle yazılmıştır
+    return pointer.get("model_version", LEGACY_MODEL_VERSION) == MODEL_VERSION
+
+
+def snapshot_version(directory, prototypes=None):
+    """Geçerli görüntünün sürümü; görüntü yoksa, prototip sayısı ya da model sürümü farklıysa -1"""
+    pointer = read_pointer(directory)
+    if not pointer or not _current_model(pointer) or \
+            (prototypes is not None and pointer.get("prototypes", 1) != prototypes):
+        return -1
+    return pointer["version"]
+
+
+def write_snapshot(gallery, directory):
+    """Galeriyi diske yazar ve current.json'u yeni görüntüye çevirir"""
+    os.makedirs(directory, exist_ok=True)
+    with gallery._lock:
+        matrix = np.array(gallery.matrix, dtype=np.float32)
+        sq_norms = np.array(gallery.sq_norms, dtype=np.float32)
+        index = {"version": gallery.version, "prototypes": gallery.prototypes,
+                 "ids": list(gallery.ids), "names": list(gallery.names)}
+
+    base = f"galeri-{gallery.version}-{os.getpid()}"
+    matrix_file = f"{base}.npy"
+    norms_file = f"{base}-norm.npy"
+    index_file = f"{base}.json"
+    _atomic_write(os.path.join(directory, matrix_file), lambda f: np.save(f, matrix))
+    _atomic_write(os.path.join(directory, norms_file), lambda f: np.save(f, sq_norms))
+    _atomic_write(os.path.join(directory, index_file),
+                  lambda f: f.write(json.dumps(index, ensure_ascii=False).encode("utf-8")))
+
+    pointer = {"version": gallery.version, "prototypes": gallery.prototypes, "model_version": MODEL_VERSION,
+               "matrix": matrix_file, "norms": norms_file, "index": index_file}
+    _atomic_write(os.path.join(directory, POINTER_FILE),
+                  lambda f: f.write(json.dumps(pointer).encode("utf-8")))
+    _cleanup(directory, keep={matrix_file, norms_file, index_file})
+    return pointer
+
+
+def _cleanup(directory, keep):
+    """Eski görüntüleri siler; açık memmap'ler dosya silinse de çalışmaya devam eder"""
+    snapshots = sorted(glob.glob(os.path.join(directory, "galeri-*.json")), key=os.path.getmtime)
+    for index_path in snapshots[:-KEEP_SNAPSHOTS]:
+        base = index_path[:-len(".json")]
+        for path in (f"{base}.npy", f"{base}-norm.npy", index_path):
+            if os.path.basename(path) in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # Windows'ta hâlâ eşlenmiş dosyalar silinemez, sonraki turda denenir
+                pass
+
+
+def open_snapshot(directory):
+    """Geçerli görüntüyü np.memmap ile açar; görüntü yoksa ya da başka modelle yazılmışsa None döndürür"""
+    pointer = read_pointer(directory)
+    if not pointer or not _current_model(pointer):
+        return None
+    matrix = np.load(os.path.join(directory, pointer["matrix"]), mmap_mode="r")
+    sq_norms = np.load(os.path.join(directory, pointer["norms"]))
+    with open(os.path.join(directory, pointer["index"]), encoding="utf-8") as f:
+        index = json.load(f)
+    prototypes = index.get("prototypes", 1)
+    if len(index["ids"]) * prototypes != matrix.shape[0]:
+        raise ValueError("Galeri görüntüsü bozuk: satır ve kimlik sayısı uyuşmuyor")
+    return FaceGallery.from_arrays(matrix, index["ids"], index["names"], sq_norms, index["version"], prototypes)
+
+
+def try_lock_writer(directory, stale_after=300):
+    """
+    Aynı anda yalnızca bir worker'ın görüntü yazmasını sağlar.
+    Kilit alınamazsa False döner; stale_after saniyeden eski kilitler yok sayılır.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, LOCK_FILE)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if os.path.getmtime(path) < time.time() - stale_after:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+
+def unlock_writer(directory):
+    try:
+        os.remove(os.path.join(directory, LOCK_FILE))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,62 @@
+from pymongo import ReturnDocument
+
+# ogrenciler koleksiyonundaki her yüz verisi değişikliği bu sayacı bir artırır.
+# Değişen öğrenci belgesine "surum" alanı, silinen öğrenciye ise
+# ogrenci_silinenler koleksiyonunda bir kayıt yazılır.
+SAYAC_ID = "ogrenciler_surum"
+
+# Sayaç artırımı ile belgenin yazılması arasındaki kısa aralıkta kaçırılan
+# değişiklikleri yakalamak için her delta sorgusu bu kadar geriden başlar.
+SURUM_ORTUSME = 20
+
+
+def next_version(db):
+    """Sayacı atomik olarak artırır ve yeni sürümü döndürür"""
+    sayac = db.sayaclar.find_one_and_update(
+        {"_id": SAYAC_ID},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return sayac["seq"]
+
+
+def current_version(db):
+    sayac = db.sayaclar.find_one({"_id": SAYAC_ID})
+    return sayac["seq"] if sayac else 0
+
+
+def mark_deleted(db, ogrenci_id):
+    """Tamamen silinen öğrenci için silinme kaydı bırakır"""
+    surum = next_version(db)
+    db.ogrenci_silinenler.update_one(
+        {"ogrenci_id": ogrenci_id},
+        {"$set": {"surum": surum}},
+        upsert=True
+    )
+    return surum
+
+
+def fetch_changes(db, since, projection=None):
+    """
+    Verilen sürümden sonraki değişiklikleri sürüm sırasıyla
+    (surum, ogrenci_id, belge) listesi olarak döndürür. Silinen öğrenciler
+    için belge None'dır.
+    """
+    since = max(since - SURUM_ORTUSME, 0)
+    changes = [
+        (d["surum"], d["ogrenci_id"], d)
+        for d in db.ogrenciler.find({"surum": {"$gt": since}}, projection)
+    ]
+    changes += [
+        (d["surum"], d["ogrenci_id"], None)
+        for d in db.ogrenci_silinenler.find({"surum": {"$gt": since}}, {"ogrenci_id": 1, "surum": 1})
+    ]
+    changes.sort(key=lambda change: change[0])
+    return changes
+
+
+def ensure_indexes(db):
+    db.ogrenciler.create_index("surum")
+    db.ogrenci_silinenler.create_index("surum")
+    db.ogrenci_silinenler.create_index("ogrenci_id", unique=True)
@@ -0,0 +1,219 @@
+import threading
+import time
+import numpy as np
+
+
+class Int8Index:
+    """
+    Galeri prototiplerini boyut başına ölçeklenmiş int8 kodlar olarak tutar.
+    Adaylar sorgu ile int8 kodlar arasındaki yaklaşık uzaklıkla bulunur, en
+    yakın rerank öğrenci galerideki float satırlarla kesin uzaklıkla yeniden
+    sıralanır. Kodlar float32 satırların dörtte biri kadar yer tutar ve tarama
+    yalnızca kodları okur; float satırlar yalnızca yeniden sıralamada okunur,
+    bu yüzden galeri disk görüntüsünden eşlendiğinde RAM'de tutulmaz. Hız
+    kaba kuvvet aramadan yüksek değildir; kazanç bellektedir.
+    """
+
+    kind = "int8"
+
+    def __init__(self, rerank=8, block_rows=2048, direct_max_queries=4):
+        self.rerank = rerank
+        self.block_rows = block_rows
+        self.direct_max_queries = direct_max_queries
+        self.dim = None
+        self.prototypes = 1
+        self.offset = None
+        self.scale = None
+        self._codes = np.zeros((0, 0), dtype=np.int8)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self.ids = []
+        self._index = {}
+        self._gallery = None
+        self._built_size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        n = len(self.ids) * self.prototypes
+        return self._codes[:n].nbytes + self._sq_norms[:n].nbytes
+
+    def build(self, gallery):
+        """Ölçekleri galerideki değer aralığından belirler ve tüm satırları kodlar"""
+        vectors = np.asarray(gallery.matrix, dtype=np.float32)
+        with self._lock:
+            self._gallery = gallery
+            self.dim = gallery.dim
+            self.prototypes = gallery.prototypes
+            lo = vectors.min(axis=0) if len(vectors) else np.zeros(self.dim, dtype=np.float32)
+            hi = vectors.max(axis=0) if len(vectors) else np.zeros(self.dim, dtype=np.float32)
+            self.offset = ((lo + hi) / 2).astype(np.float32)
+            self.scale = np.maximum((hi - lo) / 254.0, 1e-8).astype(np.float32)
+            n = len(gallery.ids)
+            self._codes = np.zeros((max(n, 1) * self.prototypes, self.dim), dtype=np.int8)
+            self._sq_norms = np.zeros(max(n, 1) * self.prototypes, dtype=np.float32)
+            self._codes[:len(vectors)], self._sq_norms[:len(vectors)] = self._encode(vectors)
+            self.ids = list(gallery.ids)
+            self._index = {sid: i for i, sid in enumerate(self.ids)}
+            self._built_size = n
+        return self
+
+    def attach(self, gallery):
+        """Kodlar korunarak yeniden sıralama aynı içerikteki başka bir galeriden yapılır"""
+        with self._lock:
+            self._gallery = gallery
+        return self
+
+    def _encode(self, vectors):
+        # Aralık dışı değerler kırpılır; aralık büyük ölçüde değişirse indeks yeniden kurulur
+        codes = np.clip(np.rint((vectors - self.offset) / self.scale), -127, 127).astype(np.int8)
+        decoded = codes * self.scale + self.offset
+        return codes, np.einsum("ij,ij->i", decoded, decoded)
+
+    def _rows(self, row):
+        return slice(row * self.prototypes, (row + 1) * self.prototypes)
+
+    def needs_rebuild(self):
+        """Kurulumdan bu yana boyut iki katına çıktıysa ya da yarıya indiyse ölçekler yeniden hesaplanmalı"""
+        n = len(self.ids)
+        return self.scale is None or n > 2 * max(self._built_size, 1) or n < self._built_size // 2
+
+    def add(self, student_id, encoding):
+        """Öğrencinin prototip satırlarını kodlar; varsa yerinde günceller"""
+        vectors = np.asarray(encoding, dtype=np.float32).reshape(self.prototypes, self.dim)
+        with self._lock:
+            row = self._index.get(student_id)
+            if row is None:
+                row = len(self.ids)
+                if (row + 1) * self.prototypes > len(self._codes):
+                    self._codes = np.concatenate([self._codes, np.zeros_like(self._codes)])
+                    self._sq_norms = np.concatenate([self._sq_norms, np.zeros_like(self._sq_norms)])
+                self.ids.append(student_id)
+                self._index[student_id] = row
+            self._codes[self._rows(row)], self._sq_norms[self._rows(row)] = self._encode(vectors)
+            return True
+
+    def remove(self, student_id):
+        with self._lock:
+            row = self._index.pop(student_id, None)
+            if row is None:
+                return False
+            last = len(self.ids) - 1
+            if row != last:
+                self._codes[self._rows(row)] = self._codes[self._rows(last)]
+                self._sq_norms[self._rows(row)] = self._sq_norms[self._rows(last)]
+                self.ids[row] = self.ids[last]
+                self._index[self.ids[row]] = row
+            self.ids.pop()
+            return True
+
+    def _approx_sq_distances(self, queries):
+        """
+        F x N yaklaşık kare uzaklıklar. x ~ kod * scale + offset olduğundan
+        q.x = (q * scale).kod + q.offset; ölçek sorguya, offset önceden
+        hesaplanan q.offset terimine katılır. Kare başına birkaç yüzlük
+        sorgularda q * scale int16'ya nicemlenip kodlarla int32 toplamla
+        doğrudan çarpılır (128 * 127 * 32767 taşmaz), kodlar float'a açılmaz.
+        Daha büyük toplu sorgularda tamsayı çarpım BLAS'tan yavaş kaldığından
+        her blok çağrı başına bir kez float32'ye açılır ve tüm sorgulara kullanılır
+        """
+        n = len(self.ids)
+        rows = n * self.prototypes
+        scaled = queries * self.scale
+        direct = len(queries) <= self.direct_max_queries
+        if direct:
+            step = np.abs(scaled).max(axis=1) / 32767.0
+            step[step == 0] = 1.0
+            query_codes = np.rint(scaled / step[:, None]).astype(np.int16)
+        d2 = np.empty((len(queries), rows), dtype=np.float32)
+        for start in range(0, rows, self.block_rows):
+            end = min(start + self.block_rows, rows)
+            if direct:
+                d2[:, start:end] = np.einsum("fd,nd->fn", query_codes, self._codes[start:end], dtype=np.int32)
+            else:
+                d2[:, start:end] = scaled @ self._codes[start:end].astype(np.float32).T
+        if direct:
+            d2 *= step[:, None]
+        d2 += (queries @ self.offset)[:, None]
+        d2 *= -2.0
+        d2 += self._sq_norms[:rows]
+        d2 += np.einsum("ij,ij->i", queries, queries)[:, None]
+        if self.prototypes > 1:
+            d2 = d2.reshape(len(queries), n, self.prototypes).min(axis=2)
+        return np.maximum(d2, 0.0, out=d2)
+
+    def search(self, encodings, k=1, rerank=None):
+        """
+        Her sorgu için en yakın k öğrenciyi (id, uzaklık) listesi olarak döndürür.
+        rerank=0 ise yalnızca int8 uzaklıkları kullanılır. Ayrıca taranan satır
+        sayısını verir.
+        """
+        queries = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1)
+        rerank = self.rerank if rerank is None else rerank
+        with self._lock:
+            n = len(self.ids)
+            if not n or not len(queries):
+                return [[] for _ in queries], 0
+            d2 = self._approx_sq_distances(queries)
+            top = min(n, max(k, rerank))
+            candidates = np.argpartition(d2, top - 1, axis=1)[:, :top]
+            candidate_ids = [[self.ids[c] for c in row] for row in candidates]
+        scanned = n * self.prototypes * len(queries)
+
+        if rerank:
+            # Kesin uzaklık yalnızca adayların float prototip satırlarından hesaplanır
+            vectors = np.stack([self._gallery.encodings_of(sid) for ids in candidate_ids for sid in ids])
+            vectors = vectors.reshape(len(queries), top, self.prototypes, -1)
+            exact = np.sqrt(((vectors - queries[:, None, None, :]) ** 2).sum(axis=3).min(axis=2))
+        else:
+            exact = np.sqrt(np.take_along_axis(d2, candidates, axis=1))
+
+        results = []
+        for distances, ids in zip(exact, candidate_ids):
+            order = np.argsort(distances)[:k]
+            results.append([(ids[i], float(distances[i])) for i in order])
+        return results, scanned
+
+    def recall_report(self, gallery, sample=200, noise=0.02, k=1, rerank=None, seed=0):
+        """
+        Galeriden örneklenen gürültülü sorgularla kaba kuvvet aramaya göre top-k
+        isabet oranını, yeniden sıralamalı ve sırasız olarak ölçer
+        """
+        n = len(gallery)
+        if not n:
+            return {"recall": None, "sorgu_sayisi": 0}
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(n, min(sample, n), replace=False)
+        queries = gallery.matrix[rows * gallery.prototypes] + \
+            rng.normal(0, noise, (len(rows), gallery.dim)).astype(np.float32)
+
+        t0 = time.perf_counter()
+        exact = gallery.distances(queries)
+        top = min(k, n)
+        exact_top = np.argpartition(exact, top - 1, axis=1)[:, :top]
+        brute_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        reranked, scanned = self.search(queries, k=k, rerank=rerank)
+        int8_time = time.perf_counter() - t0
+        raw, _ = self.search(queries, k=k, rerank=0)
+
+        def _recall(found_lists):
+            hits = 0
+            for exact_rows, found in zip(exact_top, found_lists):
+                hits += len({gallery.ids[r] for r in exact_rows} & {sid for sid, _ in found})
+            return hits / (len(rows) * top)
+
+        return {
+            "recall": _recall(reranked),
+            "yeniden_siralamasiz_recall": _recall(raw),
+            "sorgu_sayisi": len(rows),
+            "k": k,
+            "rerank": self.rerank if rerank is None else rerank,
+            "kod_mb": self.nbytes / 1e6,
+            "float_mb": gallery.matrix.nbytes / 1e6,
+            "kaba_kuvvet_ms": brute_time * 1000,
+            "int8_ms": int8_time * 1000
+        }
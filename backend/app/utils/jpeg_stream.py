@@ -0,0 +1,112 @@
+import os
+
+# Art arda JPEG akışında tek bir kare için tamponlanacak en fazla bayt
+FACE_MAX_FRAME_MB = float(os.getenv('FACE_MAX_FRAME_MB', 8))
+
+_SOI = b"\xff\xd8"
+_EOI = 0xD9
+_SOS = 0xDA
+
+
+class FrameTooLargeError(ValueError):
+    pass
+
+
+class JpegSplitter:
+    """
+    Art arda gönderilmiş JPEG'leri parça parça ayırır. Kare sonu ilk FFD9'a
+    göre değil, marker segmentleri uzunluklarıyla atlanarak bulunur; böylece
+    APP1 (EXIF) içindeki küçük resmin SOI/EOI'si kareyi bölmez. Tarama yeni
+    gelen baytlardan devam eder; tamamlanmamış kare max_bytes'ı aşarsa
+    FrameTooLargeError fırlatılır.
+    """
+
+    def __init__(self, max_bytes=int(FACE_MAX_FRAME_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._buffer = bytearray()
+        self._start = None
+        self._pos = 0
+        self._in_scan = False
+        self.dropped = 0
+
+    def feed(self, data):
+        """Yeni baytları ekler ve tamamlanan kareleri bytes olarak üretir"""
+        self._buffer += data
+        while True:
+            if self._start is None:
+                start = self._buffer.find(_SOI)
+                if start < 0:
+                    # Bir sonraki parçada tamamlanabilecek son FF korunur
+                    del self._buffer[:max(0, len(self._buffer) - 1)]
+                    return
+                del self._buffer[:start]
+                self._start, self._pos, self._in_scan = 0, 2, False
+            end = self._find_end()
+            if end is None:
+                if len(self._buffer) > self.max_bytes:
+                    raise FrameTooLargeError(f"Kare {self.max_bytes} bayt sınırını aşıyor")
+                return
+            if end > 0:
+                yield bytes(self._buffer[:end])
+            else:
+                # Bozuk kare atlanır, sonraki SOI'den devam edilir
+                self.dropped += 1
+                end = 2
+            del self._buffer[:end]
+            self._start = None
+
+    def _find_end(self):
+        """Kare sonu konumu; veri yetmiyorsa None, kare bozuksa 0"""
+        buf, n, i = self._buffer, len(self._buffer), self._pos
+        while True:
+            if self._in_scan:
+                # Sıkıştırılmış veride FF00 ve RST marker'ları veri sayılır
+                j = buf.find(b"\xff", i)
+                if j < 0 or j + 1 >= n:
+                    self._pos = i if j < 0 else j
+                    return None
+                following = buf[j + 1]
+                if following == 0x00 or 0xD0 <= following <= 0xD7:
+                    i = j + 2
+                    continue
+                if following == 0xFF:
+                    i = j + 1
+                    continue
+                i, self._in_scan = j, False
+            if i + 1 >= n:
+                self._pos = i
+                return None
+            if buf[i] != 0xFF:
+                return 0
+            marker = buf[i + 1]
+            if marker == 0xFF:
+                i += 1
+                continue
+            if marker == _EOI:
+                return i + 2
+            if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+                i += 2
+                continue
+            if i + 3 >= n:
+                self._pos = i
+                return None
+            length = (buf[i + 2] << 8) | buf[i + 3]
+            if length < 2:
+                return 0
+            i += 2 + length
+            if marker == _SOS:
+                self._in_scan = True
+            if i > n:
+                # Segmentin kalanı henüz gelmedi; taramaya segment sonundan devam edilir
+                self._pos = i
+                return None
+
+
+def iter_jpegs(stream, chunk_size=64 * 1024, max_bytes=None):
+    """Dosya benzeri akıştan okunan art arda JPEG'leri tek tek üretir"""
+    splitter = JpegSplitter() if max_bytes is None else JpegSplitter(max_bytes)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield from splitter.feed(chunk)
@@ -0,0 +1,270 @@
+import datetime
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from .gallery_snapshot import open_snapshot, snapshot_version
+from .face_ops import detect_and_encode, decode_frame, recognized_students, refresh_detector_choice
+from .duplicate_scan import find_duplicates
+from .camera_service import SharedFrame
+
+# İş durumları
+DURUM_BEKLIYOR = "bekliyor"
+DURUM_CALISIYOR = "calisiyor"
+DURUM_TAMAMLANDI = "tamamlandi"
+DURUM_IPTAL = "iptal"
+DURUM_HATA = "hata"
+
+# --- Havuz süreçlerinde çalışan kısım ---
+
+_worker_gallery = None
+_worker_snapshot_dir = None
+_worker_db = None
+
+# İşin istediği sürümdeki görüntünün ana süreçte yazılması için beklenen en uzun süre
+SNAPSHOT_BEKLEME = 60
+
+
+def _init_worker(snapshot_dir):
+    global _worker_snapshot_dir
+    _worker_snapshot_dir = snapshot_dir
+    try:
+        _gallery(0, timeout=0)
+    except Exception as e:
+        # Görüntü ilk işte yeniden denenir; başlatıcı hatası havuzu bozmamalı
+        print(f"[UYARI] Galeri görüntüsü açılamadı: {e}")
+
+
+def _gallery(min_version, timeout=SNAPSHOT_BEKLEME):
+    """
+    Süreçteki galeriyi döndürür; disk görüntüsü daha yeniyse yeniden eşler.
+    Görüntü min_version'dan eskiyse ana sürecin yazması beklenir; süre dolarsa
+    eldeki en yeni görüntüyle devam edilir
+    """
+    global _worker_gallery
+    # Açılıştaki dedektör ölçümü süreç başladıktan sonra bitmiş olabilir
+    refresh_detector_choice()
+    deadline = time.time() + timeout
+    while _worker_gallery is None or _worker_gallery.version < min_version:
+        if _worker_gallery is None or snapshot_version(_worker_snapshot_dir) > _worker_gallery.version:
+            _worker_gallery = open_snapshot(_worker_snapshot_dir)
+        if _worker_gallery is not None and _worker_gallery.version >= min_version:
+            break
+        if time.time() >= deadline:
+            if _worker_gallery is not None:
+                print(f"[UYARI] Galeri görüntüsü {_worker_gallery.version} sürümünde, istenen {min_version}")
+            break
+        time.sleep(0.2)
+    if _worker_gallery is None:
+        raise RuntimeError("Galeri görüntüsü bulunamadı")
+    return _worker_gallery
+
+
+def _iptal_edildi(cancel_flags, job_id):
+    return bool(cancel_flags.get(job_id))
+
+
+def _db():
+    global _worker_db
+    if _worker_db is None:
+        from .db import get_db
+        _worker_db = get_db()
+    return _worker_db
+
+
+def recognize_frames_job(job_id, cancel_flags, min_version, roster, tolerance, frames):
+    """Yüklenen JPEG kareleri tanır ve kare başına eşleşmeleri döndürür"""
+    gallery = _gallery(min_version)
+    if roster:
+        gallery = gallery.subset(roster)
+    sonuclar = []
+    for kare_no, veri in enumerate(frames):
+        if _iptal_edildi(cancel_flags, job_id):
+            break
+        frame = decode_frame(veri)
+        if frame is None:
+            sonuclar.append({"kare": kare_no, "error": "Görüntü çözülemedi"})
+            continue
+        face_encodings = detect_and_encode(frame)
+        eslesmeler = recognized_students(gallery, face_encodings, tolerance) if face_encodings else []
+        sonuclar.append({
+            "kare": kare_no,
+            "yuz_sayisi": len(face_encodings),
+            "eslesmeler": [{
+                "ogrenci_id": student_id,
+                "ogrenci_adi": gallery.name_of(student_id),
+                "match_ratio": f"{match_ratio:.2f}"
+            } for student_id, match_ratio in eslesmeler]
+        })
+    return {"kareler": sonuclar}
+
+
+def camera_scan_job(job_id, cancel_flags, min_version, roster, tolerance, sure, toplu, kamera):
+    """
+    Kamerayı sure saniye boyunca tarar. toplu=False ise ilk eşleşmede durur,
+    aksi halde tüm tanınan öğrencileri en iyi skorlarıyla döndürür. Kareler ana
+    süreçteki kamera servisinin paylaşılan belleğinden (kamera tanımı) okunur.
+    """
+    gallery = _gallery(min_version)
+    if roster:
+        gallery = gallery.subset(roster)
+    camera = SharedFrame.attach(kamera)
+    en_iyi_skorlar = {}
+    islenen_kare = 0
+    seq = 0
+    try:
+        baslangic = time.time()
+        while time.time() - baslangic < sure and not _iptal_edildi(cancel_flags, job_id):
+            seq, frame = camera.read(seq, timeout=0.5)
+            if frame is None:
+                continue
+            islenen_kare += 1
+            face_encodings = detect_and_encode(frame)
+            if not face_encodings:
+                continue
+            for student_id, match_ratio in recognized_students(gallery, face_encodings, tolerance):
+                en_iyi_skorlar[student_id] = max(match_ratio, en_iyi_skorlar.get(student_id, 0))
+            if en_iyi_skorlar and not toplu:
+                break
+    finally:
+        camera.close()
+    return {
+        "taninanlar": [{
+            "ogrenci_id": student_id,
+            "ogrenci_adi": gallery.name_of(student_id),
+            "match_ratio": f"{skor:.2f}"
+        } for student_id, skor in sorted(en_iyi_skorlar.items(), key=lambda x: -x[1])],
+        "islenen_kare": islenen_kare
+    }
+
+
+def duplicate_scan_job(job_id, cancel_flags, min_version, threshold, max_pairs):
+    """
+    Tüm kayıtlı öğrenci çiftlerini blok blok tarar, eşiğin altındaki çiftleri
+    mukerrer_ciftler koleksiyonuna, tarama özetini mukerrer_taramalari'na yazar
+    """
+    gallery = _gallery(min_version)
+    pairs, ozet = find_duplicates(gallery, threshold, max_pairs=max_pairs,
+                                  should_stop=lambda: _iptal_edildi(cancel_flags, job_id))
+    db = _db()
+    db.mukerrer_ciftler.create_index([("tarama_id", 1), ("uzaklik", 1)])
+    ciftler = [{
+        "tarama_id": job_id,
+        "ogrenci_1": gallery.ids[i],
+        "ogrenci_1_adi": gallery.names[i],
+        "ogrenci_2": gallery.ids[j],
+        "ogrenci_2_adi": gallery.names[j],
+        "uzaklik": distance
+    } for i, j, distance in pairs]
+    for start in range(0, len(ciftler), 1000):
+        db.mukerrer_ciftler.insert_many(ciftler[start:start + 1000], ordered=False)
+    ozet.update({"galeri_surumu": gallery.version, "prototip": gallery.prototypes})
+    db.mukerrer_taramalari.insert_one({"_id": job_id, "tarih": datetime.datetime.now(), **ozet})
+    return {"tarama_id": job_id, "ozet": ozet}
+
+
+# --- Ana süreçte çalışan kısım ---
+
+class RecognitionJobManager:
+    """
+    Yüz tanıma işlerini sınırlı bir süreç havuzuna gönderir ve durumlarını
+    izler. Havuz süreçleri galeriyi paylaşılan disk görüntüsünden eşler.
+    prepare_fn işin beklemesi gereken en küçük galeri sürümünü döndürür ve
+    gerekiyorsa görüntünün arka planda yazılmasını ister; görüntü istek
+    iş parçacığında yazılmaz, iş süreci sürüm gelene kadar bekler.
+    """
+
+    def __init__(self, max_workers, snapshot_dir, prepare_fn, job_ttl=600):
+        self.max_workers = max_workers
+        self.snapshot_dir = snapshot_dir
+        self.prepare_fn = prepare_fn
+        self.job_ttl = job_ttl
+        self._executor = None
+        self._manager = None
+        self._cancel_flags = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self):
+        if self._executor is None:
+            self._manager = multiprocessing.Manager()
+            self._cancel_flags = self._manager.dict()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.snapshot_dir,)
+            )
+
+    def submit(self, fn, *args, on_done=None, on_finish=None, tur=""):
+        """
+        İşi havuza gönderir ve hemen iş kimliğini döndürür. on_done yalnızca
+        başarılı sonuçla, on_finish iş nasıl biterse bitsin çağrılır
+        """
+        min_version = self.prepare_fn()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._prune()
+            self._ensure_pool()
+            future = self._executor.submit(fn, job_id, self._cancel_flags, min_version, *args)
+            self._jobs[job_id] = {"future": future, "tur": tur, "olusturma": time.time(), "bitis": None}
+
+        def _done(f, job_id=job_id):
+            self._jobs[job_id]["bitis"] = time.time()
+            if on_finish is not None:
+                on_finish()
+            if on_done is not None and not f.cancelled() and f.exception() is None:
+                try:
+                    on_done(f.result())
+                except Exception as e:
+                    print(f"[HATA] İş sonucu işlenirken hata: {e}")
+
+        future.add_done_callback(_done)
+        return job_id
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        future = job["future"]
+        durum = {"is_id": job_id, "tur": job["tur"], "olusturma": job["olusturma"]}
+        if future.cancelled() or (self._cancel_flags is not None and self._cancel_flags.get(job_id)):
+            durum["durum"] = DURUM_IPTAL
+        elif future.running():
+            durum["durum"] = DURUM_CALISIYOR
+        elif not future.done():
+            durum["durum"] = DURUM_BEKLIYOR
+        else:
+            try:
+                durum["sonuc"] = future.result()
+                durum["durum"] = DURUM_TAMAMLANDI
+            except CancelledError:
+                durum["durum"] = DURUM_IPTAL
+            except Exception as e:
+                durum["durum"] = DURUM_HATA
+                durum["hata"] = str(e)
+        return durum
+
+    def cancel(self, job_id):
+        """Bekleyen işi kuyruktan çıkarır, çalışan işe durma işareti gönderir"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        if not job["future"].cancel() and not job["future"].done():
+            self._cancel_flags[job_id] = True
+        return True
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [j for j, job in self._jobs.items() if job["bitis"] and now - job["bitis"] > self.job_ttl]:
+            self._jobs.pop(job_id, None)
+            if self._cancel_flags is not None:
+                self._cancel_flags.pop(job_id, None)
+
+    def stats(self):
+        durumlar = {}
+        for job_id in list(self._jobs):
+            durum = self.status(job_id)
+            if durum:
+                durumlar[durum["durum"]] = durumlar.get(durum["durum"], 0) + 1
+        return {"havuz_boyutu": self.max_workers, "isler": durumlar}
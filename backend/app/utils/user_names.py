@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Diğer worker'larda yapılan kullanıcı güncellemeleri en geç bu kadar saniyede görülür
+USER_NAME_CACHE_TTL = float(os.getenv('USER_NAME_CACHE_TTL', 300))
+USER_NAME_CACHE_SIZE = int(os.getenv('USER_NAME_CACHE_SIZE', 10000))
+# Ad listesi önbelleğe alınan yoklama oturumu sayısı
+ROSTER_CACHE_SIZE = int(os.getenv('ROSTER_CACHE_SIZE', 256))
+
+
+def full_name(user):
+    return f"{user.get('ad', '')} {user.get('soyad', '')}".strip()
+
+
+class UserNameCache:
+    """
+    users koleksiyonundaki "ad soyad" bilgisini bir anahtar alana (mail, ogrno)
+    göre önbellekte tutar. Önbellekte olmayanlar tek bir $in sorgusuyla ve
+    yalnızca gereken alanlar okunarak alınır; bulunamayan anahtarlar da (None)
+    saklanır. Aynı süreçteki güncellemeler invalidate ile hemen, diğer
+    süreçlerdekiler ttl dolunca yansır.
+    """
+
+    def __init__(self, field, ttl=USER_NAME_CACHE_TTL, max_size=USER_NAME_CACHE_SIZE):
+        self.field = field
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, db, keys):
+        """{anahtar: "Ad Soyad" ya da None} döndürür"""
+        names, missing = self.cached(keys)
+        if not missing:
+            return names
+
+        found = {key: None for key in missing}
+        for user in db.users.find({self.field: {"$in": missing}}, {"_id": 0, self.field: 1, "ad": 1, "soyad": 1}):
+            found[user[self.field]] = full_name(user)
+        self.store(found)
+        names.update(found)
+        return names
+
+    def cached(self, keys):
+        """Önbellekteki adları ve önbellekte olmayan anahtarları ({anahtar: ad}, [anahtar]) olarak döndürür"""
+        now = time.time()
+        names, missing = {}, []
+        with self._lock:
+            for key in set(keys):
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[1] < self.ttl:
+                    self._entries.move_to_end(key)
+                    names[key] = entry[0]
+                    self.hits += 1
+                else:
+                    missing.append(key)
+            self.misses += len(missing)
+        return names, missing
+
+    def known(self):
+        """Süresi dolmamış anahtarlar; sorguya katılan $lookup'ın bunları atlaması için"""
+        now = time.time()
+        with self._lock:
+            return [key for key, entry in self._entries.items() if now - entry[1] < self.ttl]
+
+    def store(self, found):
+        """Başka bir sorguyla okunmuş {anahtar: ad} değerlerini önbelleğe ekler"""
+        now = time.time()
+        with self._lock:
+            for key, name in found.items():
+                self._entries[key] = (name, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys=None):
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                return
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        return {"boyut": len(self._entries), "isabet": self.hits, "iskalama": self.misses}
+
+
+class RosterNameCache:
+    """
+    Yoklama oturumu başına [{ogrenciNo, adSoyad}] listesini oturumun
+    kadroSurumu ile birlikte tutar. Kadro değişmedikçe ve ad önbelleği
+    invalidate edilmedikçe tekrar eden isteklerde users koleksiyonu okunmaz.
+    """
+
+    def __init__(self, names, ttl=USER_NAME_CACHE_TTL, max_size=ROSTER_CACHE_SIZE):
+        self.names = names
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def roster(self, db, attendance_id, kadro_surumu, ogrenciler):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(attendance_id)
+            if entry is not None and entry[0] == kadro_surumu and entry[1] == self._generation \
+                    and now - entry[2] < self.ttl:
+                self._entries.move_to_end(attendance_id)
+                return entry[3]
+            generation = self._generation
+
+        adlar = self.names.resolve(db, ogrenciler)
+        liste = [
+            {"ogrenciNo": ogrenci_no, "adSoyad": adlar.get(ogrenci_no) or f"Öğrenci {index}"}
+            for index, ogrenci_no in enumerate(ogrenciler, 1)
+        ]
+        with self._lock:
+            # Okuma sırasında bir ad değiştiyse eski liste saklanmaz
+            if generation == self._generation:
+                self._entries[attendance_id] = (kadro_surumu, generation, now, liste)
+                self._entries.move_to_end(attendance_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return liste
+
+    def invalidate(self, ogrenciler=None):
+        """Adı değişen öğrencileri ad önbelleğinden çıkarır ve tüm listeleri geçersiz kılar"""
+        self.names.invalidate(ogrenciler)
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        return {"oturum": len(self._entries), "adlar": self.names.stats()}
+
+
+teacher_names = UserNameCache("mail")
+student_names = UserNameCache("ogrno")
+roster_names = RosterNameCache(student_names)
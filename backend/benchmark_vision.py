@@ -0,0 +1,242 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import cv2
+import numpy as np
+
+# app paketini (ve veritabanı bağlantısını) yüklemeden aynı yardımcıları kullan
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app", "utils"))
+from face_ops import (downscale_rgb, locate_faces, encode_faces, detection_scale, sample_frames,  # noqa: E402
+                      benchmark_detectors, choose_detector, save_detector_choice, active_detector,
+                      FACE_MIN_SIZE, FACE_DETECTOR_FILE, FACE_DETECTOR_MIN_RECALL)
+from face_gallery import FaceGallery, select_prototypes  # noqa: E402
+
+VARSAYILAN_TOLERANSLAR = [0.40, 0.45, 0.50, 0.55, 0.60, 0.65]
+VARSAYILAN_BOYUTLAR = [1000, 10000, 100000]
+
+
+def yuzdelikler(sureler):
+    if not sureler:
+        return None
+    ms = np.asarray(sureler) * 1000
+    return {
+        "n": len(ms),
+        "ortalama_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99))
+    }
+
+
+def veri_setini_oku(dataset_dir):
+    """dataset/<ogrenci>/*.jpg düzenindeki görüntüleri öğrenci bazında döndürür"""
+    ogrenciler = {}
+    for klasor in sorted(glob.glob(os.path.join(dataset_dir, "*"))):
+        if not os.path.isdir(klasor):
+            continue
+        dosyalar = sorted(glob.glob(os.path.join(klasor, "*.jpg")),
+                          key=lambda p: int(os.path.splitext(os.path.basename(p))[0])
+                          if os.path.splitext(os.path.basename(p))[0].isdigit() else 0)
+        if dosyalar:
+            ogrenciler[os.path.basename(klasor)] = dosyalar
+    return ogrenciler
+
+
+def goruntuleri_isle(ogrenciler, min_face_px):
+    """Her görüntüyü face_attendance ile aynı aşamalardan geçirir ve süreleri ölçer"""
+    sureler = {"resize": [], "detect": [], "encode": [], "toplam": []}
+    encodingler = {}
+    yuzsuz = 0
+    for ogrenci_id, dosyalar in ogrenciler.items():
+        encodingler[ogrenci_id] = []
+        for dosya in dosyalar:
+            frame = cv2.imread(dosya)
+            if frame is None:
+                continue
+            scale = detection_scale(frame.shape, min_face_px)
+
+            t0 = time.perf_counter()
+            rgb_small_frame = downscale_rgb(frame, scale)
+            t1 = time.perf_counter()
+            boxes = locate_faces(rgb_small_frame, scale, frame.shape)
+            t2 = time.perf_counter()
+            encodings = [e for e in encode_faces(frame, boxes) if e is not None] if boxes else []
+            t3 = time.perf_counter()
+
+            sureler["resize"].append(t1 - t0)
+            sureler["detect"].append(t2 - t1)
+            if boxes:
+                sureler["encode"].append(t3 - t2)
+            sureler["toplam"].append(t3 - t0)
+            if encodings:
+                encodingler[ogrenci_id].append(encodings[0])
+            else:
+                yuzsuz += 1
+    return encodingler, sureler, yuzsuz
+
+
+def galeri_ve_sorgular(encodingler, kayit_sayisi, prototip):
+    """Her öğrencinin ilk kayit_sayisi encoding'inden prototipleri galeriye, kalanları sorguya ayırır"""
+    galeri = FaceGallery(prototypes=prototip)
+    sorgular, etiketler = [], []
+    for ogrenci_id, liste in encodingler.items():
+        if len(liste) <= kayit_sayisi:
+            continue
+        galeri.add(ogrenci_id, select_prototypes(liste[:kayit_sayisi], prototip), ogrenci_id)
+        sorgular.extend(liste[kayit_sayisi:])
+        etiketler.extend([ogrenci_id] * (len(liste) - kayit_sayisi))
+    return galeri, np.asarray(sorgular, dtype=np.float32), etiketler
+
+
+def eslesme_oranlari(galeri, sorgular, etiketler, toleranslar):
+    """
+    Kapalı küme (öğrenci galeride) için doğru/yanlış eşleşme oranlarını, açık küme
+    (öğrenci galeriden çıkarılmış) için yanlış kabul oranını tolerans başına hesaplar
+    """
+    uzakliklar = galeri.distances(sorgular)
+    en_iyi = np.argmin(uzakliklar, axis=1)
+    oran = 1 - uzakliklar[np.arange(len(en_iyi)), en_iyi]
+    dogru_kimlik = np.array([galeri.ids[i] == e for i, e in zip(en_iyi, etiketler)])
+
+    # Açık küme: sorgunun kendi satırını yok sayıp en yakın başka öğrenciyi bul
+    kendi = np.array([galeri.ids.index(e) for e in etiketler])
+    baskalari = uzakliklar.copy()
+    baskalari[np.arange(len(kendi)), kendi] = np.inf
+    sahte_oran = 1 - baskalari.min(axis=1) if len(galeri) > 1 else np.full(len(kendi), -np.inf)
+
+    sonuc = []
+    for tolerans in toleranslar:
+        kabul = oran > tolerans
+        sonuc.append({
+            "tolerans": tolerans,
+            "dogru_eslesme_orani": float(np.mean(kabul & dogru_kimlik)),
+            "yanlis_eslesme_orani": float(np.mean(kabul & ~dogru_kimlik)),
+            "acik_kume_yanlis_kabul": float(np.mean(sahte_oran > tolerans))
+        })
+    return sonuc
+
+
+def sentetik_olcekleme(galeri, sorgular, etiketler, boyutlar, tolerans, tekrar, seed=0):
+    """Galeriyi gerçek encoding dağılımından örneklenen sahte öğrencilerle büyütür"""
+    rng = np.random.default_rng(seed)
+    ortalama = galeri.matrix.mean(axis=0)
+    sapma = galeri.matrix.std(axis=0) + 0.03 if len(galeri) > 1 else np.full(galeri.dim, 0.1)
+    sonuc = []
+    for boyut in boyutlar:
+        buyuk = FaceGallery(capacity=boyut, prototypes=galeri.prototypes)
+        for sid, name in zip(galeri.ids, galeri.names):
+            buyuk.add(sid, galeri.encodings_of(sid), name)
+        sahte = rng.normal(ortalama, sapma, (max(0, boyut - len(galeri)), galeri.dim)).astype(np.float32)
+        for i, row in enumerate(sahte):
+            buyuk.add(f"sentetik-{i}", row)
+
+        tek_yuz, kare = [], []
+        for _ in range(tekrar):
+            t0 = time.perf_counter()
+            buyuk.best_matches(sorgular[:1])
+            tek_yuz.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            rows, uzaklik = buyuk.best_matches(sorgular)
+            kare.append(time.perf_counter() - t0)
+
+        dogru = np.mean([(buyuk.ids[r] == e) and (1 - d > tolerans) for r, d, e in zip(rows, uzaklik, etiketler)])
+        sonuc.append({
+            "galeri_boyutu": len(buyuk),
+            "tek_yuz_eslestirme": yuzdelikler(tek_yuz),
+            f"{len(sorgular)}_yuz_eslestirme": yuzdelikler(kare),
+            "dogru_eslesme_orani": float(dogru),
+            "bellek_mb": buyuk.matrix.nbytes / 1e6
+        })
+    return sonuc
+
+
+def dedektor_sec(args):
+    """
+    Dedektörleri galerinin landmark modeliyle (FACE_LANDMARK_MODEL) ölçer,
+    recall tabanını geçen en hızlısını seçim dosyasına yazar
+    """
+    kareler = sample_frames(args.dataset, args.ornek)
+    if not kareler:
+        print(f"{args.dataset} altında görüntü bulunamadı")
+        return
+    print(f"{len(kareler)} kare üzerinde dedektörler ölçülüyor...")
+    sonuclar, yuz_sayisi = benchmark_detectors(kareler, args.min_yuz)
+    for sonuc in sorted(sonuclar, key=lambda r: r["kare_ms"]):
+        recall = "-" if sonuc["recall"] is None else f"{sonuc['recall']:.3f}"
+        print(f"{sonuc['dedektor']:>10}/{sonuc['landmark']:<5}  recall {recall}  "
+              f"{sonuc['kare_ms']:7.1f} ms/kare (tespit {sonuc['tespit_ms']:.1f} ms)")
+    secim = choose_detector(sonuclar, args.min_recall)
+    if secim is None:
+        print(f"Referans dedektör {len(kareler)} karede yüz bulamadı, seçim yapılmadı ({active_detector()})")
+        return
+    save_detector_choice(secim, sonuclar, args.secim_dosyasi)
+    print(f"Seçilen: {secim['dedektor']}/{secim['landmark']} ({yuz_sayisi} referans yüz); "
+          f"{args.secim_dosyasi} dosyasına yazıldı, FACE_DETECTOR=auto ile kullanılır")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dataset/ görüntüleriyle çevrimdışı yüz tanıma ölçümü")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--kayit-sayisi", type=int, default=5, help="galeri için öğrenci başına kullanılacak görüntü")
+    parser.add_argument("--prototip", type=int, default=1, help="öğrenci başına prototip encoding sayısı")
+    parser.add_argument("--min-yuz", type=int, default=FACE_MIN_SIZE, help="beklenen en küçük yüz genişliği (piksel)")
+    parser.add_argument("--toleranslar", type=float, nargs="+", default=VARSAYILAN_TOLERANSLAR)
+    parser.add_argument("--boyutlar", type=int, nargs="+", default=VARSAYILAN_BOYUTLAR)
+    parser.add_argument("--tekrar", type=int, default=20)
+    parser.add_argument("--cikti", default="benchmark_sonuc.json")
+    parser.add_argument("--dedektor-sec", action="store_true",
+                        help="yalnızca dedektör ölçümü yap ve bu makine için seçimi kaydet")
+    parser.add_argument("--ornek", type=int, default=30, help="dedektör ölçümündeki kare sayısı")
+    parser.add_argument("--min-recall", type=float, default=FACE_DETECTOR_MIN_RECALL)
+    parser.add_argument("--secim-dosyasi", default=FACE_DETECTOR_FILE)
+    args = parser.parse_args()
+
+    if args.dedektor_sec:
+        dedektor_sec(args)
+        return
+
+    ogrenciler = veri_setini_oku(args.dataset)
+    if not ogrenciler:
+        print(f"{args.dataset} altında görüntü bulunamadı")
+        return
+    print(f"{len(ogrenciler)} öğrenci, {sum(map(len, ogrenciler.values()))} görüntü işleniyor...")
+
+    encodingler, sureler, yuzsuz = goruntuleri_isle(ogrenciler, args.min_yuz)
+    galeri, sorgular, etiketler = galeri_ve_sorgular(encodingler, args.kayit_sayisi, args.prototip)
+
+    sonuc = {
+        "zaman": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "ortam": {"python": platform.python_version(), "islemci": platform.processor(),
+                  "cekirdek": os.cpu_count(), "opencv": cv2.__version__, "numpy": np.__version__},
+        "ayarlar": vars(args),
+        "goruntu_sayisi": len(sureler["toplam"]),
+        "yuz_bulunamayan": yuzsuz,
+        "asama_sureleri": {asama: yuzdelikler(s) for asama, s in sureler.items()},
+        "fps": len(sureler["toplam"]) / sum(sureler["toplam"]) if sureler["toplam"] else None
+    }
+
+    if len(sorgular):
+        eslesme_sureleri = []
+        for i in range(len(sorgular)):
+            t0 = time.perf_counter()
+            galeri.best_matches(sorgular[i:i + 1])
+            eslesme_sureleri.append(time.perf_counter() - t0)
+        sonuc["asama_sureleri"]["match"] = yuzdelikler(eslesme_sureleri)
+        sonuc["eslesme_oranlari"] = eslesme_oranlari(galeri, sorgular, etiketler, args.toleranslar)
+        sonuc["olcekleme"] = sentetik_olcekleme(galeri, sorgular, etiketler, args.boyutlar,
+                                                0.55, args.tekrar)
+    else:
+        print("Galeri/sorgu ayrımı için yeterli yüz bulunamadı, eşleşme ölçümü atlandı")
+
+    with open(args.cikti, "w", encoding="utf-8") as f:
+        json.dump(sonuc, f, ensure_ascii=False, indent=2)
+    print(json.dumps(sonuc["asama_sureleri"], ensure_ascii=False, indent=2))
+    print(f"Sonuçlar {args.cikti} dosyasına yazıldı")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from pymongo import UpdateOne
+from app.utils.db import get_db
+from app.utils.gallery_version import next_version
+from app.utils.encoding_codec import pack_encoding, MODEL_VERSION, LEGACY_MODEL_VERSION
+from app.utils.face_ops import detect_and_encode, FACE_MIN_SIZE, FACE_PROTOTYPES, ENROLL_LANDMARK_MODEL
+from app.utils.face_gallery import select_prototypes
+
+FOTO_UZANTILARI = (".jpg", ".jpeg", ".png")
+
+# Sonuç durumları
+DURUM_KAYDEDILDI = "kaydedildi"
+DURUM_AYNI = "ayni"
+DURUM_YUZ_YOK = "yuz_yok"
+
+
+def foto_listesi(klasor):
+    return sorted(
+        os.path.join(klasor, f) for f in os.listdir(klasor)
+        if f.lower().endswith(FOTO_UZANTILARI)
+    )
+
+
+def foto_ozeti(dosyalar):
+    """
+    Fotoğraf kümesinin adlarından ve içeriklerinden SHA-1 özeti üretir. Model
+    sürümü değişince aynı fotoğraflar yeniden encode edilsin diye sürüm de
+    özete katılır; önceki özetler geçerli kalsın diye eski sürüm katılmaz.
+    """
+    ozet = hashlib.sha1()
+    if MODEL_VERSION != LEGACY_MODEL_VERSION:
+        ozet.update(f"model-{MODEL_VERSION}".encode("utf-8"))
+    for dosya in dosyalar:
+        ozet.update(os.path.basename(dosya).encode("utf-8"))
+        with open(dosya, "rb") as f:
+            for parca in iter(lambda: f.read(1 << 20), b""):
+                ozet.update(parca)
+    return ozet.hexdigest()
+
+
+def ogrenciyi_isle(ogrenci_id, dosyalar, bilinen_ozet, min_face_px, prototip):
+    """
+    Havuz sürecinde çalışır. Fotoğraf kümesi değişmemişse encoding hesaplamaz;
+    aksi halde her fotoğraftaki ilk yüzün encoding'lerinden prototipleri seçer.
+    """
+    ozet = foto_ozeti(dosyalar)
+    if ozet == bilinen_ozet:
+        return ogrenci_id, ozet, DURUM_AYNI, None, []
+
+    encodings, kullanilan = [], []
+    for dosya in dosyalar:
+        frame = cv2.imread(dosya)
+        if frame is None:
+            continue
+        bulunan = detect_and_encode(frame, min_face_px=min_face_px, landmarks=ENROLL_LANDMARK_MODEL)
+        if bulunan:
+            encodings.append(bulunan[0])
+            kullanilan.append(dosya)
+    if not encodings:
+        return ogrenci_id, ozet, DURUM_YUZ_YOK, None, []
+    return ogrenci_id, ozet, DURUM_KAYDEDILDI, select_prototypes(encodings, prototip), kullanilan
+
+
+def checkpoint_oku(yol):
+    """Önceki çalıştırmalarda işlenen öğrencileri {ogrenci_id: ozet} olarak döndürür"""
+    islenenler = {}
+    if not os.path.exists(yol):
+        return islenenler
+    with open(yol, encoding="utf-8") as f:
+        for satir in f:
+            try:
+                kayit = json.loads(satir)
+            except ValueError:
+                # Yarıda kalan son satır yok sayılır
+                continue
+            islenenler[kayit["ogrenci_id"]] = kayit["ozet"]
+    return islenenler
+
+
+class TopluKayit:
+    def __init__(self, db, checkpoint_yolu, batch_size):
+        self.db = db
+        self.checkpoint_yolu = checkpoint_yolu
+        self.batch_size = batch_size
+        self.islemler = []
+        self.bekleyen_checkpoint = []
+        self.sayilar = {DURUM_KAYDEDILDI: 0, DURUM_AYNI: 0, DURUM_YUZ_YOK: 0}
+
+    def ekle(self, ogrenci_id, ozet, durum, encoding, kullanilan):
+        self.sayilar[durum] += 1
+        if durum == DURUM_KAYDEDILDI:
+            self.islemler.append((ogrenci_id, ozet, encoding, kullanilan))
+        if durum != DURUM_AYNI:
+            self.bekleyen_checkpoint.append({"ogrenci_id": ogrenci_id, "ozet": ozet, "durum": durum})
+        if len(self.islemler) >= self.batch_size or len(self.bekleyen_checkpoint) >= self.batch_size * 4:
+            self.yaz()
+
+    def yaz(self):
+        """Biriken kayıtları tek bulk_write ile yazar, ardından checkpoint'e ekler"""
+        if self.islemler:
+            # Bir toplu yazmadaki tüm öğrenciler aynı galeri sürümünü paylaşır
+            surum = next_version(self.db)
+            self.db.ogrenciler.bulk_write([
+                UpdateOne(
+                    {"ogrenci_id": ogrenci_id},
+                    {"$set": {
+                        "ogrenci_id": ogrenci_id,
+                        "encoding": pack_encoding(encoding),
+                        "foto_galerisi": kullanilan,
+                        "foto_ozeti": ozet,
+                        "surum": surum
+                    }},
+                    upsert=True
+                ) for ogrenci_id, ozet, encoding, kullanilan in self.islemler
+            ], ordered=False)
+            self.islemler = []
+        if self.bekleyen_checkpoint:
+            with open(self.checkpoint_yolu, "a", encoding="utf-8") as f:
+                for kayit in self.bekleyen_checkpoint:
+                    f.write(json.dumps(kayit, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.bekleyen_checkpoint = []
+
+
+def galeriyi_yenile(sunucu):
+    istek = urllib.request.Request(f"{sunucu.rstrip('/')}/api/face-attendance/cache-refresh", method="POST")
+    try:
+        with urllib.request.urlopen(istek, timeout=120) as yanit:
+            print(json.loads(yanit.read().decode("utf-8")).get("message"))
+    except Exception as e:
+        print(f"Galeri yenilenemedi ({e}); sunucu değişiklikleri sürüm senkronizasyonuyla alacak.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dataset/<ogrenci_id>/ klasörlerinden toplu yüz kaydı")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--isci", type=int, default=os.cpu_count() or 1, help="süreç sayısı")
+    parser.add_argument("--batch", type=int, default=200, help="bulk_write başına öğrenci sayısı")
+    parser.add_argument("--checkpoint", default="bulk_enroll.checkpoint")
+    parser.add_argument("--min-yuz", type=int, default=FACE_MIN_SIZE, help="beklenen en küçük yüz genişliği (piksel)")
+    parser.add_argument("--prototip", type=int, default=FACE_PROTOTYPES, help="öğrenci başına prototip sayısı")
+    parser.add_argument("--sunucu", default="http://localhost:5000", help="bitince galerisi yenilenecek sunucu")
+    parser.add_argument("--yenileme-yok", action="store_true", help="sunucuda galeri yenilemesini atla")
+    args = parser.parse_args()
+
+    db = get_db()
+    islenenler = checkpoint_oku(args.checkpoint)
+    # Veritabanındaki özetler, checkpoint olmadan da değişmeyen öğrencilerin atlanmasını sağlar
+    kayitli_ozetler = {
+        d["ogrenci_id"]: d["foto_ozeti"]
+        for d in db.ogrenciler.find({"foto_ozeti": {"$exists": True}}, {"_id": 0, "ogrenci_id": 1, "foto_ozeti": 1})
+    }
+
+    ogrenciler = []
+    for ogrenci_id in sorted(os.listdir(args.dataset)):
+        klasor = os.path.join(args.dataset, ogrenci_id)
+        if os.path.isdir(klasor):
+            dosyalar = foto_listesi(klasor)
+            if dosyalar:
+                ogrenciler.append((ogrenci_id, dosyalar))
+    print(f"{len(ogrenciler)} öğrenci klasörü bulundu, {len(islenenler)} öğrenci checkpoint'te.")
+
+    kayit = TopluKayit(db, args.checkpoint, args.batch)
+    baslangic = time.time()
+    havuz = ProcessPoolExecutor(max_workers=args.isci)
+    isler = []
+    try:
+        isler = [
+            havuz.submit(ogrenciyi_isle, ogrenci_id, dosyalar,
+                         islenenler.get(ogrenci_id) or kayitli_ozetler.get(ogrenci_id), args.min_yuz,
+                         args.prototip)
+            for ogrenci_id, dosyalar in ogrenciler
+        ]
+        for tamamlanan, is_ in enumerate(as_completed(isler), 1):
+            kayit.ekle(*is_.result())
+            if tamamlanan % 100 == 0:
+                gecen = time.time() - baslangic
+                print(f"{tamamlanan}/{len(isler)} öğrenci işlendi ({tamamlanan / gecen:.1f} öğrenci/sn)")
+    finally:
+        # Kesintide bekleyen işler bırakılır, tamamlanan sonuçlar yine de yazılır;
+        # sonraki çalıştırma checkpoint'ten devam eder
+        for is_ in isler:
+            is_.cancel()
+        havuz.shutdown(wait=True)
+        kayit.yaz()
+
+    print(f"Toplu kayıt bitti ({time.time() - baslangic:.1f} sn): "
+          f"{kayit.sayilar[DURUM_KAYDEDILDI]} kaydedildi, {kayit.sayilar[DURUM_AYNI]} değişmemiş, "
+          f"{kayit.sayilar[DURUM_YUZ_YOK]} öğrencide yüz bulunamadı")
+
+    if kayit.sayilar[DURUM_KAYDEDILDI] and not args.yenileme_yok:
+        galeriyi_yenile(args.sunucu)
+
+
+if __name__ == "__main__":
+    main()
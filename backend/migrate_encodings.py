@@ -0,0 +1,53 @@
+import argparse
+from pymongo import UpdateOne
+from app.utils.db import get_db
+from app.utils.encoding_codec import pack_encoding, unpack_encoding, LEGACY_MODEL_VERSION
+
+# BSON dizi tipindeki eski encoding'ler
+ESKI_BICIM = {"encoding": {"$type": "array"}}
+
+
+def migrate_encodings(db, batch_size=500, dry_run=False):
+    """
+    Liste olarak saklanan encoding'leri float32 Binary biçimine dönüştürür.
+    Yalnızca dizi tipindeki belgeleri seçtiği için tekrar çalıştırılması güvenlidir.
+    """
+    toplam = db.ogrenciler.count_documents(ESKI_BICIM)
+    print(f"Dönüştürülecek öğrenci sayısı: {toplam}")
+    if dry_run or not toplam:
+        return 0
+
+    donusturulen = 0
+    islemler = []
+    cursor = db.ogrenciler.find(ESKI_BICIM, {"_id": 1, "encoding": 1}, batch_size=batch_size)
+    for student in cursor:
+        # Bu arada yeniden kayıt olan öğrencinin yeni verisi ezilmesin. Eski
+        # encoding'ler 5 noktalı modelle üretildiği için o sürümle paketlenir
+        encoding = unpack_encoding(student["encoding"], LEGACY_MODEL_VERSION)
+        islemler.append(UpdateOne(
+            {"_id": student["_id"], **ESKI_BICIM},
+            {"$set": {"encoding": pack_encoding(encoding, LEGACY_MODEL_VERSION)}}
+        ))
+        if len(islemler) >= batch_size:
+            donusturulen += db.ogrenciler.bulk_write(islemler, ordered=False).modified_count
+            islemler = []
+            print(f"{donusturulen}/{toplam} öğrenci dönüştürüldü")
+
+    if islemler:
+        donusturulen += db.ogrenciler.bulk_write(islemler, ordered=False).modified_count
+
+    print(f"Dönüştürme tamamlandı: {donusturulen} öğrenci")
+    return donusturulen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yüz encoding'lerini float32 Binary biçimine dönüştürür")
+    parser.add_argument("--batch", type=int, default=500, help="bulk_write başına belge sayısı")
+    parser.add_argument("--dry-run", action="store_true", help="Yalnızca dönüştürülecek belge sayısını göster")
+    args = parser.parse_args()
+
+    migrate_encodings(get_db(), batch_size=args.batch, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import argparse
+from app.utils.db import get_db
+from app.utils.attendance_counters import ensure_counter_indexes, rebuild_counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Öğrenci-ders yoklama sayaçlarını attendance kayıtlarından yeniden hesaplar")
+    parser.add_argument("--batch", type=int, default=1000, help="bulk_write başına belge sayısı")
+    args = parser.parse_args()
+
+    db = get_db()
+    ensure_counter_indexes(db)
+    yazilan = rebuild_counters(db, batch_size=args.batch)
+    print(f"Yoklama sayaçları hazır: {yazilan} öğrenci-ders kaydı yazıldı")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,9 +12,12 @@ if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_DEBUG', 'False').lower() in ('true', '1', 't')
     
-    # Fix: Student face cache'i yükle
-    from app.routes.face_attendance import load_student_faces
-    load_student_faces()
+    # Fix: Student face cache'i yükle (varsa disk görüntüsünden eşle)
+    from app.routes.face_attendance import load_student_faces, start_snapshot_refresher
+    from app.utils.face_ops import start_detector_choice
+    start_detector_choice()
+    load_student_faces(use_snapshot=True)
+    start_snapshot_refresher()
     
     print(f"Sunucu başlatılıyor: http://localhost:{port}")
     print(f"Debug modu: {'Açık' if debug else 'Kapalı'}")
@@ -5,6 +5,10 @@ import cv2
 import face_recognition
 import numpy as np
 import time
+from app.utils.gallery_version import next_version
+from app.utils.encoding_codec import pack_encoding
+from app.utils.face_gallery import select_prototypes
+from app.utils.face_ops import FACE_PROTOTYPES, ENROLL_LANDMARK_MODEL
 
 # .env dosyasını yükle
 load_dotenv()
@@ -60,7 +64,7 @@ def collect_face_data(student_id, student_name):
         
         if face_locations:
             # İlk yüzü kullan
-            current_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+            current_encodings = face_recognition.face_encodings(rgb_frame, face_locations, model=ENROLL_LANDMARK_MODEL)
             
             if current_encodings:
                 # Dosya adı oluştur ve kaydet
@@ -100,14 +104,15 @@ def collect_face_data(student_id, student_name):
         print("Hiç yüz bulunamadı. Lütfen tekrar deneyin.")
         return False
     
-    # Tüm encoding'lerin ortalamasını al
-    average_encoding = np.mean(face_encodings, axis=0)
+    # Farklı poz/ışık koşullarını temsil eden prototipleri seç
+    prototypes = select_prototypes(face_encodings, FACE_PROTOTYPES)
     
     # Veritabanına kaydet
     student_update = {
         "ogrenci_id": student_id,
         "foto_galerisi": photo_paths,
-        "encoding": average_encoding.tolist(),
+        "encoding": pack_encoding(prototypes),
+        "surum": next_version(db),
     }
     
     # Öğrenci adı soyadı varsa ekle
@@ -125,13 +130,8 @@ def collect_face_data(student_id, student_name):
     
     print(f"\nYüz verisi başarıyla kaydedildi. {photo_count} fotoğraf alındı.")
     
-    # Yüz önbelleğini güncelle
-    try:
-        from app.routes.face_attendance import load_student_faces
-        load_student_faces()
-        print("Yüz verileri önbelleği güncellendi.")
-    except ImportError:
-        print("Yüz verileri önbelleği güncellenemedi. Uygulama yeniden başlatılana kadar yüz tanıma çalışmayabilir.")
+    # Sunucudaki yüz önbelleği artırılan sürüm sayesinde birkaç saniye içinde güncellenir
+    print("Yüz verisi sürümü güncellendi, sunucu önbelleği kısa süre içinde yenilenecek.")
     
     return True
 
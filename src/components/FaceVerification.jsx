@@ -1,5 +1,15 @@
 import React, { useState, useEffect, useCallback, useRef } from 'react';
 
+// Kullanıcı için yardımcı ipuçları (bileşen dışında: her render'da akış yeniden başlamasın)
+const tips = [
+  "Yüzünüzü kameraya düzgün gösterin",
+  "İyi aydınlatılmış bir ortamda olduğunuzdan emin olun",
+  "Yüzünüz tam karşıya bakmalı",
+  "Gözlüklerinizi çıkarmanız tanıma başarısını artırabilir",
+  "Biraz daha yaklaşmayı deneyin",
+  "Şapka veya maske gibi aksesuarlar yüz tanımayı zorlaştırabilir"
+];
+
 const FaceVerification = ({ courseId, studentId, onSuccess, onError, onCancel }) => {
   const [status, setStatus] = useState('waiting'); // waiting, processing, success, error
   const [message, setMessage] = useState('Kameraya erişim için hazırlanıyor...');
@@ -8,25 +18,19 @@ const FaceVerification = ({ courseId, studentId, onSuccess, onError, onCancel })
   const [matchRatio, setMatchRatio] = useState(null);
   const [tipsIndex, setTipsIndex] = useState(0);
   
-  // Interval referansları için useRef kullanımı (bellek sızıntısını önlemek için)
-  const timerRef = useRef(null);
+  // Zamanlayıcı ve olay akışı referansları (bellek sızıntısını önlemek için)
   const tipsTimerRef = useRef(null);
+  const eventSourceRef = useRef(null);
+
+  // Üst bileşen her render'da yeni callback verse de akış yeniden başlamasın
+  const callbacksRef = useRef({ onSuccess, onError });
+  callbacksRef.current = { onSuccess, onError };
 
-  // Kullanıcı için yardımcı ipuçları
-  const tips = [
-    "Yüzünüzü kameraya düzgün gösterin",
-    "İyi aydınlatılmış bir ortamda olduğunuzdan emin olun",
-    "Yüzünüz tam karşıya bakmalı",
-    "Gözlüklerinizi çıkarmanız tanıma başarısını artırabilir",
-    "Biraz daha yaklaşmayı deneyin",
-    "Şapka veya maske gibi aksesuarlar yüz tanımayı zorlaştırabilir"
-  ];
-
-  // Cleanup fonksiyonu
+  // Cleanup fonksiyonu: akışı kapatmak sunucudaki taramayı da durdurur
   const cleanupTimers = useCallback(() => {
-    if (timerRef.current) {
-      clearInterval(timerRef.current);
-      timerRef.current = null;
+    if (eventSourceRef.current) {
+      eventSourceRef.current.close();
+      eventSourceRef.current = null;
     }
     
     if (tipsTimerRef.current) {
@@ -42,82 +46,92 @@ const FaceVerification = ({ courseId, studentId, onSuccess, onError, onCancel })
     };
   }, [cleanupTimers]);
 
-  const startFaceVerification = useCallback(async () => {
-    try {
-      cleanupTimers(); // Mevcut zamanlayıcıları temizle
-      setStatus('processing');
-      setMessage('Kameraya erişim sağlanıyor...');
-      setError(null);
-      setMatchRatio(null);
-
-      // İpuçlarını döngüsel olarak göster
-      tipsTimerRef.current = setInterval(() => {
-        setTipsIndex(prevIndex => (prevIndex + 1) % tips.length);
-      }, 3000);
-
-      // Countdown başlat
-      let timeLeft = 20; // Maksimum 20 saniye
-      setCountdown(timeLeft);
-      
-      timerRef.current = setInterval(() => {
-        timeLeft--;
-        setCountdown(timeLeft);
-        
-        if (timeLeft <= 0) {
-          cleanupTimers();
-          throw new Error('Zaman aşımı: Yüz tanıma tamamlanamadı');
-        }
-      }, 1000);
-
-      // Backend'e istek at (doğrudan öğrenci ID'si gönderilmiyor, sunucu tarafında tespit edilecek)
-      const response = await fetch(`http://localhost:5000/api/face-attendance/yoklama-al/${courseId}`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({})
-      });
-
-      // İstek tamamlandığında countdown'u durdur
-      cleanupTimers();
+  const failVerification = useCallback((errorMessage) => {
+    cleanupTimers();
+    console.error('Yüz tanıma hatası:', errorMessage);
+    setStatus('error');
+    setMessage('Hata: ' + errorMessage);
+    setError(errorMessage);
+    
+    if (callbacksRef.current.onError) {
+      callbacksRef.current.onError(new Error(errorMessage));
+    }
+  }, [cleanupTimers]);
 
-      // Ön kontroller
-      if (!response) {
-        throw new Error('Sunucudan yanıt alınamadı');
-      }
+  const startFaceVerification = useCallback(() => {
+    cleanupTimers(); // Mevcut akışı ve zamanlayıcıları temizle
+    setStatus('processing');
+    setMessage('Kameraya erişim sağlanıyor...');
+    setError(null);
+    setMatchRatio(null);
 
-      const data = await response.json();
+    // İpuçlarını döngüsel olarak göster
+    tipsTimerRef.current = setInterval(() => {
+      setTipsIndex(prevIndex => (prevIndex + 1) % tips.length);
+    }, 3000);
 
-      if (!response.ok) {
-        throw new Error(data.error || 'Yüz tanıma işlemi başarısız oldu');
-      }
+    // Sunucu ilerlemeyi olay olarak gönderir; kalan süre onun saatine göre gösterilir
+    const maxSure = 20;
+    setCountdown(maxSure);
+
+    const eventSource = new EventSource(
+      `http://localhost:5000/api/face-attendance/yoklama-akisi/${courseId}?sure=${maxSure}`
+    );
+    eventSourceRef.current = eventSource;
+
+    const parse = (event) => JSON.parse(event.data);
 
-      // Başarılı tanıma
+    eventSource.addEventListener('kamera', () => {
+      setMessage('Kamera hazır, yüzünüz aranıyor...');
+    });
+
+    eventSource.addEventListener('kare', (event) => {
+      const data = parse(event);
+      setCountdown(Math.max(0, Math.ceil(maxSure - data.gecen_sn)));
+    });
+
+    eventSource.addEventListener('yuz', (event) => {
+      const data = parse(event);
+      setMessage(data.yuz_sayisi > 0 ? 'Yüz algılandı, eşleştiriliyor...' : 'Kamera hazır, yüzünüz aranıyor...');
+    });
+
+    // İlk eşleşme yeterli: akış hemen kapatılır, sunucu taramayı bırakır
+    eventSource.addEventListener('eslesme', (event) => {
+      const data = parse(event);
+      cleanupTimers();
       setStatus('success');
-      setMessage(data.message || 'Yüz tanıma başarılı!');
-      
-      // Eşleşme oranını ayarla
-      if (data.match_ratio) {
-        setMatchRatio(data.match_ratio);
-      }
+      setMessage('Yüz tanıma başarılı');
+      setMatchRatio(data.match_ratio);
       
       // Başarılı callback'i çağır
-      if (onSuccess) {
+      if (callbacksRef.current.onSuccess) {
         setTimeout(() => {
-          onSuccess(data);
+          callbacksRef.current.onSuccess({ message: 'Yüz tanıma başarılı', ...data });
         }, 1500);
       }
-    } catch (error) {
-      console.error('Yüz tanıma hatası:', error);
-      setStatus('error');
-      setMessage('Hata: ' + (error.message || 'Bilinmeyen bir hata oluştu'));
-      setError(error.message || 'Bilinmeyen bir hata oluştu');
-      
-      if (onError) {
-        onError(error);
+    });
+
+    eventSource.addEventListener('bitti', (event) => {
+      const data = parse(event);
+      if (!data.taninanlar || data.taninanlar.length === 0) {
+        failVerification('Zaman aşımı: Yüz tanıma tamamlanamadı');
+      } else {
+        cleanupTimers();
       }
-    }
-  }, [courseId, cleanupTimers, tips, onSuccess, onError]);
+    });
+
+    // Sunucunun gönderdiği hata olayı (ders/yüz verisi yok, kamera meşgul dahil)
+    eventSource.addEventListener('hata', (event) => {
+      failVerification(parse(event).error || 'Yüz tanıma işlemi başarısız oldu');
+    });
+
+    // Bağlantı hatası (sunucuya ulaşılamadı); tarayıcı yeniden denemesin
+    eventSource.onerror = () => {
+      if (eventSourceRef.current === eventSource) {
+        failVerification('Sunucudan yanıt alınamadı');
+      }
+    };
+  }, [courseId, cleanupTimers, failVerification]);
 
   // Component mount olduğunda yüz tanıma işlemini başlat
   useEffect(() => {